@@ -1,9 +1,139 @@
-from django.contrib import admin
+import datetime
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db import models
+from django.db.models import Max, Min
+from django.forms.models import BaseInlineFormSet
+from django.http import QueryDict
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
 from .models import (
     Profile, Course_Category, DifficultyLevel, CourseStatus,
     Course, LessonType, Lesson, EnrollmentStatus, Enrollment,
-    LessonProgress, Comment
+    LessonProgress, Comment, Job
 )
+from .importer import detect_format
+from .jobs import enqueue
+from .pagination import EstimatedCountPaginator
+
+
+# ==================== LARGE TABLES ====================
+
+def _truncate(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + datetime.timedelta(days=1)
+
+
+class IndexedDateQuerySet(models.QuerySet):
+    """
+    QuerySet para el ``date_hierarchy`` del admin. En lugar de un
+    ``SELECT DISTINCT`` que recorre toda la tabla, obtiene los extremos con
+    MIN/MAX y comprueba cada año, mes o día candidato con un EXISTS sobre su
+    rango: con un índice en la columna todas son búsquedas acotadas.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        return self._probe_periods(field_name, kind, order)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self._probe_periods(field_name, kind, order, tzinfo)
+
+    def _probe_periods(self, field_name, kind, order, tzinfo=None):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        first, last = bounds['first'], bounds['last']
+        if first is None:
+            return []
+
+        aware = isinstance(first, datetime.datetime) and timezone.is_aware(first)
+        if aware:
+            tzinfo = tzinfo or timezone.get_current_timezone()
+            first, last = first.astimezone(tzinfo), last.astimezone(tzinfo)
+
+        def boundary(day):
+            if not isinstance(first, datetime.datetime):
+                return day
+            moment = datetime.datetime.combine(day, datetime.time.min)
+            return timezone.make_aware(moment, tzinfo) if aware else moment
+
+        periods = []
+        start = _truncate(first if not isinstance(first, datetime.datetime) else first.date(), kind)
+        last_day = last.date() if isinstance(last, datetime.datetime) else last
+        while start <= last_day:
+            end = _next_period(start, kind)
+            lower, upper = boundary(start), boundary(end)
+            if self.filter(**{f'{field_name}__gte': lower, f'{field_name}__lt': upper}).exists():
+                periods.append(lower)
+            start = end
+        return periods[::-1] if order == 'DESC' else periods
+
+
+class LargeTableAdminMixin:
+    """
+    Changelists de tablas grandes: total estimado en lugar de COUNT(*), sin
+    el segundo conteo de la tabla completa y con ``date_hierarchy`` resuelto
+    mediante búsquedas por índice.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDateQuerySet(model=queryset.model, query=queryset.query.chain(), using=queryset.db)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """
+    Formset de inline que solo carga una página de objetos relacionados.
+    La página se elige con el parámetro ``page_param`` de la URL.
+    """
+    per_page = 25
+    page_param = 'page'
+    page_number = 1
+    changelist_url = None
+    query_params = None
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            paginator = Paginator(super().get_queryset(), self.per_page)
+            self.page = paginator.get_page(self.page_number)
+            self._page_objects = list(self.page.object_list)
+        return self._page_objects
+
+    def _page_query(self, number):
+        """Query string de la página ``number`` conservando los demás parámetros"""
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params[self.page_param] = number
+        return params.urlencode()
+
+    @property
+    def previous_page_query(self):
+        return self._page_query(self.page.previous_page_number())
+
+    @property
+    def next_page_query(self):
+        return self._page_query(self.page.next_page_number())
 
 
 # ==================== INLINE ADMINS ====================
@@ -14,14 +144,48 @@ class LessonInline(admin.TabularInline):
     extra = 1
     fields = ['title', 'lesson_type', 'order_index', 'duration_minutes', 'is_published', 'is_free']
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('course')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'lesson_type':
+            # Se evalúa una vez y todas las filas comparten el desplegable
+            formfield.choices = list(formfield.choices)
+        return formfield
+
 
 class LessonProgressInline(admin.TabularInline):
-    """Inline para progreso de lecciones en el admin de inscripciones"""
+    """
+    Inline para progreso de lecciones en el admin de inscripciones.
+    Muestra una página cada vez; el listado completo está en su changelist.
+    """
     model = LessonProgress
+    formset = PaginatedInlineFormSet
+    template = 'admin/app/edit_inline/paginated_tabular.html'
     extra = 0
+    per_page = 25
+    page_param = 'progress_page'
     readonly_fields = ['lesson', 'is_completed', 'completed_at', 'time_spent_minutes']
     can_delete = False
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('lesson__course').order_by('lesson__order_index', 'pk')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param
+        formset.page_number = request.GET.get(self.page_param, 1)
+        formset.query_params = request.GET.copy()
+        if obj is not None:
+            formset.changelist_url = (
+                reverse('admin:app_lessonprogress_changelist') + f'?enrollment__id__exact={obj.pk}'
+            )
+        return formset
+
 
 # ==================== PROFILE ====================
 
@@ -30,12 +194,16 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'is_instructor', 'phone', 'created_at']
     list_filter = ['is_instructor', 'created_at']
     search_fields = ['user__username', 'user__email', 'bio']
-    readonly_fields = ['created_at', 'updated_at']
+    autocomplete_fields = ['user']
+    readonly_fields = ['created_at', 'updated_at', 'courses_taught_count', 'enrollment_count']
     
     fieldsets = (
         ('Usuario', {
             'fields': ('user',)
         }),
+        ('Actividad', {
+            'fields': ('courses_taught_count', 'enrollment_count')
+        }),
         ('Información personal', {
             'fields': ('bio', 'birth_date', 'phone', 'avatar')
         }),
@@ -47,17 +215,21 @@ class ProfileAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('user')
 
 
 # ==================== CATEGORIES & LOOKUPS ====================
 
 @admin.register(Course_Category)
 class CourseCategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'is_active', 'created_at']
+    list_display = ['name', 'slug', 'is_active', 'course_count', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'course_count']
 
 
 @admin.register(DifficultyLevel)
@@ -83,6 +255,14 @@ class EnrollmentStatusAdmin(admin.ModelAdmin):
 
 # ==================== COURSES ====================
 
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(label='Archivo', help_text='JSON (array o un curso por línea) o CSV')
+    file_format = forms.ChoiceField(
+        label='Formato', required=False,
+        choices=[('', 'Según la extensión'), ('json', 'JSON'), ('csv', 'CSV')],
+    )
+
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'category', 'difficulty_level', 
@@ -90,11 +270,13 @@ class CourseAdmin(admin.ModelAdmin):
     list_filter = ['category', 'difficulty_level', 'status', 'language', 
                    'published_at', 'created_at']
     search_fields = ['title', 'description', 'instructor__username']
+    autocomplete_fields = ['instructor']
     prepopulated_fields = {'slug': ('title',)}
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'updated_at']
     inlines = [LessonInline]
+    change_list_template = 'admin/app/course/change_list.html'
     
     fieldsets = (
         ('Información básica', {
@@ -119,15 +301,71 @@ class CourseAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs.select_related('instructor', 'category', 'difficulty_level', 'status')
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='app_course_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Sube un paquete del catálogo y lo importa en segundo plano"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        if getattr(settings, 'JOB_QUEUE_EAGER', False):
+            # Sin worker la importación correría dentro de esta petición
+            self.message_user(
+                request, 'No hay worker de la cola (JOB_QUEUE_EAGER): arranca run_jobs o importa '
+                'el archivo con "manage.py import_catalog".', messages.ERROR,
+            )
+            return redirect('admin:app_course_changelist')
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            file_format = form.cleaned_data['file_format'] or detect_format(upload.name)
+            stored = default_storage.save(f'imports/{upload.name}', upload)
+            enqueue('import_catalog', {'path': stored, 'file_format': file_format})
+            self.message_user(
+                request, f'Importación de {upload.name} encolada; los cursos aparecerán al terminar.',
+                messages.SUCCESS,
+            )
+            return redirect('admin:app_course_changelist')
+        return TemplateResponse(request, 'admin/app/course/import_catalog.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Importar catálogo',
+            'opts': self.model._meta,
+            'form': form,
+        })
+
 
 # ==================== LESSONS ====================
 
+class LessonAdminForm(forms.ModelForm):
+    """El contenido se edita como texto aunque se guarde en LessonContent"""
+    content = forms.CharField(widget=forms.Textarea, required=False, label='Contenido')
+
+    class Meta:
+        model = Lesson
+        exclude = ['body']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['content'].initial = self.instance.content
+
+    def save(self, commit=True):
+        self.instance.content = self.cleaned_data['content']
+        return super().save(commit=commit)
+
+
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    form = LessonAdminForm
     list_display = ['title', 'course', 'lesson_type', 'order_index', 
                     'duration_minutes', 'is_published', 'is_free', 'created_at']
-    list_filter = ['lesson_type', 'is_published', 'is_free', 'created_at', 'course']
-    search_fields = ['title', 'description', 'content', 'course__title']
+    # Sin filtro por curso: listaría todos los cursos. Se puede filtrar con
+    # ?course__id__exact= o buscando por el título del curso.
+    list_filter = ['lesson_type', 'is_published', 'is_free', 'created_at']
+    search_fields = ['title', 'description', 'course__title']
+    autocomplete_fields = ['course']
     date_hierarchy = 'created_at'
     ordering = ['course', 'order_index']
     readonly_fields = ['created_at', 'updated_at']
@@ -156,14 +394,15 @@ class LessonAdmin(admin.ModelAdmin):
 # ==================== ENROLLMENTS ====================
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'status', 'progress_percentage', 
                     'enrolled_at', 'completed_at']
-    list_filter = ['status', 'enrolled_at', 'completed_at']
+    list_filter = ['status', 'progress_archived', 'enrolled_at', 'completed_at']
     search_fields = ['user__username', 'course__title']
+    autocomplete_fields = ['user', 'course', 'current_lesson']
     date_hierarchy = 'enrolled_at'
     ordering = ['-enrolled_at']
-    readonly_fields = ['enrolled_at', 'last_accessed_at']
+    readonly_fields = ['enrolled_at', 'last_accessed_at', 'progress_archived']
     inlines = [LessonProgressInline]
     
     fieldsets = (
@@ -171,7 +410,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
             'fields': ('user', 'course', 'status')
         }),
         ('Progreso', {
-            'fields': ('progress_percentage', 'current_lesson', 'notes')
+            'fields': ('progress_percentage', 'current_lesson', 'notes', 'progress_archived')
         }),
         ('Fechas', {
             'fields': ('enrolled_at', 'completed_at', 'last_accessed_at'),
@@ -181,17 +420,18 @@ class EnrollmentAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('user', 'course', 'status', 'current_lesson')
+        return qs.select_related('user', 'course', 'status', 'current_lesson__course')
 
 
 # ==================== LESSON PROGRESS ====================
 
 @admin.register(LessonProgress)
-class LessonProgressAdmin(admin.ModelAdmin):
+class LessonProgressAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['enrollment', 'lesson', 'is_completed', 'time_spent_minutes', 
                     'completed_at', 'last_accessed_at']
     list_filter = ['is_completed', 'completed_at', 'last_accessed_at']
     search_fields = ['enrollment__user__username', 'lesson__title']
+    autocomplete_fields = ['enrollment', 'lesson']
     date_hierarchy = 'last_accessed_at'
     ordering = ['-last_accessed_at']
     readonly_fields = ['last_accessed_at']
@@ -207,16 +447,17 @@ class LessonProgressAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('enrollment__user', 'lesson')
+        return qs.select_related('enrollment__user', 'enrollment__course', 'lesson__course')
 
 
 # ==================== COMMENTS ====================
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'rating', 'is_review', 'created_at']
     list_filter = ['rating', 'is_review', 'created_at']
     search_fields = ['user__username', 'course__title', 'content']
+    autocomplete_fields = ['user', 'course']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'updated_at']
@@ -233,4 +474,15 @@ class CommentAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('user', 'course')
\ No newline at end of file
+        return qs.select_related('user', 'course')
+
+
+# ==================== BACKGROUND JOBS ====================
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'run_at', 'locked_by', 'updated_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'dedupe_key']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'updated_at', 'locked_by', 'locked_at', 'last_error']
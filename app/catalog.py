@@ -0,0 +1,228 @@
+"""
+Snapshot del catálogo público.
+
+El catálogo (todos los cursos publicados con instructor, categoría, nivel,
+calificación y número de lecciones) se genera como un documento JSON
+estático, comprimido con gzip y, si está instalado ``brotli``, también con
+brotli. Se guarda en ``CATALOG_SNAPSHOT_DIR`` y ``/api/lms/catalog/`` lo
+sirve desde memoria con un ETag fuerte por codificación: servirlo no hace
+ninguna consulta, solo comprueba con ``stat`` si el manifiesto cambió.
+
+Los cambios en los datos que muestra el catálogo (ver ``app.signals``)
+encolan una reconstrucción con retraso (``CATALOG_SNAPSHOT_DEBOUNCE``
+segundos) y una ``dedupe_key`` fija, así que una ráfaga de cambios produce
+una sola reconstrucción. Además, durante la primera mitad del retraso cada
+proceso da por encolada la reconstrucción y no vuelve a escribir en la cola.
+
+Sin worker (``JOB_QUEUE_EAGER``) reconstruir al confirmar cada escritura la
+haría más lenta: el cambio solo deja una marca (``pending``) y la primera
+lectura que llegue cuando el snapshot tenga más de
+``CATALOG_SNAPSHOT_DEBOUNCE`` segundos lo reconstruye.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from .compiled import CompiledSerializer
+from .jobs import enqueue
+from .metrics import record_cache
+from .models import Course, Enrollment, Lesson, related_count
+from .serializers import CourseListSerializer
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se sirve gzip
+    brotli = None
+
+MANIFEST = 'catalog.json'
+PENDING = 'pending'
+# Calidad de brotli al reconstruir dentro de una petición: la 11 tarda demasiado
+LAZY_BROTLI_QUALITY = 5
+
+_lock = threading.Lock()
+_loaded = {'stamp': None, 'digest': None, 'encodings': {}}
+# Hasta cuándo (time.monotonic) hay una reconstrucción encolada por este proceso
+_scheduled = {'until': 0.0}
+
+
+def _directory():
+    return settings.CATALOG_SNAPSHOT_DIR
+
+
+# ==================== GENERACIÓN ====================
+
+def catalog_queryset():
+    return Course.objects.filter(published_at__isnull=False).select_related(
+        'instructor', 'category', 'difficulty_level', 'rating_summary'
+    ).annotate(
+        lesson_total=related_count(Lesson),
+        enrollment_total=related_count(Enrollment),
+    ).order_by('-published_at', 'pk')
+
+
+def render_catalog():
+    """Documento JSON del catálogo (bytes)"""
+    compiled = CompiledSerializer(CourseListSerializer)
+    data = compiled.to_representation(compiled.values(catalog_queryset()))
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as output:
+        output.write(content)
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(brotli_quality=11):
+    """
+    Genera el snapshot y sus versiones comprimidas y publica el manifiesto.
+    Devuelve el digest del documento.
+    """
+    directory = _directory()
+    # Antes de leer los datos: un cambio posterior deja otra marca
+    _remove_pending()
+    content = render_catalog()
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    os.makedirs(directory, exist_ok=True)
+
+    files = {'identity': f'catalog-{digest}.json'}
+    encoded = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(content, quality=brotli_quality)
+    for encoding, data in encoded.items():
+        files[encoding] = f'catalog-{digest}.json.{"gz" if encoding == "gzip" else encoding}'
+        _write_atomic(os.path.join(directory, files[encoding]), data)
+    _write_atomic(os.path.join(directory, files['identity']), content)
+    # El manifiesto se publica al final: los lectores nunca ven un snapshot a medias
+    _write_atomic(os.path.join(directory, MANIFEST), json.dumps({'digest': digest, 'files': files}).encode())
+
+    for filename in os.listdir(directory):
+        if filename.startswith('catalog-') and filename not in files.values():
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+    return digest
+
+
+def _remove_pending():
+    try:
+        os.remove(os.path.join(_directory(), PENDING))
+    except FileNotFoundError:
+        pass
+
+
+def _mark_pending():
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, PENDING), 'w'):
+        pass
+
+
+def schedule_rebuild():
+    """Encola una reconstrucción; las que lleguen antes de que corra se descartan"""
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        transaction.on_commit(_mark_pending, robust=True)
+        return
+    delay = getattr(settings, 'CATALOG_SNAPSHOT_DEBOUNCE', 30)
+    if time.monotonic() < _scheduled['until']:
+        return
+    enqueue('build_catalog_snapshot', dedupe_key='catalog-snapshot', delay=delay)
+    # Solo la primera mitad: lo que se confirme después podría llegar tarde
+    transaction.on_commit(lambda: _scheduled.update(until=time.monotonic() + delay / 2))
+
+
+# ==================== SERVICIO ====================
+
+def _manifest_stamp():
+    try:
+        stat = os.stat(os.path.join(_directory(), MANIFEST))
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _rebuild_if_pending():
+    """Sin worker: reconstruye si hay cambios y el snapshot tiene más del retraso"""
+    directory = _directory()
+    if not os.path.exists(os.path.join(directory, PENDING)):
+        return
+    try:
+        built = os.stat(os.path.join(directory, MANIFEST)).st_mtime
+    except FileNotFoundError:
+        built = 0
+    if time.time() - built < getattr(settings, 'CATALOG_SNAPSHOT_DEBOUNCE', 30):
+        return
+    with _lock:
+        # Si otro hilo o proceso ya quitó la marca, es quien reconstruye
+        if os.path.exists(os.path.join(directory, PENDING)):
+            build_snapshot(brotli_quality=LAZY_BROTLI_QUALITY)
+
+
+def load_snapshot():
+    """
+    Devuelve ``(digest, {codificación: bytes})`` del snapshot publicado,
+    generándolo si todavía no existe. Solo se relee del disco cuando el
+    manifiesto cambia.
+    """
+    _rebuild_if_pending()
+    stamp = _manifest_stamp()
+    if stamp is not None and stamp == _loaded['stamp']:
+        record_cache('catalog_snapshot', True)
+        return _loaded['digest'], _loaded['encodings']
+
+    record_cache('catalog_snapshot', False)
+    with _lock:
+        stamp = _manifest_stamp()
+        if stamp is None:
+            build_snapshot()
+            stamp = _manifest_stamp()
+        if stamp != _loaded['stamp']:
+            directory = _directory()
+            with open(os.path.join(directory, MANIFEST)) as manifest_file:
+                manifest = json.load(manifest_file)
+            encodings = {}
+            for encoding, filename in manifest['files'].items():
+                with open(os.path.join(directory, filename), 'rb') as snapshot:
+                    encodings[encoding] = snapshot.read()
+            _loaded.update(stamp=stamp, digest=manifest['digest'], encodings=encodings)
+    return _loaded['digest'], _loaded['encodings']
+
+
+def _choose_encoding(request, available):
+    accepted = request.headers.get('Accept-Encoding', '')
+    for encoding in ('br', 'gzip'):
+        if encoding in available and re.search(rf'\b{encoding}\b', accepted):
+            return encoding
+    return 'identity'
+
+
+@require_GET
+def catalog_snapshot(request):
+    """Catálogo público pregenerado (``/api/lms/catalog/``)"""
+    digest, encodings = load_snapshot()
+    encoding = _choose_encoding(request, encodings)
+    etag = f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(encodings[encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'CATALOG_SNAPSHOT_MAX_AGE', 60)}"
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
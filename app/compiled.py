@@ -0,0 +1,230 @@
+"""
+Modo compilado, de solo lectura, para los serializers de listados.
+
+Un ``ModelSerializer`` normal crea una instancia del modelo por fila y
+luego recorre sus campos con ``get_attribute``. ``CompiledSerializer``
+analiza una vez los campos del serializer y obtiene las filas con
+``values_list()``: los campos simples (incluidos ``source='categoria.nombre'``)
+se leen directamente de la tupla y se pasan por el ``to_representation`` del
+propio campo, así que el resultado es idéntico al del serializer.
+
+Los campos que necesitan el objeto (``SerializerMethodField``,
+``source='*'``...) se declaran en ``Meta.compiled_sources`` con las rutas que
+usan; para ellos se monta una instancia ligera del modelo (sin ``__init__``)
+con solo esas columnas y sus relaciones ya cacheadas::
+
+    class Meta:
+        compiled_sources = {
+            'instructor_name': ['instructor.first_name', 'instructor.username'],
+            'total_lessons': ['lesson_total'],   # anotación del queryset
+        }
+
+Un campo que no se puede compilar lanza ``ImproperlyConfigured`` al compilar.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models.base import ModelState
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+
+# Combinaciones (campo del serializer, tipo de columna) cuyo to_representation
+# devuelve tal cual el valor que da la base de datos
+_PASSTHROUGH = {
+    serializers.CharField: {'CharField', 'TextField', 'SlugField'},
+    serializers.SlugField: {'SlugField'},
+    serializers.IntegerField: {
+        'AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+        'PositiveIntegerField', 'PositiveSmallIntegerField', 'PositiveBigIntegerField',
+    },
+    serializers.BooleanField: {'BooleanField'},
+}
+_SKIP = object()
+
+
+class _Path:
+    """Ruta ``a.b.c`` resuelta contra los modelos"""
+
+    def __init__(self, model, attrs):
+        self.attrs = list(attrs)
+        self.relations = []  # [(nombre, modelo, ¿puede faltar?, ¿es inversa?)]
+        self.field = None
+        current = model
+        for index, attr in enumerate(self.attrs):
+            try:
+                field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if index == 0:
+                    # Anotación del queryset (p. ej. un conteo)
+                    self.field = None
+                    return
+                raise ImproperlyConfigured(f'{current.__name__}.{attr} no es un campo del modelo')
+            last = index == len(self.attrs) - 1
+            if field.is_relation and not last:
+                if field.many_to_many or field.one_to_many:
+                    raise ImproperlyConfigured(f'{attr}: las relaciones múltiples no se pueden compilar')
+                reverse = field.auto_created and not field.concrete
+                self.relations.append((attr, field.related_model, reverse or field.null, reverse))
+                current = field.related_model
+            elif field.is_relation and (field.many_to_many or field.one_to_many):
+                raise ImproperlyConfigured(f'{attr}: las relaciones múltiples no se pueden compilar')
+            else:
+                self.field = field
+
+    @property
+    def lookup(self):
+        return '__'.join(self.attrs)
+
+
+class CompiledSerializer:
+    """
+    Versión compilada de ``serializer_class`` para un contexto dado. Se usa
+    con ``values(queryset)`` y ``to_representation(filas)``.
+    """
+
+    def __init__(self, serializer_class, context=None):
+        self.serializer = serializer_class(context=context or {})
+        self.model = serializer_class.Meta.model
+        meta_sources = getattr(serializer_class.Meta, 'compiled_sources', {})
+        self.lookups = []
+        self._index = {}
+        # (nombre, función) por campo, en el orden del serializer
+        self.columns = []
+        self.object_paths = []
+
+        for field in self.serializer._readable_fields:
+            if field.field_name in meta_sources:
+                for source in meta_sources[field.field_name]:
+                    self.object_paths.append(_Path(self.model, source.split('.')))
+                self.columns.append((field.field_name, self._object_column(field)))
+            elif isinstance(field, (serializers.BaseSerializer, ManyRelatedField, serializers.SerializerMethodField)) \
+                    or field.source == '*':
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{field.field_name}: declara sus rutas en Meta.compiled_sources'
+                )
+            else:
+                self.columns.append((field.field_name, self._value_column(field)))
+
+        self.builders = self._row_builders() if self.object_paths else None
+
+    def _slot(self, lookup):
+        if lookup not in self._index:
+            self._index[lookup] = len(self.lookups)
+            self.lookups.append(lookup)
+        return self._index[lookup]
+
+    # ---------- campos simples ----------
+
+    def _missing(self, field):
+        """Lo que haría ``Field.get_attribute`` si falta una relación intermedia"""
+        if field.default is not empty:
+            return lambda: field.get_default()
+        if field.allow_null:
+            return lambda: None
+        if not field.required:
+            return lambda: _SKIP
+        raise ImproperlyConfigured(f'{field.field_name}: la relación puede faltar y el campo es obligatorio')
+
+    def _value_column(self, field):
+        path = _Path(self.model, field.source_attrs)
+        if path.field is not None and not path.field.concrete:
+            raise ImproperlyConfigured(f'{field.field_name}: {path.lookup} no es una columna')
+        if path.field is None and path.relations:
+            raise ImproperlyConfigured(f'{field.field_name}: {path.lookup} no es un campo del modelo')
+        value_slot = self._slot(path.lookup)
+
+        # Relación inversa que no existe: DRF devuelve None (ObjectDoesNotExist)
+        checks = []
+        for index, (_, _, optional, reverse) in enumerate(path.relations):
+            if optional:
+                checks.append((self._slot('__'.join(path.attrs[:index + 1])), reverse))
+        missing = self._missing(field) if any(not reverse for _, reverse in checks) else None
+
+        if isinstance(field, PrimaryKeyRelatedField):
+            convert = field.pk_field.to_representation if field.pk_field is not None else None
+        elif path.field is not None and path.field.get_internal_type() in _PASSTHROUGH.get(type(field), ()):
+            convert = None
+        else:
+            convert = field.to_representation
+
+        def column(row, instance):
+            for slot, reverse in checks:
+                if row[slot] is None:
+                    return None if reverse else missing()
+            value = row[value_slot]
+            if value is None:
+                return None
+            return convert(value) if convert is not None else value
+        return column
+
+    # ---------- campos que necesitan el objeto ----------
+
+    def _object_column(self, field):
+        def column(row, instance):
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                return _SKIP
+            if attribute is None:
+                return None
+            return field.to_representation(attribute)
+        return column
+
+    def _row_builders(self):
+        """
+        Prepara cómo montar la instancia ligera: para cada prefijo de
+        relación, su modelo y qué huecos de la fila van a qué atributos.
+        """
+        pk = self.model._meta.pk.attname
+        nodes = {(): {'model': self.model, 'key': None, 'attrs': [(pk, self._slot(pk))]}}
+        for path in self.object_paths:
+            for depth, (_, model, _, _) in enumerate(path.relations, start=1):
+                prefix = tuple(path.attrs[:depth])
+                if prefix not in nodes:
+                    key_slot = self._slot('__'.join(prefix))
+                    nodes[prefix] = {
+                        'model': model, 'key': key_slot,
+                        'attrs': [(model._meta.pk.attname, key_slot)],
+                    }
+            prefix = tuple(path.attrs[:len(path.relations)])
+            attname = path.field.attname if path.field is not None else path.attrs[-1]
+            nodes[prefix]['attrs'].append((attname, self._slot(path.lookup)))
+        # Padres antes que hijos
+        return sorted(nodes.items(), key=lambda item: len(item[0]))
+
+    def _build_instance(self, row):
+        built = {}
+        for prefix, node in self.builders:
+            parent = built.get(prefix[:-1]) if prefix else None
+            if prefix and parent is None:
+                continue
+            if prefix and row[node['key']] is None:
+                parent._state.fields_cache[prefix[-1]] = None
+                continue
+            instance = node['model'].__new__(node['model'])
+            instance._state = ModelState()
+            instance._state.adding = False
+            instance.__dict__.update({attname: row[slot] for attname, slot in node['attrs']})
+            if prefix:
+                parent._state.fields_cache[prefix[-1]] = instance
+            built[prefix] = instance
+        return built[()]
+
+    # ---------- uso ----------
+
+    def values(self, queryset):
+        """QuerySet de tuplas con las columnas que necesita el serializer"""
+        return queryset.select_related(None).prefetch_related(None).values_list(*self.lookups)
+
+    def to_representation(self, rows):
+        columns = self.columns
+        build = self._build_instance if self.builders else None
+        data = []
+        for row in rows:
+            instance = build(row) if build is not None else None
+            item = {}
+            for name, column in columns:
+                value = column(row, instance)
+                if value is not _SKIP:
+                    item[name] = value
+            data.append(item)
+        return serializers.ReturnList(data, serializer=self.serializer)
@@ -0,0 +1,70 @@
+"""
+Contadores desnormalizados.
+
+``Course_Category.course_count``, ``Profile.courses_taught_count`` y
+``Profile.enrollment_count`` se guardan en la fila para que leerlos no
+cueste ninguna consulta. Las señales (``app.signals``) y el importador los
+ajustan con ``F()`` en la misma transacción que el cambio; las operaciones
+que no envían señales (``QuerySet.update``, SQL a mano) pueden desviarlos y
+``reconcile_counters`` los recalcula.
+"""
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import Course, Course_Category, Enrollment, Profile, related_count
+from .versions import touch
+
+# (modelo, contador, modelo contado, su clave foránea, columna a la que apunta)
+COUNTERS = [
+    (Course_Category, 'course_count', Course, 'category', 'pk'),
+    (Profile, 'courses_taught_count', Course, 'instructor', 'user_id'),
+    (Profile, 'enrollment_count', Enrollment, 'user', 'user_id'),
+]
+
+
+def adjust(model, field, deltas, key='pk'):
+    """
+    Suma a ``field`` el delta de cada fila (``{valor de key: delta}``) con
+    una sentencia ``UPDATE`` por valor distinto de delta.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta and pk is not None:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(**{f'{key}__in': pks}).update(**{field: F(field) + delta})
+    if by_delta:
+        touch(model)
+
+
+def _expressions(model):
+    return {
+        field: related_count(counted, foreign_key, outer)
+        for counter_model, field, counted, foreign_key, outer in COUNTERS
+        if counter_model is model
+    }
+
+
+def recount(queryset):
+    """Recalcula todos los contadores de las filas de ``queryset``"""
+    touch(queryset.model)
+    return queryset.update(**_expressions(queryset.model))
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Corrige los contadores que no coinciden con el conteo real. Devuelve
+    ``{'Modelo.campo': filas corregidas}``.
+    """
+    fixed = {}
+    for model, field, counted, foreign_key, outer in COUNTERS:
+        stale = model.objects.annotate(
+            actual=related_count(counted, foreign_key, outer)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+        pks = list(stale)
+        if pks and not dry_run:
+            model.objects.filter(pk__in=pks).update(**{field: related_count(counted, foreign_key, outer)})
+            touch(model)
+        fixed[f'{model.__name__}.{field}'] = len(pks)
+    return fixed
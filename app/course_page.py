@@ -0,0 +1,189 @@
+"""
+Página de curso compuesta (``/api/lms/courses/{slug}/page/``).
+
+Reúne en una respuesta lo que la página de un curso pedía en cinco
+llamadas: el detalle, las lecciones, las estadísticas, la primera página
+de comentarios y la inscripción del usuario. Cada sección se guarda por
+separado en la caché de Django y las que faltan se calculan a la vez en un
+pool de hilos acotado (``COURSE_PAGE_WORKERS``).
+
+Las claves de caché incluyen la versión de los datos de los que depende la
+sección (curso, lecciones, inscripciones, comentarios), guardada con
+``app.versions`` en la base de datos. Las señales (``app.signals``) y las
+tareas del worker la cambian al confirmar, así que una sección nunca se
+sirve desactualizada por esos cambios, los haga el proceso que los haga; lo
+demás (p. ej. renombrar al instructor) caduca con
+``COURSE_PAGE_CACHE_TIMEOUT``.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.db.models import Count, Prefetch, Q
+
+from .metrics import record_cache
+from .models import Comment, Course, CourseRatingSummary, Enrollment, Lesson
+from .serializers import (
+    CommentListSerializer, CourseSerializer, EnrollmentListSerializer, LessonListSerializer
+)
+from .versions import touch_keys, versions
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ==================== VERSIONES ====================
+
+def _version_key(course_id, topic):
+    return f'course-page:{course_id}:{topic}'
+
+
+def bump(course_id, topic):
+    """Invalida, al confirmar, las secciones del curso que dependen de ``topic``"""
+    touch_keys(_version_key(course_id, topic))
+
+
+def _versions(course_id, topics):
+    keys = {topic: _version_key(course_id, topic) for topic in topics}
+    found = versions(list(keys.values()))
+    return {topic: found[key] for topic, key in keys.items()}
+
+
+# ==================== SECCIONES ====================
+
+def course_stats(course):
+    """Estadísticas de un curso (el curso debe traer ``rating_summary``)"""
+    enrollments = course.enrollments.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(status__status_name__iexact='active')),
+        completed=Count('pk', filter=Q(status__status_name__iexact='completed')),
+    )
+    summary = getattr(course, 'rating_summary', None) or CourseRatingSummary()
+    return {
+        'total_enrollments': enrollments['total'],
+        'active_enrollments': enrollments['active'],
+        'completed_enrollments': enrollments['completed'],
+        'total_lessons': course.lessons.count(),
+        'total_reviews': summary.total_reviews,
+        'average_rating': summary.average_rating,
+        'total_duration_hours': course.duration_hours,
+    }
+
+
+def _course(request, course_id):
+    course = Course.objects.select_related(
+        'instructor', 'category', 'difficulty_level', 'status', 'rating_summary'
+    ).prefetch_related(
+        Prefetch('lessons', queryset=Lesson.objects.select_related('lesson_type'))
+    ).get(pk=course_id)
+    return CourseSerializer(course, context={'request': request}).data
+
+
+def _lessons(request, course_id):
+    lessons = Lesson.objects.filter(course_id=course_id).select_related('lesson_type')
+    return LessonListSerializer(lessons, many=True).data
+
+
+def _stats(request, course_id):
+    return course_stats(Course.objects.select_related('rating_summary').get(pk=course_id))
+
+
+def _comments(request, course_id):
+    comments = Comment.objects.filter(course_id=course_id)
+    page = comments.select_related('user').order_by('-created_at', '-pk')[:settings.REST_FRAMEWORK['PAGE_SIZE']]
+    return {
+        'count': comments.count(),
+        'results': CommentListSerializer(page, many=True).data,
+    }
+
+
+def _enrollment(request, course_id):
+    if not request.user.is_authenticated:
+        return None
+    enrollment = Enrollment.objects.filter(
+        user=request.user, course_id=course_id
+    ).select_related('course', 'status').first()
+    return EnrollmentListSerializer(enrollment, context={'request': request}).data if enrollment else None
+
+
+# nombre -> (función, datos de los que depende, ¿depende del usuario?)
+SECTIONS = {
+    'course': (_course, ('course', 'lessons', 'enrollments', 'comments'), False),
+    'lessons': (_lessons, ('lessons',), False),
+    'stats': (_stats, ('course', 'lessons', 'enrollments', 'comments'), False),
+    'comments': (_comments, ('comments',), False),
+    'enrollment': (_enrollment, ('enrollments',), True),
+}
+
+
+# ==================== ENSAMBLADO ====================
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.COURSE_PAGE_WORKERS, thread_name_prefix='course-page'
+            )
+    return _executor
+
+
+def _in_worker(loader, request, course_id):
+    # Cada hilo tiene su conexión: se gestiona como al final de una petición
+    close_old_connections()
+    try:
+        return loader(request, course_id)
+    finally:
+        close_old_connections()
+
+
+def _section_key(name, course_id, versions, depends_on, request, private):
+    parts = [str(versions[topic]) for topic in depends_on]
+    parts.append(request.build_absolute_uri('/'))  # las URLs de imágenes son absolutas
+    if private:
+        parts.append(str(request.user.pk))
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'course-page:{course_id}:{name}:{digest}'
+
+
+def build_page(request, course_id):
+    """Devuelve ``{sección: datos}`` de la página del curso ``course_id``"""
+    versions = _versions(course_id, {topic for _, depends_on, _ in SECTIONS.values() for topic in depends_on})
+    keys = {
+        name: _section_key(name, course_id, versions, depends_on, request, private)
+        for name, (_, depends_on, private) in SECTIONS.items()
+        if not (private and not request.user.is_authenticated)
+    }
+    cached = cache.get_many(keys.values())
+
+    page, missing = {}, []
+    for name in SECTIONS:
+        key = keys.get(name)
+        if key is None:
+            page[name] = None
+        elif key in cached:
+            record_cache('course_page', True)
+            page[name] = cached[key]
+        else:
+            record_cache('course_page', False)
+            missing.append(name)
+
+    # Dentro de una transacción los otros hilos no verían los mismos datos
+    if settings.COURSE_PAGE_WORKERS > 1 and len(missing) > 1 and not connection.in_atomic_block:
+        futures = {
+            name: _pool().submit(_in_worker, SECTIONS[name][0], request, course_id) for name in missing
+        }
+        computed = {name: future.result() for name, future in futures.items()}
+    else:
+        computed = {name: SECTIONS[name][0](request, course_id) for name in missing}
+
+    if computed:
+        cache.set_many(
+            {keys[name]: data for name, data in computed.items()},
+            settings.COURSE_PAGE_CACHE_TIMEOUT,
+        )
+    page.update(computed)
+    return {name: page[name] for name in SECTIONS}
@@ -0,0 +1,51 @@
+"""
+Documentación OpenAPI diferida.
+
+drf_yasg y los objetos que describen cada operación (serializers de
+ejemplo, ``openapi.Parameter``...) solo hacen falta para generar el
+esquema. Las vistas declaran su documentación con
+``@api_doc(lambda: dict(...))`` y ``app.schema`` la aplica con
+``swagger_auto_schema`` justo antes de generarlo, así que arrancar un
+worker no importa drf_yasg ni instancia esos objetos.
+"""
+import importlib
+import threading
+
+_pending = []
+_lock = threading.Lock()
+
+
+class _LazyModule:
+    """Importa el módulo la primera vez que se accede a un atributo"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+# Para usar dentro de las funciones pasadas a ``api_doc``
+openapi = _LazyModule('drf_yasg.openapi')
+
+
+def api_doc(overrides):
+    """
+    Registra la documentación de una vista. ``overrides`` es una función
+    sin argumentos que devuelve los kwargs de ``swagger_auto_schema``.
+    """
+    def decorator(view_method):
+        with _lock:
+            _pending.append((view_method, overrides))
+        return view_method
+    return decorator
+
+
+def apply_api_docs():
+    """Aplica la documentación registrada (una sola vez por vista)"""
+    from drf_yasg.utils import swagger_auto_schema
+
+    with _lock:
+        while _pending:
+            view_method, overrides = _pending.pop()
+            swagger_auto_schema(**overrides())(view_method)
@@ -0,0 +1,274 @@
+"""
+Eventos en vivo por curso (Server-Sent Events).
+
+``/api/lms/courses/{slug}/events/`` mantiene abierta una respuesta
+``text/event-stream`` por la que llegan las inscripciones (altas, cambios
+de estado o de progreso, bajas) y las lecciones completadas del curso, así
+los paneles de instructor no necesitan sondear ``stats`` ni
+``/enrollments/?course=``. Requiere servir la aplicación con ASGI
+(``uvicorn lms_project.asgi:application``).
+
+Las señales llaman a ``publish`` y el evento se envía al confirmarse la
+transacción. El ``Broker`` del proceso lo reparte entre las conexiones
+abiertas de ese curso. Cada conexión agrupa lo que llega durante
+``EVENTS_COALESCE_WINDOW`` segundos en un solo mensaje, y si un mismo
+objeto cambia varias veces en la ventana solo se envía su último estado.
+
+El transporte entre procesos es configurable con ``EVENTS_BACKEND``:
+
+- ``app.events.LocalBackend``: solo dentro del proceso (un único worker,
+  desarrollo y pruebas).
+- ``app.events.PostgresBackend``: ``NOTIFY``/``LISTEN`` de PostgreSQL, para
+  varios workers y para los eventos que publica ``run_jobs``.
+
+Sin ``EVENTS_BACKEND`` se usa ``PostgresBackend`` si la base de datos es
+PostgreSQL y ``LocalBackend`` en otro caso.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Course, Enrollment
+
+logger = logging.getLogger(__name__)
+
+# Mismo formato que la API ('60.00')
+_percentage = Enrollment._meta.get_field('progress_percentage')
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+# ==================== BACKENDS ====================
+
+class LocalBackend:
+    """Entrega los eventos solo a las conexiones del mismo proceso"""
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, message):
+        self.dispatch(message)
+
+
+class PostgresBackend:
+    """
+    Reparte los eventos entre procesos con ``pg_notify``. Cada proceso con
+    conexiones abiertas escucha el canal desde un hilo con su propia
+    conexión.
+    """
+    channel = 'lms_events'
+    reconnect_delay = 5
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+        self._listening = False
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(message, cls=JSONEncoder)])
+
+    def listen(self):
+        """Arranca el hilo de escucha la primera vez que alguien se suscribe"""
+        with self._lock:
+            if not self._listening:
+                self._listening = True
+                threading.Thread(target=self._listen_forever, name='events-listen', daemon=True).start()
+
+    def _listen_forever(self):
+        database = connections['default']
+        while True:
+            raw = None
+            try:
+                raw = database.get_new_connection(database.get_connection_params())
+                raw.autocommit = True
+                with raw.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                while True:
+                    if select.select([raw], [], [], 30) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.dispatch(json.loads(raw.notifies.pop(0).payload))
+            except Exception:
+                logger.exception('Se cortó la escucha de eventos; reconectando en %s s', self.reconnect_delay)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            time.sleep(self.reconnect_delay)
+
+
+# ==================== BROKER ====================
+
+class Subscription:
+    """Cola de una conexión: agrupa por objeto lo recibido en la ventana"""
+
+    def __init__(self, course_id, loop):
+        self.course_id = course_id
+        self.loop = loop
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, message):
+        key = (message['type'], message['id'])
+        previous = self.pending.pop(key, None)
+        if previous is not None:
+            # Un solo evento por objeto con sus últimos valores; un alta seguida de
+            # cambios sigue siendo un alta
+            data = {**previous['data'], **message['data']}
+            if previous['data'].get('action') == 'created' and data.get('action') == 'updated':
+                data['action'] = 'created'
+            message = dict(message, data=data)
+        # En el orden de su último cambio
+        self.pending[key] = message
+        self.ready.set()
+
+    async def next_batch(self, window):
+        await self.ready.wait()
+        await asyncio.sleep(window)
+        batch = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return batch
+
+
+class Broker:
+    """Pub/sub del proceso: conexiones abiertas por curso"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        backend.start(self.dispatch)
+
+    def subscribe(self, course_id):
+        if hasattr(self.backend, 'listen'):
+            self.backend.listen()
+        subscription = Subscription(course_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[course_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.course_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.course_id]
+
+    def dispatch(self, message):
+        """Puede llamarse desde cualquier hilo"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(message['course'], ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:  # bucle cerrado: la conexión ya no existe
+                self.unsubscribe(subscription)
+
+
+def default_backend():
+    if connections['default'].vendor == 'postgresql':
+        return 'app.events.PostgresBackend'
+    return 'app.events.LocalBackend'
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = getattr(settings, 'EVENTS_BACKEND', None) or default_backend()
+            _broker = Broker(import_string(backend)())
+    return _broker
+
+
+def publish(course_id, event_type, object_id, data):
+    """
+    Publica un evento del curso cuando se confirme la transacción en curso.
+    ``data`` debe ser serializable con el ``JSONEncoder`` de DRF.
+    """
+    message = {'course': course_id, 'type': event_type, 'id': object_id, 'data': data}
+    transaction.on_commit(lambda: get_broker().backend.publish(message))
+
+
+def enrollment_event(enrollment, action):
+    """Datos de una inscripción para ``publish``; con ``action='deleted'`` solo el usuario"""
+    data = {'action': action, 'user': enrollment.user_id}
+    if action != 'deleted':
+        data.update(
+            status=enrollment.status_id,
+            progress_percentage=percentage(enrollment.progress_percentage),
+            completed_at=enrollment.completed_at,
+        )
+    return data
+
+
+def percentage(value):
+    return format(_percentage.to_python(value).quantize(Decimal('0.01')), 'f')
+
+
+# ==================== SSE ====================
+
+def _sse(event=None, data=None, comment=None):
+    if comment is not None:
+        return f': {comment}\n\n'
+    return f'event: {event}\ndata: {json.dumps(data, cls=JSONEncoder, ensure_ascii=False)}\n\n'
+
+
+async def _stream(course_id):
+    broker = get_broker()
+    subscription = broker.subscribe(course_id)
+    window = getattr(settings, 'EVENTS_COALESCE_WINDOW', 1.0)
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'EVENTS_STREAM_TIMEOUT', 300)
+    try:
+        # Si se corta, EventSource reconecta a los 3 s
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                batch = await asyncio.wait_for(subscription.next_batch(window), heartbeat)
+            except asyncio.TimeoutError:
+                # Mantiene viva la conexión a través de proxies
+                yield _sse(comment='keepalive')
+                continue
+            yield _sse('progress', {
+                'course': course_id,
+                'events': [{key: message[key] for key in ('type', 'id', 'data')} for message in batch],
+            })
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@require_GET
+async def course_events(request, slug):
+    """Eventos de inscripciones y progreso de un curso (``text/event-stream``)"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Los eventos en vivo requieren servir la aplicación con ASGI'}, status=501
+        )
+    course_id = await Course.objects.filter(slug=slug).values_list('pk', flat=True).afirst()
+    if course_id is None:
+        raise Http404
+    response = StreamingHttpResponse(_stream(course_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular la respuesta
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,143 @@
+"""
+Generación de variantes (miniaturas re-codificadas) de las imágenes
+subidas: ``Course.thumbnail`` y ``Profile.avatar``.
+
+Al guardar una imagen nueva se encola la tarea ``build_image_variants``
+(ver ``app.tasks``). El trabajo de Pillow se hace en un pool de procesos
+acotado por ``IMAGE_PIPELINE_WORKERS``; el proceso que ejecuta la tarea solo
+lee el original y guarda los resultados en el storage de la imagen.
+
+Las variantes se asocian al nombre del original (``source``); el storage no
+reutiliza nombres, así que un nombre distinto es una imagen distinta. Si una
+imagen no se puede procesar el fallo queda registrado para ese original y no
+se reintenta en cada guardado; ``manage.py generate_image_variants --force``
+lo vuelve a intentar.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+# nombre -> (ancho, alto, modo, formato). "crop" recorta al aspecto exacto,
+# "fit" encaja la imagen dentro del tamaño sin recortar.
+THUMBNAIL_VARIANTS = {
+    'thumb': (160, 90, 'crop', 'WEBP'),
+    'card': (480, 270, 'crop', 'WEBP'),
+    'large': (1280, 720, 'fit', 'JPEG'),
+}
+AVATAR_VARIANTS = {
+    'small': (64, 64, 'crop', 'WEBP'),
+    'medium': (256, 256, 'crop', 'WEBP'),
+}
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+            )
+        return _executor
+
+
+def render_variants(data, variants):
+    """
+    Genera las variantes de una imagen. Se ejecuta en el pool de procesos,
+    así que solo recibe y devuelve datos serializables.
+
+    Devuelve ``{nombre: (bytes, ancho, alto, formato)}``.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        rendered = {}
+        for name, (width, height, mode, image_format) in variants.items():
+            if mode == 'crop':
+                image = ImageOps.fit(original, (width, height), Image.Resampling.LANCZOS)
+            else:
+                image = original.copy()
+                image.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                background = Image.new('RGB', image.size, 'white')
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.getchannel('A'))
+                image = background
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+
+            buffer = io.BytesIO()
+            if image_format == 'JPEG':
+                image.save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+            else:
+                image.save(buffer, 'WEBP', quality=80, method=4)
+            rendered[name] = (buffer.getvalue(), image.width, image.height, image_format)
+        return rendered
+
+
+def delete_variants(storage, variants):
+    for name, variant in (variants or {}).items():
+        if name not in ('source', 'error'):
+            storage.delete(variant['name'])
+
+
+def build_variants(field_file, variants, previous=None):
+    """
+    Genera y guarda las variantes de ``field_file``. Devuelve el diccionario
+    a guardar en el campo ``*_variants`` del modelo: vacío si no hay imagen y
+    solo con ``source`` y ``error`` si no se pudo procesar.
+    """
+    storage = field_file.storage
+    delete_variants(storage, previous)
+    if not field_file:
+        return {}
+
+    try:
+        with field_file.open('rb') as source:
+            data = source.read()
+        future = _get_executor().submit(render_variants, data, variants)
+        rendered = future.result(timeout=getattr(settings, 'IMAGE_PIPELINE_TIMEOUT', 30))
+    except Exception as exc:
+        logger.exception('No se pudieron generar las variantes de %s', field_file.name)
+        return {'source': field_file.name, 'error': f'{type(exc).__name__}: {exc}'[:500]}
+
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+    stored = {'source': field_file.name}
+    for name, (content, width, height, image_format) in rendered.items():
+        target = f"{directory}/variants/{stem}-{name}.{EXTENSIONS[image_format]}"
+        stored[name] = {
+            'name': storage.save(target, ContentFile(content)),
+            'width': width,
+            'height': height,
+            'format': image_format.lower(),
+            'size': len(content),
+        }
+    return stored
+
+
+def variants_are_stale(field_file, variants):
+    return (field_file.name or '') != (variants or {}).get('source', '')
+
+
+def current_variants(field_file, variants):
+    """
+    Variantes generadas para la imagen actual. Las de una imagen anterior
+    (mientras se generan las nuevas) no se usan.
+    """
+    if not field_file or variants_are_stale(field_file, variants):
+        return {}
+    return {name: variant for name, variant in variants.items() if name not in ('source', 'error')}
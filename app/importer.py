@@ -0,0 +1,400 @@
+"""
+Importación masiva e idempotente del catálogo (cursos y lecciones).
+
+Los paquetes de otras plataformas llegan como JSON (un array de cursos o
+un curso por línea) o CSV (una fila por lección, con las columnas del curso
+repetidas y las filas de un mismo curso seguidas). Se leen por partes: en
+memoria solo está el lote en curso, sea cual sea el tamaño del archivo.
+
+Cada curso se identifica por su ``slug`` y cada lección por
+``(curso, source_key)``, así que reimportar el mismo archivo actualiza en
+lugar de duplicar. Categorías, niveles, estados, tipos de lección e
+instructores se resuelven con diccionarios en memoria; cada lote se
+escribe con ``bulk_create(update_conflicts=True)``.
+
+Formato de un curso en JSON::
+
+    {"slug": "django-101", "title": "...", "description": "...",
+     "instructor": "username", "category": "slug o nombre",
+     "difficulty_level": "Básico", "status": "Publicado",
+     "price": "19.99", "duration_hours": 10, "language": "es",
+     "requirements": "...", "learning_objectives": "...",
+     "published_at": "2025-01-01T00:00:00Z",
+     "lessons": [{"key": "id-externo", "title": "...", "lesson_type": "video",
+                  "content": "...", "duration_minutes": 15, ...}]}
+
+En CSV las columnas de la lección llevan el prefijo ``lesson_``
+(``lesson_key``, ``lesson_title``, ``lesson_type``...).
+"""
+import csv
+import json
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .catalog import schedule_rebuild
+from .counters import adjust
+from .course_page import bump
+from .models import (
+    Course, Course_Category, CourseStatus, DifficultyLevel, Lesson, LessonContent, LessonType, Profile
+)
+from .versions import touch
+
+CHUNK_SIZE = 1 << 16
+# Un curso (con sus lecciones) más grande que esto se considera un archivo corrupto
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+
+COURSE_FIELDS = (
+    'title', 'description', 'price', 'duration_hours', 'language',
+    'requirements', 'learning_objectives', 'published_at',
+)
+LESSON_FIELDS = (
+    'title', 'description', 'video_url', 'duration_minutes', 'order_index',
+    'is_published', 'is_free', 'attachments',
+)
+TRUE_VALUES = {'1', 'true', 'yes', 'si', 'sí', 't', 'y'}
+
+
+class ImportFormatError(ValueError):
+    """El archivo no tiene el formato esperado"""
+
+
+# ==================== LECTURA ====================
+
+def iter_json(stream, chunk_size=CHUNK_SIZE):
+    """
+    Devuelve uno a uno los objetos de un array JSON (``[{...}, {...}]``) o
+    de un archivo con un objeto por línea, sin cargar el archivo entero.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    in_array = None
+
+    def refill():
+        # Se descarta lo ya leído para no acumular el archivo en memoria
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    refill()
+    while True:
+        while position < len(buffer) and buffer[position] in (' \t\r\n,' if in_array else ' \t\r\n'):
+            position += 1
+        if position == len(buffer):
+            if eof:
+                if in_array:
+                    raise ImportFormatError('El array JSON no está cerrado')
+                return
+            refill()
+            continue
+
+        if in_array is None:
+            in_array = buffer[position] == '['
+            if in_array:
+                position += 1
+            continue
+        if in_array and buffer[position] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if eof:
+                raise ImportFormatError(f'JSON inválido: {error}') from error
+            if len(buffer) - position > MAX_RECORD_BYTES:
+                raise ImportFormatError('Registro demasiado grande o JSON inválido') from error
+            # El objeto sigue en el siguiente trozo
+            refill()
+            continue
+        if not isinstance(record, dict):
+            raise ImportFormatError('Cada curso debe ser un objeto JSON')
+        yield record
+        position = end
+
+
+def iter_csv(stream):
+    """
+    Agrupa las filas consecutivas de un mismo curso (``slug``) en un
+    registro con la misma forma que el JSON.
+    """
+    current = None
+    for row in csv.DictReader(stream):
+        row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        slug = row.get('slug') or slugify(row.get('title', ''))
+        if current is None or current['slug'] != slug:
+            if current is not None:
+                yield current
+            current = {key: value for key, value in row.items() if not key.startswith('lesson_')}
+            current['slug'] = slug
+            current['lessons'] = []
+        if row.get('lesson_title'):
+            # lesson_title -> title, salvo lesson_type que ya es el nombre en JSON
+            current['lessons'].append({
+                ('lesson_type' if key == 'lesson_type' else key[len('lesson_'):]): value
+                for key, value in row.items() if key.startswith('lesson_') and value != ''
+            })
+    if current is not None:
+        yield current
+
+
+def iter_records(stream, file_format):
+    if file_format == 'csv':
+        return iter_csv(stream)
+    if file_format == 'json':
+        return iter_json(stream)
+    raise ImportFormatError(f'Formato no soportado: {file_format}')
+
+
+def detect_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'json'
+
+
+# ==================== IMPORTACIÓN ====================
+
+@dataclass
+class ImportResult:
+    courses_created: int = 0
+    courses_updated: int = 0
+    lessons: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def courses(self):
+        return self.courses_created + self.courses_updated
+
+    def rate(self, count):
+        return count / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f'{self.courses} cursos ({self.courses_created} nuevos, {self.courses_updated} actualizados), '
+            f'{self.lessons} lecciones, {self.skipped} con errores en {self.elapsed:.1f} s '
+            f'({self.rate(self.courses):.0f} cursos/s, {self.rate(self.lessons):.0f} lecciones/s)'
+        )
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return _normalize(value) in TRUE_VALUES
+
+
+class CatalogImporter:
+    """
+    Importa registros de curso por lotes. ``max_errors`` limita cuántos
+    errores se guardan en el resultado (todos se cuentan en ``skipped``).
+    """
+
+    def __init__(self, batch_size=200, max_errors=100, progress=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.progress = progress
+        self.categories = {}
+        for category in Course_Category.objects.only('id', 'name', 'slug'):
+            self.categories[_normalize(category.slug)] = category.id
+            self.categories[_normalize(category.name)] = category.id
+        self.levels = {_normalize(name): pk for pk, name in DifficultyLevel.objects.values_list('id', 'level_name')}
+        self.statuses = {_normalize(name): pk for pk, name in CourseStatus.objects.values_list('id', 'status_name')}
+        self.lesson_types = {_normalize(name): pk for pk, name in LessonType.objects.values_list('id', 'type_name')}
+        self.instructors = {}
+
+    def run(self, records):
+        result = ImportResult()
+        batch = []
+        for index, record in enumerate(records, start=1):
+            batch.append((index, record))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, result)
+                batch = []
+        if batch:
+            self._import_batch(batch, result)
+        result.elapsed = time.perf_counter() - result.started
+        return result
+
+    # ---------- conversión ----------
+
+    def _lookup(self, mapping, value, label, required=False):
+        if value in (None, ''):
+            if required:
+                raise ValidationError(f'Falta {label}')
+            return None
+        try:
+            return mapping[_normalize(value)]
+        except KeyError:
+            raise ValidationError(f'{label} desconocido: {value}')
+
+    def _convert(self, model, name, value):
+        model_field = model._meta.get_field(name)
+        value = model_field.to_python(value)
+        if value is not None and model_field.get_internal_type() == 'DateTimeField' and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def _build_course(self, record):
+        """
+        Devuelve el curso y las columnas que trae el registro: al actualizar
+        un curso existente solo se escriben esas, no se borran las demás.
+        """
+        slug = record.get('slug') or slugify(record.get('title', ''))
+        if not slug:
+            raise ValidationError('El curso no tiene slug ni título')
+        course = Course(
+            slug=slug,
+            instructor_id=self._lookup(self.instructors, record.get('instructor'), 'instructor', required=True),
+            category_id=self._lookup(self.categories, record.get('category'), 'categoría', required=True),
+            difficulty_level_id=self._lookup(self.levels, record.get('difficulty_level'), 'nivel'),
+            status_id=self._lookup(self.statuses, record.get('status'), 'estado'),
+        )
+        fields = ['instructor', 'category'] + [
+            name for name in ('difficulty_level', 'status') if record.get(name) not in (None, '')
+        ]
+        for name in COURSE_FIELDS:
+            if record.get(name) not in (None, ''):
+                setattr(course, name, self._convert(Course, name, record[name]))
+                fields.append(name)
+        # Las claves ajenas ya están resueltas; validarlas costaría una consulta por campo
+        course.clean_fields(exclude=[
+            'instructor', 'category', 'difficulty_level', 'status', 'thumbnail', 'thumbnail_variants',
+            'description', 'requirements', 'learning_objectives',
+        ])
+        return course, tuple(fields)
+
+    def _build_lessons(self, record):
+        # Por source_key: una clave repetida se queda con la última lección
+        lessons = {}
+        for position, item in enumerate(record.get('lessons') or [], start=1):
+            lesson = Lesson(
+                source_key=str(item.get('key') or position),
+                lesson_type_id=self._lookup(self.lesson_types, item.get('lesson_type'), 'tipo de lección'),
+                order_index=position * Lesson.ORDER_GAP,
+            )
+            for name in LESSON_FIELDS:
+                value = item.get(name)
+                if value in (None, ''):
+                    continue
+                if name in ('is_published', 'is_free'):
+                    value = _bool(value)
+                elif name == 'attachments' and isinstance(value, str):
+                    value = json.loads(value)
+                else:
+                    value = self._convert(Lesson, name, value)
+                setattr(lesson, name, value)
+            if lesson.duration_minutes is None:
+                lesson.duration_minutes = 0
+            lesson.clean_fields(exclude=['course', 'lesson_type', 'body', 'description'])
+            lessons[lesson.source_key] = (lesson, item.get('content') or '')
+        return [lesson for lesson, _ in lessons.values()], [content for _, content in lessons.values()]
+
+    def _load_instructors(self, batch):
+        usernames = {
+            _normalize(record['instructor']) for _, record in batch
+            if record.get('instructor') and _normalize(record['instructor']) not in self.instructors
+        }
+        if usernames:
+            for pk, username in User.objects.filter(username__in=usernames).values_list('id', 'username'):
+                self.instructors[_normalize(username)] = pk
+
+    # ---------- escritura ----------
+
+    def _import_batch(self, batch, result):
+        self._load_instructors(batch)
+        courses, fields_by_slug, lessons_by_slug = {}, {}, {}
+        for index, record in batch:
+            try:
+                course, fields = self._build_course(record)
+                lessons_by_slug[course.slug] = self._build_lessons(record)
+            except (ValidationError, ValueError, TypeError) as error:
+                result.skipped += 1
+                if len(result.errors) < self.max_errors:
+                    message = '; '.join(error.messages) if isinstance(error, ValidationError) else str(error)
+                    result.errors.append(f"#{index} {record.get('slug') or record.get('title', '')}: {message}")
+                continue
+            # Si el slug se repite dentro del lote gana el último
+            courses[course.slug] = course
+            fields_by_slug[course.slug] = fields
+
+        if not courses:
+            return
+        with transaction.atomic():
+            existing = {
+                slug: (category_id, instructor_id)
+                for slug, category_id, instructor_id in Course.objects.filter(slug__in=courses)
+                .values_list('slug', 'category_id', 'instructor_id')
+            }
+            # Un upsert por combinación de columnas presentes (casi siempre una)
+            groups = defaultdict(list)
+            for slug, course in courses.items():
+                groups[fields_by_slug[slug]].append(course)
+            for fields, group in groups.items():
+                Course.objects.bulk_create(
+                    group,
+                    update_conflicts=True,
+                    unique_fields=['slug'],
+                    update_fields=['updated_at', *fields],
+                )
+            self._count_courses(courses, existing)
+            course_ids = dict(Course.objects.filter(slug__in=courses).values_list('slug', 'id'))
+
+            lessons, contents = [], []
+            for slug, (course_lessons, course_contents) in lessons_by_slug.items():
+                for lesson in course_lessons:
+                    lesson.course_id = course_ids[slug]
+                lessons.extend(course_lessons)
+                contents.extend(course_contents)
+            for lesson, content_hash in zip(lessons, LessonContent.objects.intern_many(contents)):
+                lesson.body_id = content_hash
+            Lesson.objects.bulk_create(
+                lessons,
+                update_conflicts=True,
+                unique_fields=['course', 'source_key'],
+                update_fields=['lesson_type', 'body', 'updated_at', *LESSON_FIELDS],
+            )
+            touch(Course, Lesson)
+
+        for course_id in course_ids.values():
+            bump(course_id, 'course')
+            bump(course_id, 'lessons')
+        result.courses_created += len(courses) - len(existing)
+        result.courses_updated += len(existing)
+        result.lessons += len(lessons)
+        if self.progress is not None:
+            result.elapsed = time.perf_counter() - result.started
+            self.progress(result)
+
+
+    def _count_courses(self, courses, existing):
+        """bulk_create no envía señales: los contadores se ajustan aquí"""
+        categories, instructors = Counter(), Counter()
+        for slug, course in courses.items():
+            if slug in existing:
+                category_id, instructor_id = existing[slug]
+                categories[category_id] -= 1
+                instructors[instructor_id] -= 1
+            categories[course.category_id] += 1
+            instructors[course.instructor_id] += 1
+        adjust(Course_Category, 'course_count', categories)
+        adjust(Profile, 'courses_taught_count', instructors, key='user_id')
+
+
+def import_catalog(stream, file_format, **options):
+    """Importa el catálogo de ``stream`` (texto) y devuelve un ``ImportResult``"""
+    result = CatalogImporter(**options).run(iter_records(stream, file_format))
+    if result.courses:
+        # bulk_create no envía señales: el snapshot se reconstruye aquí
+        schedule_rebuild()
+    return result
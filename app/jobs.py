@@ -0,0 +1,207 @@
+"""
+Cola de trabajos diferidos respaldada por la base de datos.
+
+Los trabajos se registran con ``@task('nombre')``, se encolan con
+``enqueue()`` y los ejecuta el comando ``manage.py run_jobs``. Los
+workers reclaman trabajos con ``SELECT ... FOR UPDATE SKIP LOCKED``, de
+modo que varios hilos o procesos pueden consumir la cola sin pisarse.
+Mientras un trabajo corre, un hilo renueva su bloqueo; uno que lleve
+``JOB_QUEUE_LOCK_TIMEOUT`` segundos sin renovarse es de un worker caído y
+se vuelve a reclamar.
+
+Con ``JOB_QUEUE_EAGER`` (el valor por defecto cuando no hay worker) las
+tareas se ejecutan en el propio proceso al confirmarse la transacción.
+"""
+import logging
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    DatabaseError, IntegrityError, close_old_connections, connections, transaction
+)
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, f'JOB_QUEUE_{name}', default)
+
+
+def task(name):
+    """Registra una función como tarea de la cola"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+# ==================== ENCOLAR ====================
+
+def enqueue(task_name, payload=None, dedupe_key=None, delay=0):
+    """
+    Encola ``task_name`` con ``payload`` (kwargs serializables en JSON).
+
+    La fila se inserta en la transacción en curso, así que el trabajo solo
+    es visible para los workers cuando ésta se confirma y desaparece si se
+    revierte. Si ya hay un trabajo pendiente con la misma ``dedupe_key`` el
+    nuevo se descarta. Con ``delay`` (segundos) se retrasa su ejecución.
+    """
+    if task_name not in _registry:
+        raise KeyError(f"Tarea desconocida: {task_name}")
+    payload = payload or {}
+
+    if _setting('EAGER', False):
+        # Sin worker: se ejecuta en este proceso al confirmar; un fallo se registra
+        # en el log sin afectar a la petición, que ya está confirmada
+        transaction.on_commit(lambda: _registry[task_name](**payload), robust=True)
+        return
+
+    Job.objects.bulk_create([
+        Job(
+            task=task_name,
+            payload=payload,
+            dedupe_key=dedupe_key,
+            max_attempts=_setting('MAX_ATTEMPTS', 5),
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+    ], ignore_conflicts=True)
+
+
+# ==================== WORKER ====================
+
+def claim(worker_id):
+    """Reclama el siguiente trabajo listo (o abandonado por un worker caído)"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('LOCK_TIMEOUT', 300))
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+            .order_by('run_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts', 'updated_at'])
+    return job
+
+
+def _heartbeat(job, stop_event):
+    """
+    Renueva ``locked_at`` mientras el trabajo corre: sin esto, otro worker
+    reclamaría como abandonado cualquier trabajo que dure más que
+    ``JOB_QUEUE_LOCK_TIMEOUT`` y lo ejecutaría a la vez.
+    """
+    interval = _setting('LOCK_TIMEOUT', 300) / 3
+    try:
+        while not stop_event.wait(interval):
+            try:
+                Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+                    locked_at=timezone.now()
+                )
+            except DatabaseError:
+                logger.exception('No se pudo renovar el bloqueo de %s', job)
+    finally:
+        connections.close_all()
+
+
+def _run(job):
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(job, stop_event), daemon=True, name=f'job-heartbeat-{job.pk}'
+    )
+    heartbeat.start()
+    try:
+        _registry[job.task](**job.payload)
+    finally:
+        stop_event.set()
+        heartbeat.join()
+
+
+def execute(job):
+    """Ejecuta un trabajo reclamado y registra el resultado"""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Se agotaron los reintentos (el worker anterior no terminó)')
+        _run(job)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Falló el trabajo %s (intento %s)', job, job.attempts)
+        if job.attempts >= job.max_attempts:
+            _finish(job, status=Job.FAILED, last_error=error)
+        else:
+            # Backoff exponencial con algo de jitter
+            backoff = min(_setting('BACKOFF_SECONDS', 10) * 2 ** (job.attempts - 1), 3600)
+            backoff *= random.uniform(0.8, 1.2)
+            _finish(
+                job, status=Job.PENDING, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=backoff),
+            )
+        return False
+    _finish(job, status=Job.DONE, last_error='')
+    return True
+
+
+def _finish(job, **fields):
+    fields.update(locked_by='', locked_at=None, updated_at=timezone.now())
+    try:
+        Job.objects.filter(pk=job.pk).update(**fields)
+    except IntegrityError:
+        # Ya hay otro pendiente con la misma clave: ese repetirá el trabajo
+        fields.update(status=Job.FAILED, run_at=job.run_at)
+        Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def purge_finished(days):
+    """Borra los trabajos terminados hace más de ``days`` días"""
+    limit = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status__in=[Job.DONE, Job.FAILED], updated_at__lt=limit).delete()[0]
+
+
+def work(worker_id, stop_event=None, once=False):
+    """
+    Bucle de un worker: reclama y ejecuta trabajos hasta que ``stop_event``
+    se activa, o hasta vaciar la cola si ``once`` es verdadero.
+    """
+    stop_event = stop_event or threading.Event()
+    poll_interval = _setting('POLL_INTERVAL', 1)
+    processed = 0
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                job = claim(worker_id)
+            except DatabaseError:
+                # Error transitorio (bloqueo, conexión caída): reintentar luego
+                logger.exception('El worker %s no pudo reclamar trabajos', worker_id)
+                stop_event.wait(poll_interval)
+                continue
+            if job is None:
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            execute(job)
+            processed += 1
+    finally:
+        connections.close_all()
+    return processed
+
+
+def worker_name(index):
+    return f'{socket.gethostname()}:{threading.get_native_id()}:{index}:{int(time.time())}'
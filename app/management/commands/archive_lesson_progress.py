@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.progress import (
+    archivable_enrollments, archive_cutoff, archive_enrollments, drop_empty_partitions,
+    ensure_partitions, is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = ('Archiva el progreso de las inscripciones terminadas o canceladas sin actividad '
+            'y mantiene las particiones de app_lessonprogress')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Días sin actividad para archivar (por defecto PROGRESS_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Inscripciones archivadas por transacción'
+        )
+        parser.add_argument(
+            '--drop-empty-partitions', action='store_true',
+            help='Elimina las particiones anuales vacías anteriores a la ventana de retención'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Solo muestra cuántas inscripciones se archivarían'
+        )
+
+    def handle(self, *args, **options):
+        enrollment_ids = list(
+            archivable_enrollments(options['days']).order_by('id').values_list('id', flat=True)
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{len(enrollment_ids)} inscripciones por archivar')
+            return
+
+        rows = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(enrollment_ids), batch_size):
+            rows += archive_enrollments(enrollment_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(enrollment_ids)} inscripciones archivadas ({rows} filas de progreso)'
+        ))
+
+        if not is_partitioned():
+            return
+        created = ensure_partitions(timezone.now().year + 1)
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'✓ Particiones creadas: {created}'))
+        if options['drop_empty_partitions']:
+            dropped = drop_empty_partitions(archive_cutoff(options['days']).year)
+            self.stdout.write(self.style.SUCCESS(f'✓ Particiones vacías eliminadas: {dropped}'))
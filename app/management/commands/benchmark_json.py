@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from app.models import Course, Enrollment
+from app.renderers import FastJSONRenderer, orjson_enabled
+from app.serializers import CourseListSerializer, EnrollmentListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara el renderer JSON de DRF con FastJSONRenderer sobre listados reales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Filas por listado')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por medición')
+
+    def _payloads(self, limit):
+        courses = Course.objects.select_related(
+            'instructor', 'category', 'difficulty_level', 'rating_summary'
+        ).prefetch_related('lessons', 'enrollments')[:limit]
+        enrollments = Enrollment.objects.select_related('user', 'course', 'status')[:limit]
+        return {
+            'courses': CourseListSerializer(courses, many=True).data,
+            'enrollments': EnrollmentListSerializer(enrollments, many=True).data,
+            # Filas sin serializar: Decimal y datetime llegan al encoder tal cual
+            'enrollments (values)': list(Enrollment.objects.values(
+                'id', 'user_id', 'course_id', 'progress_percentage', 'enrolled_at',
+                'completed_at', 'last_accessed_at',
+            )[:limit]),
+        }
+
+    def _time(self, renderer, data, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = renderer.render(data, 'application/json', {})
+            best = min(best, time.perf_counter() - start)
+        return best, content
+
+    def handle(self, *args, **options):
+        if not orjson_enabled():
+            self.stdout.write(self.style.WARNING('orjson no está disponible: se compara DRF consigo mismo'))
+        for name, data in self._payloads(options['limit']).items():
+            drf_time, drf_content = self._time(JSONRenderer(), data, options['repeat'])
+            fast_time, fast_content = self._time(FastJSONRenderer(), data, options['repeat'])
+            if drf_content != fast_content:
+                raise CommandError(f'La salida de FastJSONRenderer difiere de la de DRF en {name}')
+            self.stdout.write(
+                f'  {name} ({len(data)} filas, {len(fast_content) / 1024:.1f} KB): '
+                f'DRF {drf_time * 1000:.2f} ms, rápido {fast_time * 1000:.2f} ms '
+                f'(x{drf_time / fast_time:.1f})'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Salidas idénticas'))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from app.compiled import CompiledSerializer
+from app.views import CommentViewSet, CourseViewSet, EnrollmentViewSet, LessonViewSet
+
+
+class Command(BaseCommand):
+    help = ('Compara los serializers de listados de DRF con su versión compilada '
+            '(consulta incluida) y comprueba que la salida es idéntica')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Filas por listado')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por medición')
+
+    def _time(self, serialize, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = serialize()
+            best = min(best, time.perf_counter() - start)
+        return best, JSONRenderer().render(data)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        for viewset in (CourseViewSet, LessonViewSet, EnrollmentViewSet, CommentViewSet):
+            view = viewset(action='list', format_kwarg=None, request=None, kwargs={})
+            serializer_class = view.get_serializer_class()
+            queryset = view.get_queryset().annotate(**view.list_annotations).order_by('pk')[:limit]
+
+            def drf():
+                return serializer_class(queryset.all(), many=True).data
+
+            def compiled():
+                serializer = CompiledSerializer(serializer_class)
+                return serializer.to_representation(serializer.values(queryset))
+
+            drf_time, drf_content = self._time(drf, options['repeat'])
+            compiled_time, compiled_content = self._time(compiled, options['repeat'])
+            if drf_content != compiled_content:
+                raise CommandError(f'La salida compilada de {serializer_class.__name__} difiere de la de DRF')
+            self.stdout.write(
+                f'  {serializer_class.__name__} ({len(queryset)} filas): '
+                f'DRF {drf_time * 1000:.2f} ms, compilado {compiled_time * 1000:.2f} ms '
+                f'(x{drf_time / compiled_time:.1f})'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Salidas idénticas'))
@@ -0,0 +1,18 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.catalog import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Genera el snapshot comprimido del catálogo público'
+
+    def handle(self, *args, **options):
+        digest = build_snapshot()
+        directory = settings.CATALOG_SNAPSHOT_DIR
+        for filename in sorted(os.listdir(directory)):
+            if filename.startswith(f'catalog-{digest}'):
+                size = os.path.getsize(os.path.join(directory, filename))
+                self.stdout.write(f'  {filename} ({size / 1024:.1f} KB)')
+        self.stdout.write(self.style.SUCCESS(f'✓ Snapshot del catálogo generado ({digest})'))
@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand
+from app.schema import build_artifacts, code_version, artifact_path, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Genera el esquema OpenAPI comprimido para la versión actual del código'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Lo regenera aunque ya exista para esta versión'
+        )
+
+    def handle(self, *args, **options):
+        version = code_version()
+        if not options['force'] and all(
+            os.path.exists(artifact_path(version, extension)) for extension in FORMATS
+        ):
+            self.stdout.write(f'El esquema de la versión {version} ya existe')
+            return
+
+        for path in build_artifacts(version):
+            self.stdout.write(f'  {path} ({os.path.getsize(path) / 1024:.1f} KB)')
+        self.stdout.write(self.style.SUCCESS(f'✓ Esquema OpenAPI generado para la versión {version}'))
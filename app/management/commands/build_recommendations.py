@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from app.recommendations import DEFAULT_TOP_K, USER_CHUNK_SIZE, build_also_took
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el índice "students also took" a partir de las nuevas inscripciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recalcula la matriz de co-inscripción desde cero'
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=DEFAULT_TOP_K,
+            help=f'Vecinos a guardar por curso (por defecto {DEFAULT_TOP_K})'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=USER_CHUNK_SIZE,
+            help=f'Usuarios procesados por bloque (por defecto {USER_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        new_enrollments, courses = build_also_took(
+            full=options['full'], top_k=options['top_k'], chunk_size=options['chunk_size']
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {new_enrollments} inscripciones nuevas, {courses} cursos actualizados '
+            f'en {elapsed:.2f}s'
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from app.recommendations import DEFAULT_MAX_FEATURES, DEFAULT_TOP_K, build_similar_courses
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el índice de cursos similares (TF-IDF) de los cursos modificados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recalcula los vecinos de todos los cursos'
+        )
+        parser.add_argument(
+            '--top-n', type=int, default=DEFAULT_TOP_K,
+            help=f'Vecinos a guardar por curso (por defecto {DEFAULT_TOP_K})'
+        )
+        parser.add_argument(
+            '--max-features', type=int, default=DEFAULT_MAX_FEATURES,
+            help=f'Tamaño máximo del vocabulario (por defecto {DEFAULT_MAX_FEATURES})'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed, refreshed = build_similar_courses(
+            full=options['full'], top_k=options['top_n'], max_features=options['max_features']
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {changed} cursos modificados, {refreshed} listas de vecinos actualizadas '
+            f'en {elapsed:.2f}s'
+        ))
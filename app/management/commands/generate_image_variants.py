@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from app.images import AVATAR_VARIANTS, THUMBNAIL_VARIANTS, build_variants, variants_are_stale
+from app.models import Course, Profile
+from app.tasks import variants_updated
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes de miniaturas de cursos y avatares que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenera también las variantes que ya existen'
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            (Course, 'thumbnail', THUMBNAIL_VARIANTS),
+            (Profile, 'avatar', AVATAR_VARIANTS),
+        ]
+        for model, field, variants in targets:
+            variants_field = f'{field}_variants'
+            generated = []
+            queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for obj in queryset.only('pk', field, variants_field).iterator():
+                current = getattr(obj, variants_field)
+                if not options['force'] and not variants_are_stale(getattr(obj, field), current):
+                    continue
+                model.objects.filter(pk=obj.pk).update(**{
+                    variants_field: build_variants(getattr(obj, field), variants, previous=current),
+                    'updated_at': timezone.now(),
+                })
+                generated.append(obj.pk)
+            if generated:
+                variants_updated(model, generated)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {model._meta.verbose_name_plural}: {len(generated)} imágenes procesadas'
+            ))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importer import ImportFormatError, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Importa (o actualiza) cursos y lecciones desde un paquete JSON o CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar ("-" para leer de la entrada estándar)')
+        parser.add_argument(
+            '--format', choices=['json', 'csv'], default=None,
+            help='Formato del archivo (por defecto, según la extensión)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Cursos escritos por transacción'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+
+        def progress(result):
+            self.stdout.write(
+                f'  {result.courses} cursos, {result.lessons} lecciones '
+                f'({result.rate(result.courses):.0f} cursos/s, {result.rate(result.lessons):.0f} lecciones/s)'
+            )
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            with stream:
+                result = import_catalog(
+                    stream, file_format, batch_size=options['batch_size'], progress=progress
+                )
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f'  ✗ {error}'))
+        if result.skipped > len(result.errors):
+            self.stdout.write(self.style.WARNING(f'  ... y {result.skipped - len(result.errors)} errores más'))
+        self.stdout.write(self.style.SUCCESS(f'✓ {result.summary()}'))
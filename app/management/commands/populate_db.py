@@ -351,6 +351,8 @@ class Command(BaseCommand):
                 
                 # Crear lecciones
                 for lesson_data in lessons:
+                    # Posiciones separadas por ORDER_GAP, como las que asigna la API
+                    lesson_data['order_index'] *= Lesson.ORDER_GAP
                     lesson = Lesson.objects.create(
                         course=course,
                         **lesson_data
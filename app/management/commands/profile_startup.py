@@ -0,0 +1,118 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un intérprete nuevo: arranca Django como lo haría un worker
+# WSGI y atiende una primera petición.
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+settings.METRICS_DIR = ''  # la petición de prueba no cuenta en /metrics
+from django.core.wsgi import get_wsgi_application
+from wsgiref.util import setup_testing_defaults
+application = get_wsgi_application()
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2]}
+setup_testing_defaults(environ)
+status = []
+b''.join(application(environ, lambda code, headers, exc_info=None: status.append(code)))
+end = time.perf_counter()
+print(json.dumps({
+    'setup': setup_done - start,
+    'first_request': end - start,
+    'status': status[0],
+    'modules': sorted(sys.modules),
+}))
+'''
+
+# Módulos que no deben cargarse al arrancar: solo se usan en la
+# documentación, comandos de gestión o tareas en segundo plano
+DEFAULT_FORBIDDEN = ['drf_yasg', 'numpy', 'PIL', 'pkg_resources']
+
+
+def parse_importtime(stderr):
+    """Devuelve ``[(módulo, self_us, cumulative_us)]`` de la salida de -X importtime"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de importación por módulo y el tiempo hasta la primera petición'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/lms/', help='Ruta de la primera petición')
+        parser.add_argument('--host', default='localhost', help='Cabecera Host de la petición')
+        parser.add_argument('--runs', type=int, default=3, help='Arranques a medir (se usa la mediana)')
+        parser.add_argument('--top', type=int, default=20, help='Módulos a mostrar')
+        parser.add_argument(
+            '--budget-ms', type=float,
+            help='Falla si la mediana hasta la primera petición supera este tiempo'
+        )
+        parser.add_argument(
+            '--forbid', action='append', default=None,
+            help=f'Módulo que no debe importarse al arrancar (por defecto: {", ".join(DEFAULT_FORBIDDEN)})'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+
+        results = []
+        for _ in range(max(options['runs'], 1)):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', PROBE, options['url'], options['host']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if process.returncode != 0:
+                raise CommandError(f'El arranque falló:\n{process.stderr[-2000:]}')
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            result['imports'] = parse_importtime(process.stderr)
+            results.append(result)
+
+        last = results[-1]
+        imports = last['imports']
+        self.stdout.write(f"\nMódulos con más tiempo acumulado (de {len(imports)} importados):")
+        for name, self_us, cumulative_us in sorted(imports, key=lambda m: -m[2])[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  (propio {self_us / 1000:6.1f} ms)  {name}")
+
+        packages = defaultdict(int)
+        for name, self_us, _ in imports:
+            packages[name.split('.')[0]] += self_us
+        self.stdout.write('\nTiempo propio por paquete:')
+        for package, total_us in sorted(packages.items(), key=lambda p: -p[1])[:options['top']]:
+            self.stdout.write(f"  {total_us / 1000:8.1f} ms  {package}")
+
+        setup_ms = statistics.median(r['setup'] for r in results) * 1000
+        first_ms = statistics.median(r['first_request'] for r in results) * 1000
+        self.stdout.write(
+            f"\ndjango.setup(): {setup_ms:.0f} ms · primera petición ({last['status']}): "
+            f"{first_ms:.0f} ms · mediana de {len(results)} arranques"
+        )
+
+        errors = []
+        forbidden = options['forbid'] if options['forbid'] is not None else DEFAULT_FORBIDDEN
+        loaded = [
+            module for module in forbidden
+            if any(m == module or m.startswith(module + '.') for m in last['modules'])
+        ]
+        if loaded:
+            errors.append(f"Módulos cargados al arrancar: {', '.join(loaded)}")
+        if options['budget_ms'] is not None and first_ms > options['budget_ms']:
+            errors.append(f"{first_ms:.0f} ms hasta la primera petición (presupuesto: {options['budget_ms']:.0f} ms)")
+        if errors:
+            raise CommandError('; '.join(errors))
+        self.stdout.write(self.style.SUCCESS('✓ Arranque dentro de lo esperado'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import LessonContent
+
+
+class Command(BaseCommand):
+    help = 'Elimina los cuerpos de lección que ya no usa ninguna lección'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Cuerpos eliminados por transacción'
+        )
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                # Las filas bloqueadas por LessonContent.objects.intern() están a
+                # punto de usarse: se saltan. El borrado vuelve a comprobar que
+                # sigan sin uso con las filas ya bloqueadas
+                ids = list(
+                    LessonContent.objects.filter(lessons__isnull=True)
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+                )
+                if not ids:
+                    break
+                count, _ = LessonContent.objects.filter(pk__in=ids, lessons__isnull=True).delete()
+            deleted += count
+            if len(ids) < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} cuerpos sin uso eliminados'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from app.models import Course, Comment, CourseRatingSummary
+from app.versions import touch
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los histogramas de calificaciones de los cursos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', action='append', dest='courses', default=[],
+            help='Slug del curso a recalcular (se puede repetir). Por defecto, todos.'
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['courses']:
+            courses = courses.filter(slug__in=options['courses'])
+        course_ids = list(courses.values_list('id', flat=True))
+
+        ratings = Comment.objects.filter(
+            course_id__in=course_ids, is_review=True, rating__isnull=False
+        ).values('course_id').annotate(
+            total_reviews=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+        )
+        ratings = {row.pop('course_id'): row for row in ratings}
+
+        empty = {field: 0 for field in
+                 ['total_reviews', 'rating_sum'] + [f'rating_{star}' for star in range(1, 6)]}
+        fixed = 0
+        with transaction.atomic():
+            existing = {
+                summary.course_id: summary
+                for summary in CourseRatingSummary.objects.select_for_update().filter(
+                    course_id__in=course_ids
+                )
+            }
+            for course_id in course_ids:
+                values = ratings.get(course_id, empty)
+                summary = existing.get(course_id)
+                if summary is None:
+                    CourseRatingSummary.objects.create(course_id=course_id, **values)
+                    fixed += 1
+                elif any(getattr(summary, field) != value for field, value in values.items()):
+                    CourseRatingSummary.objects.filter(pk=summary.pk).update(**values)
+                    fixed += 1
+            if fixed:
+                touch(CourseRatingSummary)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(course_ids)} cursos revisados, {fixed} resúmenes corregidos'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Recalcula los contadores desnormalizados (cursos por categoría, cursos impartidos '
+            'e inscripciones por perfil) que no coinciden con el conteo real')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Solo muestra cuántas filas tienen el contador desviado'
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters(dry_run=options['dry_run'])
+        for counter, rows in fixed.items():
+            self.stdout.write(f'  {counter}: {rows} filas desviadas')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'✓ {sum(fixed.values())} contadores corregidos'))
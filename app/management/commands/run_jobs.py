@@ -0,0 +1,86 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from app import jobs
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos de la cola en segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'JOB_QUEUE_WORKERS', 2),
+            help='Número de hilos o procesos que consumen la cola'
+        )
+        parser.add_argument(
+            '--mode', choices=['thread', 'process'], default='thread',
+            help='Ejecutar los workers como hilos o como procesos'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Terminar cuando no queden trabajos listos'
+        )
+        parser.add_argument(
+            '--purge-days', type=int, default=7,
+            help='Borrar al arrancar los trabajos terminados hace más de N días (0 = no borrar)'
+        )
+
+    def handle(self, *args, **options):
+        if options['purge_days']:
+            purged = jobs.purge_finished(options['purge_days'])
+            self.stdout.write(f'  {purged} trabajos antiguos eliminados')
+
+        workers = max(options['workers'], 1)
+        self.stdout.write(self.style.WARNING(
+            f"Iniciando {workers} workers ({options['mode']})..."
+        ))
+        if options['mode'] == 'process':
+            self._run_processes(workers, options['once'])
+        else:
+            self._run_threads(workers, options['once'])
+        self.stdout.write(self.style.SUCCESS('✓ Workers detenidos'))
+
+    def _run_threads(self, workers, once):
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+        threads = [
+            threading.Thread(
+                target=jobs.work, args=(jobs.worker_name(index), stop_event, once), daemon=True
+            )
+            for index in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def _run_processes(self, workers, once):
+        # Las conexiones no se pueden compartir entre procesos
+        connections.close_all()
+        stop_event = multiprocessing.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+        processes = [
+            multiprocessing.Process(
+                target=jobs.work, args=(jobs.worker_name(index), stop_event, once)
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+            for process in processes:
+                process.join()
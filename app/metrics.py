@@ -0,0 +1,394 @@
+"""
+Métricas en formato de texto de Prometheus (``/metrics``).
+
+``MetricsMiddleware`` registra por viewset y acción: peticiones, latencia,
+tamaño de respuesta y consultas SQL (número y tiempo). ``record_cache``
+cuenta aciertos y fallos de las cachés. Las conexiones abiertas y, si se usa
+el pool de psycopg, su estado, se exponen por base de datos.
+
+Cada proceso que atiende peticiones acumula en memoria y vuelca una
+instantánea a ``METRICS_DIR/metrics-<pid>.json`` como mucho cada
+``METRICS_FLUSH_INTERVAL`` segundos (y al salir); los comandos de
+``manage.py`` no escriben nada. ``/metrics`` suma las de los workers vivos;
+los contadores e histogramas de los que ya terminaron se acumulan en
+``METRICS_DIR/archived.json`` (como el modo multiproceso de
+prometheus_client), así que reiniciar un worker no hace bajar ningún total.
+
+``/metrics`` exige ``Authorization: Bearer <METRICS_TOKEN>``; sin token
+configurado responde 403.
+"""
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# nombre -> (tipo, ayuda, buckets)
+METRICS = {
+    'lms_http_requests_total': ('counter', 'Peticiones atendidas', None),
+    'lms_http_request_duration_seconds': ('histogram', 'Latencia de las peticiones', LATENCY_BUCKETS),
+    'lms_http_response_size_bytes': ('histogram', 'Tamaño del cuerpo de las respuestas', SIZE_BUCKETS),
+    'lms_db_queries_total': ('counter', 'Consultas SQL ejecutadas', None),
+    'lms_db_query_duration_seconds_total': ('counter', 'Tiempo total en consultas SQL', None),
+    'lms_db_queries_per_request': ('histogram', 'Consultas SQL por petición', QUERY_BUCKETS),
+    'lms_cache_requests_total': ('counter', 'Consultas a cachés por resultado (hit/miss)', None),
+    'lms_db_connections_opened_total': ('counter', 'Conexiones a la base de datos abiertas', None),
+    'lms_db_pool_connections': ('gauge', 'Estado del pool de conexiones de psycopg', None),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, f'METRICS_{name}', default)
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+# ==================== REGISTRO POR PROCESO ====================
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.last_flush = 0.0
+        self.exit_flush = False
+        # Un archivo con nuestro pid es de un proceso terminado que lo usó antes
+        if _setting('DIR', '') and os.path.exists(_snapshot_path(self.pid)):
+            archive_snapshots([_snapshot_path(self.pid)])
+
+    def _check_fork(self):
+        # Tras un fork (gunicorn --preload) el hijo empieza de cero
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self._check_fork()
+            self.counters[_key(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            self._check_fork()
+            key = _key(name, labels)
+            entry = self.histograms.get(key)
+            if entry is None:
+                # un contador por bucket (no acumulado) + suma + total
+                entry = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[index] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self._check_fork()
+            return {
+                'pid': self.pid,
+                'counters': dict(self.counters),
+                'histograms': {key: list(entry) for key, entry in self.histograms.items()},
+                'gauges': _gauges(),
+            }
+
+    def flush(self, force=False):
+        if not self.exit_flush:
+            # Solo los procesos que atienden peticiones vuelcan al salir
+            self.exit_flush = True
+            atexit.register(self.flush, force=True)
+        now = time.monotonic()
+        if not force and now - self.last_flush < _setting('FLUSH_INTERVAL', 5):
+            return
+        self.last_flush = now
+        directory = _setting('DIR', '')
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            snapshot = self.snapshot()
+            _write_json(_snapshot_path(snapshot['pid']), snapshot)
+        except OSError:
+            pass
+
+
+def _snapshot_path(pid):
+    return os.path.join(_setting('DIR', ''), f'metrics-{pid}.json')
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _read_json(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as output:
+        json.dump(data, output)
+    os.replace(tmp_path, path)
+
+
+def _merge(counters, histograms, data):
+    for key, value in data['counters'].items():
+        counters[key] += value
+    for key, entry in data['histograms'].items():
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], entry)]
+        else:
+            histograms[key] = list(entry)
+
+
+# ==================== PROCESOS TERMINADOS ====================
+
+ARCHIVE = 'archived.json'
+
+
+def archive_snapshots(paths):
+    """
+    Suma al archivo los contadores e histogramas de las instantáneas
+    ``paths`` (de procesos terminados) y las borra. Un cerrojo sobre el
+    directorio evita que dos procesos archiven la misma instantánea.
+    """
+    directory = _setting('DIR', '')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, 'archived.lock'), 'w')
+    except OSError:
+        return
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE)
+        archived = _read_json(archive_path) or {'counters': {}, 'histograms': {}}
+        counters, histograms = defaultdict(float, archived['counters']), archived['histograms']
+        merged = []
+        for path in paths:
+            # Ya archivada por otro proceso mientras esperábamos el cerrojo
+            data = _read_json(path)
+            if data is not None:
+                _merge(counters, histograms, data)
+                merged.append(path)
+        if not merged:
+            return
+        try:
+            _write_json(archive_path, {'counters': counters, 'histograms': histograms})
+        except OSError:
+            return
+        for path in merged:
+            _remove(path)
+
+
+registry = _Registry()
+
+
+def record_cache(cache, hit):
+    """Cuenta un acierto o fallo de la caché ``cache``"""
+    registry.inc('lms_cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    registry.inc('lms_db_connections_opened_total', {'alias': connection.alias})
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='metrics_connection_created')
+
+
+def _gauges():
+    gauges = {}
+    for alias in connections:
+        connection = connections[alias]
+        if not connection.settings_dict.get('OPTIONS', {}).get('pool'):
+            continue
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        for state, stat in (('size', 'pool_size'), ('available', 'pool_available'),
+                            ('waiting', 'requests_waiting')):
+            gauges[_key('lms_db_pool_connections', {'alias': alias, 'state': state})] = stats.get(stat, 0)
+    return gauges
+
+
+# ==================== MIDDLEWARE ====================
+
+class MetricsMiddleware:
+    """Mide cada petición y la etiqueta con el viewset y la acción de DRF"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is not None:
+            actions = getattr(view_func, 'actions', None) or {}
+            request._metrics_labels = {
+                'view': view_class.__name__,
+                'action': actions.get(request.method.lower(), request.method.lower()),
+            }
+        else:
+            request._metrics_labels = {'view': view_func.__name__, 'action': ''}
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        labels = getattr(request, '_metrics_labels', {'view': 'unmatched', 'action': ''})
+        registry.inc('lms_http_requests_total', dict(
+            labels, method=request.method, status=str(response.status_code)
+        ))
+        registry.observe('lms_http_request_duration_seconds', labels, duration)
+        registry.observe('lms_db_queries_per_request', labels, queries[0])
+        if queries[0]:
+            registry.inc('lms_db_queries_total', labels, queries[0])
+            registry.inc('lms_db_query_duration_seconds_total', labels, queries[1])
+        if not response.streaming:
+            registry.observe('lms_http_response_size_bytes', labels, len(response.content))
+        if request.method in ('GET', 'HEAD') and (
+            'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+        ):
+            record_cache('http_conditional', response.status_code == 304)
+
+        registry.flush()
+        return response
+
+
+# ==================== EXPOSICIÓN ====================
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """
+    Suma las instantáneas de los procesos vivos (la propia, al día) y el
+    archivo de los que ya terminaron, archivando antes las de estos.
+    """
+    own = registry.snapshot()
+    snapshots = [own]
+    directory = _setting('DIR', '')
+    if os.path.isdir(directory):
+        dead = []
+        for filename in os.listdir(directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            data = _read_json(os.path.join(directory, filename))
+            if data is None or data['pid'] == own['pid']:
+                continue
+            if _pid_alive(data['pid']):
+                snapshots.append(data)
+            else:
+                dead.append(os.path.join(directory, filename))
+        if dead:
+            archive_snapshots(dead)
+        archived = _read_json(os.path.join(directory, ARCHIVE))
+        if archived is not None:
+            snapshots.append(dict(archived, gauges={}))
+
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = {}
+    for data in snapshots:
+        _merge(counters, histograms, data)
+        for key, value in data['gauges'].items():
+            name, labels = json.loads(key)
+            gauges[_key(name, dict(labels, pid=str(data['pid'])))] = value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render_metrics():
+    counters, histograms, gauges = collect()
+    by_name = defaultdict(list)
+    for source in (counters, gauges):
+        for key, value in source.items():
+            name, labels = json.loads(key)
+            by_name[name].append((labels, value))
+    for key, entry in histograms.items():
+        name, labels = json.loads(key)
+        by_name[name].append((labels, entry))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name not in by_name:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value:g}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + [["le", f"{bound:g}"]])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + [["le", "+Inf"]])} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]:g}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = _setting('TOKEN', '')
+    if not token or not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_course_recommendations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='courserecommendation',
+            name='kind',
+            field=models.CharField(choices=[('also_took', 'Students also took'), ('similar', 'Similar content')], max_length=20),
+        ),
+    ]
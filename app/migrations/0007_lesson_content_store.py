@@ -0,0 +1,67 @@
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_content(apps, schema_editor):
+    Lesson = apps.get_model('app', 'Lesson')
+    LessonContent = apps.get_model('app', 'LessonContent')
+    known = set(LessonContent.objects.values_list('sha256', flat=True))
+    for lesson in Lesson.objects.only('id', 'content').iterator(chunk_size=500):
+        raw = lesson.content.encode('utf-8')
+        sha = hashlib.sha256(raw).hexdigest()
+        if sha not in known:
+            LessonContent.objects.create(sha256=sha, data=zlib.compress(raw, 6), size=len(raw))
+            known.add(sha)
+        Lesson.objects.filter(pk=lesson.pk).update(body_id=sha)
+
+
+def restore_content(apps, schema_editor):
+    Lesson = apps.get_model('app', 'Lesson')
+    LessonContent = apps.get_model('app', 'LessonContent')
+    for body in LessonContent.objects.iterator(chunk_size=500):
+        text = zlib.decompress(bytes(body.data)).decode('utf-8')
+        Lesson.objects.filter(body_id=body.sha256).update(content=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='body',
+            field=models.ForeignKey(db_column='content_hash', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='lessons', to='app.lessoncontent', to_field='sha256'),
+        ),
+        # blank=True solo para que la migración inversa pueda volver a crear la columna
+        migrations.AlterField(
+            model_name='lesson',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(move_content, restore_content),
+        migrations.RemoveField(
+            model_name='lesson',
+            name='content',
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='body',
+            field=models.ForeignKey(db_column='content_hash', on_delete=django.db.models.deletion.PROTECT, related_name='lessons', to='app.lessoncontent', to_field='sha256'),
+        ),
+    ]
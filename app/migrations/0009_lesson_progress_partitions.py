@@ -0,0 +1,175 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DateField, OuterRef, Subquery
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+TABLE = 'app_lessonprogress'
+UNIQUE_BEFORE = [('enrollment', 'lesson')]
+UNIQUE_AFTER = [('enrollment', 'lesson', 'period')]
+
+
+def fill_period(apps, schema_editor):
+    LessonProgress = apps.get_model('app', 'LessonProgress')
+    Enrollment = apps.get_model('app', 'Enrollment')
+    LessonProgress.objects.update(period=Subquery(
+        Enrollment.objects.filter(pk=OuterRef('enrollment_id')).values(
+            month=TruncMonth('enrolled_at', output_field=DateField())
+        )[:1]
+    ))
+
+
+def partition_progress(apps, schema_editor):
+    """
+    Convierte ``app_lessonprogress`` en una tabla particionada por rango de
+    ``period``: una partición por año más una por defecto. La clave de
+    partición tiene que formar parte de la clave primaria y de las
+    restricciones únicas, así que quedan como ``(id, period)`` y
+    ``(enrollment_id, lesson_id, period)``; como ``period`` se deriva de la
+    inscripción, la unicidad por inscripción y lección se mantiene.
+
+    En otras bases de datos la tabla no se particiona; solo cambia la
+    restricción única, para que coincida con el estado de la migración.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.alter_unique_together(
+            apps.get_model('app', 'LessonProgress'), UNIQUE_BEFORE, UNIQUE_AFTER
+        )
+        return
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(period) FROM {TABLE}')
+        first = cursor.fetchone()[0]
+    first_year = first.year if first else timezone.now().year
+    last_year = timezone.now().year + 1
+
+    # La secuencia de id (identity desde Django 4.1, serial antes) conserva su
+    # nombre al renombrar la tabla: se elimina y la tabla nueva crea la suya
+    execute(f'ALTER TABLE {TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+    execute(f'ALTER TABLE {TABLE} ALTER COLUMN id DROP DEFAULT')
+    execute(f'DROP SEQUENCE IF EXISTS {TABLE}_id_seq')
+    execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned')
+    execute(
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        'PARTITION BY RANGE (period)'
+    )
+    # Las columnas identity no se heredan en particiones: secuencia propia
+    execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+    for year in range(first_year, last_year + 1):
+        execute(
+            f"CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+    execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+    execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned')
+    execute(f"SELECT setval('{TABLE}_id_seq', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)")
+    execute(f'DROP TABLE {TABLE}_unpartitioned')
+
+    # Restricciones e índices después de copiar los datos
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, period)')
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_enrollment_lesson_period_uniq '
+        'UNIQUE (enrollment_id, lesson_id, period)'
+    )
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_enrollment_id_fk FOREIGN KEY (enrollment_id) '
+        'REFERENCES app_enrollment (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_lesson_id_fk FOREIGN KEY (lesson_id) '
+        'REFERENCES app_lesson (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(f'CREATE INDEX {TABLE}_lesson_id_idx ON {TABLE} (lesson_id)')
+    execute(f'CREATE INDEX progress_accessed_idx ON {TABLE} (last_accessed_at)')
+
+
+def unpartition_progress(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.alter_unique_together(
+            apps.get_model('app', 'LessonProgress'), UNIQUE_AFTER, UNIQUE_BEFORE
+        )
+        return
+    execute = schema_editor.execute
+    execute(f'CREATE TABLE {TABLE}_plain (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    execute(f'ALTER TABLE {TABLE}_plain ALTER COLUMN id DROP DEFAULT')
+    execute(f'INSERT INTO {TABLE}_plain SELECT * FROM {TABLE}')
+    # Borra también la secuencia propia de la tabla particionada
+    execute(f'DROP TABLE {TABLE}')
+    execute(f'ALTER TABLE {TABLE}_plain RENAME TO {TABLE}')
+    # De vuelta a la columna identity que crea Django
+    execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)"
+    )
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_enrollment_id_lesson_id_uniq '
+        'UNIQUE (enrollment_id, lesson_id)'
+    )
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_enrollment_id_fk FOREIGN KEY (enrollment_id) '
+        'REFERENCES app_enrollment (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_lesson_id_fk FOREIGN KEY (lesson_id) '
+        'REFERENCES app_lesson (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(f'CREATE INDEX {TABLE}_lesson_id_idx ON {TABLE} (lesson_id)')
+    execute(f'CREATE INDEX progress_accessed_idx ON {TABLE} (last_accessed_at)')
+
+
+class Migration(migrations.Migration):
+    # En PostgreSQL no se puede alterar una tabla con eventos de trigger
+    # pendientes del UPDATE de fill_period: cada paso en su transacción
+    atomic = False
+
+    dependencies = [
+        ('app', '0008_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='progress_archived',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='period',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_period, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='lessonprogress',
+            name='period',
+            field=models.DateField(editable=False),
+        ),
+        migrations.CreateModel(
+            name='LessonProgressArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('data', models.BinaryField()),
+                ('lesson_count', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('enrollment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress_archive', to='app.enrollment')),
+            ],
+        ),
+        # El SQL crudo cambia la restricción única; el estado lo refleja para que
+        # makemigrations no la revierta. La clave primaria física (id, period)
+        # no se declara: el ORM sigue usando id, único por la secuencia
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_progress, unpartition_progress, atomic=True),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='lessonprogress',
+                    unique_together={('enrollment', 'lesson', 'period')},
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_lesson_progress_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='source_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('course', 'source_key'), name='unique_lesson_source_key'),
+        ),
+    ]
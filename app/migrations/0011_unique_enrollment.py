@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    """
+    Deja una inscripción por (usuario, curso): la de más progreso y, a
+    igualdad, la más reciente. El progreso de las demás se borra en cascada.
+    """
+    Enrollment = apps.get_model('app', 'Enrollment')
+    duplicates = (
+        Enrollment.objects.values('user_id', 'course_id')
+        .annotate(total=models.Count('id')).filter(total__gt=1)
+    )
+    for pair in duplicates.iterator():
+        ids = list(
+            Enrollment.objects.filter(user_id=pair['user_id'], course_id=pair['course_id'])
+            .order_by('-progress_percentage', '-last_accessed_at', 'id')
+            .values_list('id', flat=True)
+        )
+        Enrollment.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_lesson_source_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_enrollment_user_course'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field, outer):
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{field: models.OuterRef(outer)}).order_by().values(field)
+        .annotate(total=models.Count('pk')).values('total'),
+        output_field=models.IntegerField(),
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('app', 'Course')
+    Enrollment = apps.get_model('app', 'Enrollment')
+    apps.get_model('app', 'Course_Category').objects.update(course_count=_count(Course, 'category', 'pk'))
+    apps.get_model('app', 'Profile').objects.update(
+        courses_taught_count=_count(Course, 'instructor', 'user_id'),
+        enrollment_count=_count(Enrollment, 'user', 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_unique_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course_category',
+            name='course_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='courses_taught_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
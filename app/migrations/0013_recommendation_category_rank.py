@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+def fill_category_ranks(apps, schema_editor):
+    """
+    Las listas existentes se cortaron antes de filtrar por categoría: se
+    numeran tal cual y la próxima construcción las recalcula todas.
+    """
+    CourseRecommendation = apps.get_model('app', 'CourseRecommendation')
+    rows = CourseRecommendation.objects.filter(kind='similar').order_by(
+        'course_id', 'neighbor__category_id', 'rank'
+    ).values_list('pk', 'course_id', 'neighbor__category_id')
+    updates, group, position = [], None, 0
+    for pk, course_id, category_id in rows.iterator():
+        position = position + 1 if (course_id, category_id) == group else 0
+        group = (course_id, category_id)
+        updates.append(CourseRecommendation(pk=pk, category_rank=position))
+    CourseRecommendation.objects.bulk_update(updates, ['category_rank'], batch_size=1000)
+    apps.get_model('app', 'RecommendationIndexState').objects.filter(name='similar').update(built_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_counter_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='courserecommendation',
+            name='rank',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='courserecommendation',
+            name='category_rank',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_category_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Lesson.ORDER_GAP cuando se escribió la migración
+ORDER_GAP = 1024
+
+
+def spread_order(apps, schema_editor):
+    """
+    Las lecciones existentes se numeraron 1, 2, 3...: sin hueco entre ellas
+    el primer movimiento de cada curso renumeraría todas sus lecciones.
+    """
+    Lesson = apps.get_model('app', 'Lesson')
+    lessons = Lesson.objects.order_by('course_id', 'order_index', 'id').values_list('pk', 'course_id', 'order_index')
+    updates, course, position = [], None, 0
+    for pk, course_id, order_index in lessons.iterator():
+        position = position + 1 if course_id == course else 1
+        course = course_id
+        if order_index != position * ORDER_GAP:
+            updates.append(Lesson(pk=pk, order_index=position * ORDER_GAP))
+    Lesson.objects.bulk_update(updates, ['order_index'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_recommendation_category_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_order, migrations.RunPython.noop),
+    ]
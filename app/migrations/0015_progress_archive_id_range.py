@@ -0,0 +1,41 @@
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def fill_id_range(apps, schema_editor):
+    LessonProgressArchive = apps.get_model('app', 'LessonProgressArchive')
+    updates = []
+    for archive in LessonProgressArchive.objects.only('id', 'data').iterator():
+        # El id es el primer valor de cada lección (progress.ARCHIVE_FIELDS)
+        ids = [value[0] for value in json.loads(zlib.decompress(bytes(archive.data)))]
+        if ids:
+            archive.first_progress_id, archive.last_progress_id = min(ids), max(ids)
+            updates.append(archive)
+    LessonProgressArchive.objects.bulk_update(updates, ['first_progress_id', 'last_progress_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_spread_lesson_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonprogressarchive',
+            name='first_progress_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonprogressarchive',
+            name='last_progress_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='lessonprogressarchive',
+            index=models.Index(fields=['first_progress_id', 'last_progress_id'], name='progress_archive_ids_idx'),
+        ),
+        migrations.RunPython(fill_id_range, migrations.RunPython.noop),
+    ]
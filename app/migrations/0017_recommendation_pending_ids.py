@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_table_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationindexstate',
+            name='pending_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
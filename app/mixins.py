@@ -0,0 +1,161 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from .compiled import CompiledSerializer
+from .docs import api_doc, openapi
+from .versions import table_versions
+
+
+# ==================== CONDITIONAL GET ====================
+
+class ConditionalGetMixin:
+    """
+    Soporte de peticiones condicionales (ETag) para las acciones ``list`` y
+    ``retrieve``.
+
+    El ETag se calcula con la URL de la petición, el usuario y la versión de
+    las tablas de las que depende la respuesta (ver ``app.versions``, una
+    sola consulta): una petición con ``If-None-Match`` que coincide responde
+    ``304`` sin ejecutar el queryset ni serializar nada.
+
+    ``conditional_models`` enumera los modelos, además del del queryset,
+    cuyos datos incluye el serializer (relaciones anidadas, conteos...).
+    """
+    conditional_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().list, args, kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().retrieve, args, kwargs)
+
+    def _conditional_etag(self, request):
+        models = [self.queryset.model, *self.conditional_models]
+        fingerprint = '|'.join([
+            self.queryset.model._meta.label,
+            self.action,
+            request.accepted_renderer.format,
+            request.get_full_path(),
+            # Los querysets y permisos pueden depender del usuario
+            str(request.user.pk),
+            *map(str, table_versions(models)),
+        ])
+        return '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+
+    def _conditional_response(self, request, handler, args, kwargs):
+        etag = self._conditional_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+
+# ==================== COMPILED LIST ====================
+
+class CompiledListMixin:
+    """
+    La acción ``list`` usa la versión compilada del serializer (ver
+    ``app.compiled``): las filas se leen con ``values_list()`` y se
+    serializan sin crear instancias completas. La salida es la misma que la
+    de ``super().list``. Se desactiva con ``COMPILED_SERIALIZERS = False``.
+
+    ``list_annotations`` añade al queryset anotaciones que el serializer usa
+    en lugar de consultas por fila (p. ej. conteos).
+    """
+    list_annotations = {}
+
+    def get_list_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.list_annotations:
+            queryset = queryset.annotate(**self.list_annotations)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'COMPILED_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+
+        compiled = CompiledSerializer(self.get_serializer_class(), self.get_serializer_context())
+        rows = compiled.values(self.get_list_queryset())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.to_representation(page))
+        return Response(compiled.to_representation(rows))
+
+
+# ==================== MULTI GET ====================
+
+class MultiGetMixin:
+    """
+    ``?ids=1,2,3`` (o ``?slugs=a,b``) en la acción ``list`` devuelve esos
+    objetos con una sola consulta ``IN``, con el mismo queryset, filtros y
+    serializer que el listado, en el orden pedido y sin paginar::
+
+        {"results": [...], "missing": [3]}
+
+    ``multi_get_lookups`` asocia cada parámetro con el campo que busca. Se
+    admiten hasta ``MULTI_GET_MAX_IDS`` valores por petición.
+    """
+    multi_get_lookups = {'ids': 'pk'}
+
+    @api_doc(lambda: dict(
+        manual_parameters=[
+            openapi.Parameter(
+                'ids', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                description='IDs separados por comas: devuelve solo esos objetos, en ese orden'
+            ),
+            openapi.Parameter(
+                'slugs', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                description='Slugs separados por comas (solo cursos)'
+            ),
+        ],
+    ))
+    def list(self, request, *args, **kwargs):
+        requested = [param for param in self.multi_get_lookups if param in request.query_params]
+        if not requested:
+            return super().list(request, *args, **kwargs)
+        if len(requested) > 1:
+            return Response(
+                {'error': f'Usa solo uno de: {", ".join(requested)}'},
+                status=400
+            )
+        return self.multi_get(request, requested[0])
+
+    def _multi_get_values(self, request, param, field):
+        values = []
+        for item in request.query_params.getlist(param):
+            values.extend(value.strip() for value in item.split(',') if value.strip())
+        # Sin duplicados, conservando el orden
+        return [field.to_python(value) for value in dict.fromkeys(values)]
+
+    def multi_get(self, request, param):
+        lookup = self.multi_get_lookups[param]
+        model = self.get_queryset().model
+        field = model._meta.pk if lookup == 'pk' else model._meta.get_field(lookup)
+        try:
+            values = self._multi_get_values(request, param, field)
+        except ValidationError:
+            return Response({'error': f'El parámetro {param} tiene valores no válidos'}, status=400)
+        limit = getattr(settings, 'MULTI_GET_MAX_IDS', 100)
+        if len(values) > limit:
+            return Response({'error': f'Como máximo {limit} valores en {param}'}, status=400)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        annotations = getattr(self, 'list_annotations', None)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        found = {
+            getattr(obj, field.attname): obj
+            for obj in queryset.filter(**{f'{field.name}__in': values})
+        }
+        objects = [found[value] for value in values if value in found]
+        serializer = self.get_serializer(objects, many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [value for value in values if value not in found],
+        })
@@ -1,33 +1,101 @@
-from django.db import models
+import hashlib
+import zlib
+
+from django.db import connections, models, transaction
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_save
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.utils.text import slugify
 
-class Profile(models.Model):
+
+def progress_period(enrolled_at):
+    """Clave de partición del progreso: primer día del mes de la inscripción"""
+    return timezone.localtime(enrolled_at).date().replace(day=1)
+
+
+def related_count(model, field='course', outer='pk'):
+    """
+    Subconsulta con el número de filas de ``model`` que apuntan a la fila
+    externa (su columna ``outer``) por ``field``, para anotar conteos sin
+    ``GROUP BY``.
+    """
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{field: models.OuterRef(outer)}).order_by().values(field)
+        .annotate(total=models.Count('pk')).values('total'),
+        output_field=models.IntegerField(),
+    ), 0)
+
+
+class CounterFieldsMixin:
+    """
+    Los ``counter_fields`` se actualizan con ``F()`` fuera del modelo (ver
+    ``app.counters``): un ``save()`` de una fila existente no los escribe,
+    para no pisar con un valor leído antes los incrementos concurrentes.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def cached_label(instance, path):
+    """
+    Sigue ``path`` (p. ej. ``'enrollment__user__username'``) solo a través de
+    relaciones ya cargadas. Si alguna no lo está devuelve una etiqueta con la
+    clave foránea (``'user #3'``) en lugar de consultar la base de datos, de
+    modo que ``str()`` nunca lanza consultas ocultas. Para obtener el texto
+    completo hay que cargar las relaciones con ``select_related``.
+    """
+    *relations, attr = path.split('__')
+    obj = instance
+    for name in relations:
+        field = obj._meta.get_field(name)
+        if not field.is_cached(obj):
+            return f"{field.related_model._meta.model_name} #{getattr(obj, field.attname)}"
+        obj = getattr(obj, name)
+        if obj is None:
+            return '-'
+    return getattr(obj, attr)
+
+class Profile(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True)
     birth_date = models.DateField(null=True, blank=True)
     phone = models.CharField(max_length=15, blank=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_instructor = models.BooleanField(default=False)
+    # Contadores mantenidos por señales (ver app.counters)
+    courses_taught_count = models.PositiveIntegerField(default=0, editable=False)
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    counter_fields = ('courses_taught_count', 'enrollment_count')
     
     def __str__(self):
-        return self.user.username
+        return cached_label(self, 'user__username')
 
     class Meta:
         verbose_name = "Profile"
         verbose_name_plural = "Profiles"
 
-class Course_Category(models.Model):
+class Course_Category(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Mantenido por señales (ver app.counters)
+    course_count = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('course_count',)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -68,6 +136,7 @@ class Course(models.Model):
     difficulty_level = models.ForeignKey(DifficultyLevel, on_delete=models.SET_NULL, null=True)
     status = models.ForeignKey(CourseStatus, on_delete=models.SET_NULL, null=True)
     thumbnail = models.ImageField(upload_to='course_thumbnails/', null=True, blank=True)
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     duration_hours = models.PositiveIntegerField()
     language = models.CharField(max_length=2, default='en')
@@ -93,26 +162,142 @@ class LessonType(models.Model):
     def __str__(self):
         return self.type_name
 
+class LessonContentManager(models.Manager):
+    """
+    Los cuerpos que ya existen se bloquean hasta el final de la transacción
+    en curso: ``prune_lesson_content`` salta las filas bloqueadas, así que no
+    puede borrar un cuerpo sin uso entre que se reutiliza y se guarda la
+    lección que lo referencia.
+    """
+
+    def intern(self, text):
+        """Devuelve el cuerpo almacenado para ``text``, creándolo si no existe"""
+        sha = LessonContent.hash_text(text)
+        with transaction.atomic(using=self.db):
+            body = self.select_for_update(no_key=True).filter(sha256=sha).first()
+            if body is None:
+                body, _ = self.get_or_create(sha256=sha, defaults=LessonContent.pack(text))
+        return body
+
+    def intern_many(self, texts):
+        """Versión por lotes de ``intern``: devuelve los hashes en el mismo orden"""
+        hashes = [LessonContent.hash_text(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        with transaction.atomic(using=self.db):
+            # En orden de hash: dos importaciones a la vez no se bloquean en cruz
+            existing = set(
+                self.select_for_update(no_key=True).filter(sha256__in=unique)
+                .order_by('sha256').values_list('sha256', flat=True)
+            )
+            self.bulk_create(
+                [LessonContent(sha256=sha, **LessonContent.pack(text))
+                 for sha, text in unique.items() if sha not in existing],
+                ignore_conflicts=True,
+            )
+        return hashes
+
+class LessonContent(models.Model):
+    """
+    Cuerpo de una lección, comprimido y direccionado por su SHA-256.
+    Las lecciones con el mismo texto (p. ej. copias de un curso) comparten fila.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LessonContentManager()
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def pack(text):
+        raw = text.encode('utf-8')
+        return {'data': zlib.compress(raw, 6), 'size': len(raw)}
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.data)).decode('utf-8')
+
+    def __str__(self):
+        return self.sha256
+
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
     description = models.TextField()
     lesson_type = models.ForeignKey(LessonType, on_delete=models.SET_NULL, null=True)
-    content = models.TextField()
+    # El cuerpo vive en LessonContent; la columna guarda directamente su hash
+    body = models.ForeignKey(
+        LessonContent, to_field='sha256', db_column='content_hash',
+        on_delete=models.PROTECT, related_name='lessons'
+    )
     video_url = models.URLField(blank=True, null=True)
     duration_minutes = models.PositiveIntegerField()
     order_index = models.PositiveIntegerField()
     is_published = models.BooleanField(default=False)
     is_free = models.BooleanField(default=False)
     attachments = models.JSONField(default=list, blank=True)
+    # Identificador en la plataforma de origen (app.importer); NULL si se creó aquí
+    source_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Separación entre posiciones consecutivas: mover una lección suele
+    # caber entre sus vecinas sin renumerar el resto
+    ORDER_GAP = 1024
+
     class Meta:
         ordering = ['order_index']
+        indexes = [
+            models.Index(fields=['course', 'order_index'], name='lesson_course_order_idx'),
+            models.Index(fields=['created_at'], name='lesson_created_idx'),
+        ]
+        constraints = [
+            # Los NULL no chocan entre sí: solo afecta a lecciones importadas
+            models.UniqueConstraint(fields=['course', 'source_key'], name='unique_lesson_source_key'),
+        ]
+
+    _pending_content = None
+
+    @property
+    def content(self):
+        """Texto de la lección; solo se consulta LessonContent al leerlo"""
+        if self._pending_content is not None:
+            return self._pending_content
+        if not self.body_id:
+            return ''
+        return self.body.text
+
+    @content.setter
+    def content(self, value):
+        self._pending_content = value
+
+    @property
+    def content_hash(self):
+        if self._pending_content is not None:
+            return LessonContent.hash_text(self._pending_content)
+        return self.body_id
+
+    def save(self, *args, **kwargs):
+        # El cuerpo queda bloqueado por intern() hasta que se guarde la lección
+        with transaction.atomic():
+            if self._pending_content is not None or not self.body_id:
+                self.body = LessonContent.objects.intern(self._pending_content or '')
+                self._pending_content = None
+            if self.order_index is None:
+                last = Lesson.objects.filter(course_id=self.course_id).aggregate(
+                    last=models.Max('order_index')
+                )['last'] or 0
+                self.order_index = last + self.ORDER_GAP
+            super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.course.title} - {self.title}"
+        if Lesson.course.is_cached(self):
+            return f"{self.course.title} - {self.title}"
+        return self.title
 
 class EnrollmentStatus(models.Model):
     status_name = models.CharField(max_length=20, unique=True)
@@ -121,6 +306,59 @@ class EnrollmentStatus(models.Model):
     def __str__(self):
         return self.status_name
 
+class EnrollmentManager(models.Manager):
+    def enroll(self, user, course, status_name='active'):
+        """
+        Inscribe a ``user`` en ``course`` con una sola sentencia
+        ``INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING``: el estado se
+        resuelve con una subconsulta y la restricción única evita duplicados
+        aunque lleguen dos peticiones a la vez. Devuelve ``(inscripción,
+        creada)``; si ya existía se devuelve la fila existente.
+        """
+        connection = connections[self.db]
+        enrollment = self.model(user=user, course=course)
+        pre_save.send(sender=self.model, instance=enrollment, raw=False, using=self.db, update_fields=None)
+
+        qn = connection.ops.quote_name
+        status_table = qn(EnrollmentStatus._meta.db_table)
+        columns, placeholders, params = [], [], []
+        for field in self.model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            columns.append(qn(field.column))
+            if field.name == 'status':
+                placeholders.append(
+                    f'(SELECT {qn("id")} FROM {status_table} '
+                    f'WHERE UPPER({qn("status_name")}) = UPPER(%s) ORDER BY {qn("id")} LIMIT 1)'
+                )
+                params.append(status_name)
+            else:
+                placeholders.append('%s')
+                params.append(field.get_db_prep_save(field.pre_save(enrollment, True), connection))
+
+        # SQLite exige un WHERE en INSERT ... SELECT ... ON CONFLICT
+        sql = (
+            f'INSERT INTO {qn(self.model._meta.db_table)} ({", ".join(columns)}) '
+            f'SELECT {", ".join(placeholders)} WHERE 1 = 1 '
+            f'ON CONFLICT ({qn("user_id")}, {qn("course_id")}) DO NOTHING '
+            f'RETURNING {qn("id")}, {qn("status_id")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return self.get(user=user, course=course), False
+
+        enrollment.pk, enrollment.status_id = row
+        enrollment._state.adding = False
+        enrollment._state.db = self.db
+        post_save.send(
+            sender=self.model, instance=enrollment, created=True,
+            update_fields=None, raw=False, using=self.db,
+        )
+        return enrollment, True
+
+
 class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
@@ -131,9 +369,21 @@ class Enrollment(models.Model):
     last_accessed_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
     current_lesson = models.ForeignKey(Lesson, on_delete=models.SET_NULL, null=True, blank=True)
+    # El progreso por lección está en LessonProgressArchive (ver app.progress)
+    progress_archived = models.BooleanField(default=False, editable=False)
+
+    objects = EnrollmentManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['enrolled_at'], name='enrollment_enrolled_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_enrollment_user_course'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.course.title}"
+        return f"{cached_label(self, 'user__username')} - {cached_label(self, 'course__title')}"
 
 class LessonProgress(models.Model):
     enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='lesson_progress')
@@ -142,12 +392,58 @@ class LessonProgress(models.Model):
     time_spent_minutes = models.PositiveIntegerField(default=0)
     completed_at = models.DateTimeField(null=True, blank=True)
     last_accessed_at = models.DateTimeField(auto_now=True)
+    # Mes de la inscripción: clave de partición de la tabla en PostgreSQL
+    period = models.DateField(editable=False)
+
+    class Meta:
+        # En PostgreSQL la clave de partición tiene que estar en las restricciones
+        # únicas, y la clave primaria física es (id, period) (migración 0009).
+        # period se deriva de la inscripción, así que sigue habiendo una fila por
+        # inscripción y lección; id es único porque sale de una secuencia
+        unique_together = ['enrollment', 'lesson', 'period']
+        indexes = [
+            models.Index(fields=['last_accessed_at'], name='progress_accessed_idx'),
+        ]
+
+    # Estado al leer la fila: app.signals publica solo la transición a completada
+    _was_completed = False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._was_completed = instance.__dict__.get('is_completed', False)
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.period is None:
+            self.period = progress_period(self.enrollment.enrolled_at)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{cached_label(self, 'enrollment__user__username')} - {cached_label(self, 'lesson__title')}"
+
+class LessonProgressArchive(models.Model):
+    """
+    Progreso de una inscripción terminada, compactado en una sola fila: JSON
+    comprimido con una entrada por lección (ver ``app.progress``).
+    """
+    enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='progress_archive')
+    period = models.DateField()
+    data = models.BinaryField()
+    lesson_count = models.PositiveIntegerField()
+    # Rango de ids de las filas archivadas: localiza la fila al pedirla por id.
+    # Se crean juntas al inscribirse, así que los rangos apenas se solapan
+    first_progress_id = models.BigIntegerField(null=True)
+    last_progress_id = models.BigIntegerField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['enrollment', 'lesson']
+        indexes = [
+            models.Index(fields=['first_progress_id', 'last_progress_id'], name='progress_archive_ids_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.enrollment.user.username} - {self.lesson.title}"
+        return f"Progress archive #{self.enrollment_id}"
 
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -162,7 +458,151 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @property
+    def counts_as_rating(self):
+        """Indica si el comentario cuenta para el promedio y el histograma"""
+        return self.is_review and self.rating is not None
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='comment_created_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username}'s comment on {self.course.title}"
+        return f"{cached_label(self, 'user__username')}'s comment on {cached_label(self, 'course__title')}"
 
 
+
+class CourseRatingSummary(models.Model):
+    """Histograma de calificaciones por curso, mantenido de forma incremental"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='rating_summary')
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rating summary"
+        verbose_name_plural = "Rating summaries"
+
+    @property
+    def average_rating(self):
+        if self.total_reviews:
+            return round(self.rating_sum / self.total_reviews, 2)
+        return None
+
+    @property
+    def histogram(self):
+        return {str(star): getattr(self, f'rating_{star}') for star in range(1, 6)}
+
+    def __str__(self):
+        return f"Rating summary #{self.course_id}"
+
+class CourseCoEnrollment(models.Model):
+    """Número de usuarios inscritos a la vez en ``course`` y ``other``.
+
+    La diagonal (``course == other``) guarda el total de usuarios del curso.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'other'], name='unique_coenrollment_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} × {self.other_id}: {self.count}"
+
+class CourseRecommendation(models.Model):
+    """Vecinos precalculados (top-K) de un curso"""
+    ALSO_TOOK = 'also_took'
+    SIMILAR = 'similar'
+    KIND_CHOICES = [
+        (ALSO_TOOK, 'Students also took'),
+        (SIMILAR, 'Similar content'),
+    ]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommendations')
+    neighbor = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Posición en la lista general; NULL si la fila solo está por su categoría
+    rank = models.PositiveSmallIntegerField(null=True)
+    # Posición entre los vecinos de la misma categoría (solo SIMILAR)
+    category_rank = models.PositiveSmallIntegerField(null=True)
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['course', 'kind', 'rank'], name='recommendation_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} → {self.neighbor_id} ({self.kind} #{self.rank})"
+
+class RecommendationIndexState(models.Model):
+    """Marca de agua de la última construcción de cada índice"""
+    name = models.CharField(max_length=20, unique=True)
+    last_enrollment_id = models.BigIntegerField(default=0)
+    # Ids sin confirmar por debajo de la marca (ver ``build_also_took``)
+    pending_ids = models.JSONField(default=list, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+class Job(models.Model):
+    """Trabajo diferido de la cola local (ver ``app.jobs``)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_claim_idx'),
+        ]
+        constraints = [
+            # Solo un trabajo pendiente por clave: los duplicados se descartan
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status='pending'),
+                name='unique_pending_job_dedupe_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
+class TableVersion(models.Model):
+    """Versión de una tabla o de un grupo de datos (ver ``app.versions``)"""
+    key = models.CharField(max_length=200, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
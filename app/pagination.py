@@ -0,0 +1,136 @@
+"""
+Conteos aproximados para listados sobre tablas grandes (admin y API).
+
+En PostgreSQL un ``COUNT(*)`` recorre toda la tabla (o el índice). Para
+listados grandes se usan las estadísticas del planificador: ``reltuples``
+cuando el listado no tiene filtros (en una tabla particionada, la suma de
+sus particiones) y la estimación de ``EXPLAIN`` cuando los tiene. Si la estimación queda por debajo de
+``ESTIMATED_COUNT_THRESHOLD`` se hace el conteo exacto, que en ese caso es
+barato.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def _threshold():
+    return getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000)
+
+
+def estimate_count(queryset):
+    """
+    Estimación del planificador del número de filas de ``queryset``, o
+    ``None`` si la base de datos no la ofrece.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    query = queryset.query
+    with connection.cursor() as cursor:
+        if not query.where and not query.distinct and not query.combinator:
+            # La tabla padre de una particionada no tiene filas propias (reltuples
+            # es -1 o 0): se suman sus particiones. -1 significa sin analizar
+            cursor.execute(
+                'SELECT (SUM(pg_class.reltuples) FILTER (WHERE pg_class.reltuples >= 0))::bigint '
+                'FROM pg_partition_tree(%s::regclass) AS tree '
+                'JOIN pg_class ON pg_class.oid = tree.relid WHERE tree.isleaf',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        sql, params = queryset.order_by().select_related(None).query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def approximate_count(queryset):
+    """
+    Devuelve ``(conteo, es_aproximado)``: la estimación si supera el umbral,
+    el ``COUNT(*)`` exacto en otro caso. Las listas ya cargadas se cuentan
+    directamente.
+    """
+    if not isinstance(queryset, QuerySet):
+        return len(queryset), False
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate >= _threshold():
+        return estimate, True
+    return queryset.count(), False
+
+
+class EstimatedPage(Page):
+    """Página cuyo ``has_next`` no depende de un total estimado"""
+    has_more = None
+
+    def has_next(self):
+        if self.has_more is None:
+            return super().has_next()
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator de Django que usa ``approximate_count`` para el total. Con un
+    total estimado no se rechazan páginas por encima de la última calculada
+    y la página siguiente se detecta pidiendo una fila de más.
+    """
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_approximate = approximate_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.count_is_approximate or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Paginación de la API con total estimado para listados grandes. La
+    respuesta indica con ``count_is_approximate`` si ``count`` es exacto.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_approximate': self.page.paginator.count_is_approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_approximate'] = {'type': 'boolean'}
+        return response_schema
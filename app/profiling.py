@@ -0,0 +1,329 @@
+"""
+Profiling por petición para diagnosticar llamadas lentas a la API.
+
+Se activa para usuarios staff con la cabecera ``X-Profile: 1`` o el
+parámetro ``?_profile=1``, y además para una fracción
+``PROFILER_SAMPLE_RATE`` de todas las peticiones. Cada informe guarda el
+perfil de cProfile, todas las consultas SQL con su duración y la línea del
+proyecto que las lanzó, y el tiempo de cada campo de los serializers que
+usan ``FieldTimingMixin`` (los de cursos e inscripciones). Los informes se
+escriben en ``PROFILER_DIR`` (solo se conservan los ``PROFILER_MAX_REPORTS``
+más recientes) junto con un índice de una línea por informe, y se consultan
+en ``/admin/profiles/``.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_current_report = contextvars.ContextVar('profiling_report', default=None)
+_THIS_FILE = os.path.abspath(__file__)
+
+INDEX = 'index.jsonl'
+# Claves que no van al índice: el listado solo muestra el resumen
+DETAIL_KEYS = ('sql', 'serializer_fields', 'profile')
+
+
+def _setting(name, default):
+    return getattr(settings, f'PROFILER_{name}', default)
+
+
+# ==================== INFORME ====================
+
+class Report:
+    """Datos recogidos durante una petición perfilada"""
+
+    def __init__(self, request, sampled):
+        self.id = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}"
+        self.request = request
+        self.sampled = sampled
+        self.queries = []
+        self.field_times = defaultdict(lambda: [0, 0.0])
+        self.base_dir = str(settings.BASE_DIR)
+
+    def _origin(self):
+        """Última línea del proyecto en la pila (fuera de este módulo)"""
+        for frame in reversed(traceback.extract_stack()):
+            filename = os.path.abspath(frame.filename)
+            if (filename.startswith(self.base_dir) and filename != _THIS_FILE
+                    and 'site-packages' not in filename):
+                return f"{os.path.relpath(filename, self.base_dir)}:{frame.lineno} ({frame.name})"
+        return ''
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                'origin': self._origin(),
+                'alias': context['connection'].alias,
+            })
+
+    def add_field_time(self, name, seconds, count=True):
+        entry = self.field_times[name]
+        entry[0] += count
+        entry[1] += seconds
+
+    def to_dict(self, response, duration, profile_text):
+        request = self.request
+        user = getattr(request, 'user', None)
+        return {
+            'id': self.id,
+            'created_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'user': user.get_username() if user is not None and user.is_authenticated else '',
+            'status': response.status_code,
+            'sampled': self.sampled,
+            'duration_ms': round(duration * 1000, 1),
+            'sql_count': len(self.queries),
+            'sql_ms': round(sum(q['duration_ms'] for q in self.queries), 1),
+            'sql': self.queries,
+            'serializer_fields': sorted(
+                ({'field': name, 'calls': calls, 'total_ms': round(total * 1000, 3)}
+                 for name, (calls, total) in self.field_times.items()),
+                key=lambda entry: -entry['total_ms'],
+            ),
+            'profile': profile_text,
+        }
+
+
+# ==================== SERIALIZERS ====================
+
+class FieldTimingMixin:
+    """
+    Mixin para los serializers que se están investigando: si la petición en
+    curso se está perfilando, mide el tiempo de cada campo (los serializers
+    anidados con el mixin se miden por separado). Envuelve los métodos de
+    cada campo en lugar de copiar el bucle de DRF, así que la salida es
+    siempre la de ``Serializer.to_representation``.
+    """
+
+    def to_representation(self, instance):
+        if _current_report.get() is not None and not getattr(self, '_fields_timed', False):
+            # Los campos son de esta instancia del serializer: se envuelven una vez
+            self._fields_timed = True
+            prefix = type(self).__name__
+            for field in self._readable_fields:
+                name = f"{prefix}.{field.field_name}"
+                field.get_attribute = _timed(field.get_attribute, name, count=True)
+                field.to_representation = _timed(field.to_representation, name, count=False)
+        return super().to_representation(instance)
+
+
+def _timed(method, name, count):
+    def timed(*args, **kwargs):
+        report = _current_report.get()
+        if report is None:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            report.add_field_time(name, time.perf_counter() - start, count)
+    return timed
+
+
+# ==================== ALMACÉN ====================
+
+def _report_path(report_id, extension):
+    if not report_id.replace('-', '').isalnum():
+        raise Http404
+    return os.path.join(_setting('DIR', ''), f'{report_id}.{extension}')
+
+
+def _summary(data):
+    return {key: value for key, value in data.items() if key not in DETAIL_KEYS}
+
+
+def _read_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX)) as index:
+            lines = index.readlines()
+    except FileNotFoundError:
+        return None
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            # Línea a medio escribir por otro proceso
+            continue
+    return entries
+
+
+def _write_index(directory, entries):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as output:
+        output.writelines(json.dumps(entry) + '\n' for entry in entries)
+    os.replace(tmp_path, os.path.join(directory, INDEX))
+
+
+def _rebuild_index(directory):
+    """Índice a partir de los informes (directorios anteriores al índice)"""
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as report:
+                entries.append(_summary(json.load(report)))
+    _write_index(directory, entries)
+    return entries
+
+
+def save_report(data, profiler):
+    directory = _setting('DIR', '')
+    os.makedirs(directory, exist_ok=True)
+    with open(_report_path(data['id'], 'json'), 'w') as output:
+        json.dump(data, output)
+    if profiler is not None:
+        profiler.dump_stats(_report_path(data['id'], 'prof'))
+    if not os.path.exists(os.path.join(directory, INDEX)):
+        _rebuild_index(directory)
+    else:
+        # Una sola escritura en modo append: las líneas de varios procesos no se mezclan
+        with open(os.path.join(directory, INDEX), 'a') as index:
+            index.write(json.dumps(_summary(data)) + '\n')
+
+    # Rotación: los ids empiezan por la fecha, así que el orden es cronológico
+    reports = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    expired = reports[:-_setting('MAX_REPORTS', 200)]
+    if not expired:
+        return
+    for name in expired:
+        for extension in ('json', 'prof'):
+            path = os.path.join(directory, f'{name[:-5]}.{extension}')
+            if os.path.exists(path):
+                os.remove(path)
+    kept = {name[:-5] for name in reports[len(expired):]}
+    _write_index(directory, [entry for entry in _read_index(directory) or [] if entry['id'] in kept])
+
+
+def list_reports():
+    """Resúmenes de los informes, del más reciente al más antiguo (solo lee el índice)"""
+    directory = _setting('DIR', '')
+    if not os.path.isdir(directory):
+        return []
+    entries = _read_index(directory)
+    if entries is None:
+        entries = _rebuild_index(directory)
+    return sorted(entries, key=lambda entry: entry['id'], reverse=True)
+
+
+def load_report(report_id):
+    try:
+        with open(_report_path(report_id, 'json')) as report:
+            return json.load(report)
+    except FileNotFoundError:
+        raise Http404
+
+
+# ==================== MIDDLEWARE ====================
+
+class RequestProfilerMiddleware:
+    """Perfila las peticiones a la API pedidas por staff o elegidas por muestreo"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _should_profile(self, request):
+        if not request.path.startswith(_setting('PATH_PREFIX', '/api/lms/')):
+            return None
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff and (
+            request.headers.get(_setting('TRIGGER_HEADER', 'X-Profile')) == '1'
+            or request.GET.get(_setting('QUERY_PARAM', '_profile')) == '1'
+        ):
+            return 'requested'
+        if random.random() < _setting('SAMPLE_RATE', 0.0):
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        mode = self._should_profile(request)
+        if mode is None:
+            return self.get_response(request)
+
+        report = Report(request, sampled=mode == 'sampled')
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en este hilo
+            profiler = None
+
+        token = _current_report.set(report)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(report.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - start
+            _current_report.reset(token)
+            if profiler is not None:
+                profiler.disable()
+
+        profile_text = ''
+        if profiler is not None:
+            buffer = io.StringIO()
+            stats = pstats.Stats(profiler, stream=buffer)
+            stats.sort_stats('cumulative').print_stats(_setting('MAX_FUNCTIONS', 80))
+            profile_text = buffer.getvalue()
+
+        try:
+            save_report(report.to_dict(response, duration, profile_text), profiler)
+        except OSError:
+            logger.exception('No se pudo guardar el informe de profiling %s', report.id)
+            return response
+        if mode == 'requested':
+            response['X-Profile-Id'] = report.id
+        return response
+
+
+# ==================== ADMIN ====================
+
+def report_list(request):
+    return render(request, 'admin/app/profiling/report_list.html', {
+        'title': 'Informes de profiling',
+        'reports': list_reports(),
+        'max_reports': _setting('MAX_REPORTS', 200),
+    })
+
+
+def report_detail(request, report_id):
+    report = load_report(report_id)
+    return render(request, 'admin/app/profiling/report_detail.html', {
+        'title': f"{report['method']} {report['path']}",
+        'report': report,
+        'has_prof': os.path.exists(_report_path(report_id, 'prof')),
+    })
+
+
+def report_download(request, report_id):
+    path = _report_path(report_id, 'prof')
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{report_id}.prof')
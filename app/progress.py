@@ -0,0 +1,222 @@
+"""
+Progreso por lección: particiones y archivo.
+
+En PostgreSQL ``app_lessonprogress`` está particionada por rango de
+``period`` (el mes de la inscripción, una partición por año; ver la
+migración 0009). Cuando una inscripción terminada o cancelada lleva
+``PROGRESS_ARCHIVE_AFTER_DAYS`` días sin actividad, ``manage.py
+archive_lesson_progress`` mueve sus filas a ``LessonProgressArchive``: una
+sola fila por inscripción con el progreso comprimido. Las lecturas de la API
+pasan por ``progress_for_enrollment``, que devuelve lo mismo venga el
+progreso de la tabla o del archivo.
+"""
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Enrollment, Lesson, LessonProgress, LessonProgressArchive, progress_period
+from .versions import touch
+
+TABLE = LessonProgress._meta.db_table
+
+# Orden de los valores de cada lección en el archivo
+ARCHIVE_FIELDS = ('id', 'lesson_id', 'is_completed', 'time_spent_minutes', 'completed_at', 'last_accessed_at')
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+
+
+# ==================== PARTICIONES ====================
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+
+def partitions():
+    """``[(nombre, año o None para la de defecto)]`` de la tabla particionada"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_y'
+    return [(name, int(name[len(prefix):]) if name.startswith(prefix) else None) for name in names]
+
+
+def ensure_partitions(through_year):
+    """
+    Crea las particiones anuales que falten hasta ``through_year``.
+    PostgreSQL no crea una partición si la de defecto ya tiene filas de su
+    rango: se separa la de defecto, se crean las nuevas, se mueven allí sus
+    filas y se vuelve a adjuntar.
+    """
+    current = partitions()
+    existing = [year for _, year in current if year is not None]
+    years = list(range(max(existing, default=through_year) + 1, through_year + 1))
+    default = next((name for name, year in current if year is None), None)
+    if not years:
+        return []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if default:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {default}')
+        for year in years:
+            start, end = f'{year}-01-01', f'{year + 1}-01-01'
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+            if default:
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM {default} WHERE period >= %s AND period < %s RETURNING *) '
+                    f'INSERT INTO {TABLE} SELECT * FROM moved',
+                    [start, end],
+                )
+        if default:
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {default} DEFAULT')
+    return years
+
+
+def drop_empty_partitions(before_year):
+    """Elimina las particiones anuales anteriores a ``before_year`` que estén vacías"""
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, year in partitions():
+            if year is None or year >= before_year:
+                continue
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name})')
+            if not cursor.fetchone()[0]:
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(year)
+    return dropped
+
+
+# ==================== ARCHIVO ====================
+
+def archive_cutoff(days=None):
+    """Fecha antes de la cual una inscripción sin actividad se archiva"""
+    if days is None:
+        days = getattr(settings, 'PROGRESS_ARCHIVE_AFTER_DAYS', 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_enrollments(days=None):
+    """Inscripciones terminadas o canceladas sin actividad en ``days`` días"""
+    status_filter = Q()
+    for name in ARCHIVABLE_STATUSES:
+        status_filter |= Q(status__status_name__iexact=name)
+    return Enrollment.objects.filter(
+        status_filter,
+        progress_archived=False,
+        last_accessed_at__lt=archive_cutoff(days),
+    )
+
+
+def _pack(rows):
+    values = [
+        [row[field].isoformat() if hasattr(row[field], 'isoformat') else row[field] for field in ARCHIVE_FIELDS]
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(values, separators=(',', ':')).encode(), 9)
+
+
+def archive_enrollments(enrollment_ids):
+    """
+    Mueve al archivo el progreso de las inscripciones dadas. Devuelve el
+    número de filas de progreso archivadas.
+    """
+    enrollments = {
+        enrollment.pk: enrollment
+        for enrollment in Enrollment.objects.filter(pk__in=enrollment_ids, progress_archived=False)
+        .only('id', 'enrolled_at')
+    }
+    if not enrollments:
+        return 0
+
+    rows_by_enrollment = {pk: [] for pk in enrollments}
+    with transaction.atomic():
+        rows = LessonProgress.objects.filter(enrollment_id__in=enrollments).order_by(
+            'enrollment_id', 'lesson_id'
+        ).values('enrollment_id', *ARCHIVE_FIELDS)
+        for row in rows:
+            rows_by_enrollment[row['enrollment_id']].append(row)
+
+        LessonProgressArchive.objects.bulk_create([
+            LessonProgressArchive(
+                enrollment_id=pk,
+                period=progress_period(enrollments[pk].enrolled_at),
+                data=_pack(rows),
+                lesson_count=len(rows),
+                first_progress_id=min((row['id'] for row in rows), default=None),
+                last_progress_id=max((row['id'] for row in rows), default=None),
+            )
+            for pk, rows in rows_by_enrollment.items()
+        ])
+        LessonProgress.objects.filter(enrollment_id__in=enrollments).delete()
+        Enrollment.objects.filter(pk__in=enrollments).update(progress_archived=True)
+        touch(Enrollment)
+    return sum(len(rows) for rows in rows_by_enrollment.values())
+
+
+def archived_progress(enrollment, archive=None):
+    """
+    Progreso archivado de ``enrollment`` como instancias (sin guardar) de
+    ``LessonProgress``, con la lección cargada. Las lecciones borradas
+    después de archivar se omiten, igual que las habría borrado el CASCADE.
+    """
+    if archive is None:
+        archive = LessonProgressArchive.objects.filter(enrollment=enrollment).first()
+    if archive is None:
+        return []
+    values = json.loads(zlib.decompress(bytes(archive.data)))
+    lessons = Lesson.objects.only('id', 'title').in_bulk([value[1] for value in values])
+
+    progress = []
+    for value in values:
+        row = dict(zip(ARCHIVE_FIELDS, value))
+        if row['lesson_id'] not in lessons:
+            continue
+        for field in ('completed_at', 'last_accessed_at'):
+            if row[field]:
+                row[field] = parse_datetime(row[field])
+        item = LessonProgress(enrollment=enrollment, period=archive.period, **row)
+        item.lesson = lessons[row['lesson_id']]
+        progress.append(item)
+    return progress
+
+
+def archived_progress_row(pk):
+    """La fila de progreso archivada con id ``pk``, o ``None``"""
+    archives = LessonProgressArchive.objects.filter(
+        first_progress_id__lte=pk, last_progress_id__gte=pk
+    ).select_related('enrollment__user')
+    for archive in archives:
+        for item in archived_progress(archive.enrollment, archive):
+            if item.pk == pk:
+                return item
+    return None
+
+
+# ==================== LECTURA ====================
+
+def progress_for_enrollment(enrollment):
+    """
+    Progreso de una inscripción, de la tabla o del archivo. Con la tabla
+    particionada, el filtro por ``period`` limita la consulta a una sola
+    partición.
+    """
+    if enrollment.progress_archived:
+        return archived_progress(enrollment)
+    return LessonProgress.objects.filter(
+        enrollment=enrollment, period=progress_period(enrollment.enrolled_at)
+    ).select_related('lesson')
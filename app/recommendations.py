@@ -0,0 +1,387 @@
+"""
+Índices de recomendación de cursos.
+
+Los vecinos de cada curso se calculan fuera de la petición (comandos de
+gestión) y se guardan en ``CourseRecommendation``; las vistas solo leen
+la tabla precalculada.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import (
+    Course, Enrollment, CourseCoEnrollment, CourseRecommendation, RecommendationIndexState
+)
+
+DEFAULT_TOP_K = 20
+DEFAULT_MAX_FEATURES = 4096
+MAX_DOCUMENT_FREQUENCY = 0.5
+SIMILARITY_BLOCK_SIZE = 1024
+SCORE_TOLERANCE = 1e-6
+TEXT_FIELDS = ['title', 'description', 'requirements', 'learning_objectives']
+USER_CHUNK_SIZE = 2000
+# Ids por debajo de la marca de agua que se vuelven a mirar en cada ejecución:
+# un INSERT concurrente puede confirmar un id menor después de uno mayor
+RESCAN_IDS = 1000
+WRITE_BATCH_SIZE = 1000
+
+
+# ==================== UTILIDADES ====================
+
+def _group_ranks(groups, neighbor_ids, scores):
+    """
+    Orden de las filas por grupo y puntuación descendente (los empates por
+    id de vecino) y la posición de cada fila ordenada dentro de su grupo.
+    """
+    order = np.lexsort((neighbor_ids, -scores, groups))
+    groups = groups[order]
+    if not len(groups):
+        return order, order
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    group = np.repeat(starts, np.diff(np.r_[starts, len(groups)]))
+    return order, np.arange(len(groups)) - group
+
+
+def _top_k_rows(course_ids, neighbor_ids, scores, top_k):
+    """Ordena por curso y puntuación descendente y se queda con los K primeros"""
+    order, ranks = _group_ranks(course_ids, neighbor_ids, scores)
+    keep = ranks < top_k
+    order = order[keep]
+    return course_ids[order], neighbor_ids[order], scores[order], ranks[keep]
+
+
+def _store_recommendations(kind, course_ids, rows, category_ranks=None):
+    """
+    Reemplaza los vecinos guardados de ``course_ids`` por ``rows``. Un
+    ``rank`` negativo se guarda como ``NULL`` (fila fuera del top-K general).
+    """
+    if category_ranks is None:
+        category_ranks = np.full(len(rows[0]), -1)
+    CourseRecommendation.objects.filter(kind=kind, course_id__in=course_ids).delete()
+    CourseRecommendation.objects.bulk_create(
+        (
+            CourseRecommendation(
+                course_id=int(course_id), neighbor_id=int(neighbor_id), kind=kind,
+                rank=int(rank) if rank >= 0 else None, score=float(score),
+                category_rank=int(category_rank) if category_rank >= 0 else None,
+            )
+            for course_id, neighbor_id, score, rank, category_rank in zip(*rows, category_ranks)
+        ),
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+# ==================== ALSO TOOK (CO-INSCRIPCIÓN) ====================
+
+def _indicator(users, courses, n_users, n_courses):
+    matrix = np.zeros((n_users, n_courses), dtype=np.float32)
+    matrix[users, courses] = 1
+    return matrix
+
+
+def _co_enrollment_delta(user_ids, watermark, high, pending=()):
+    """
+    Incremento de la matriz curso × curso aportado por las inscripciones con
+    ``watermark < id <= high`` (o con id en ``pending``) de los usuarios
+    indicados.
+
+    Con X₀ la matriz usuario × curso hasta ``watermark`` y N la de las
+    inscripciones nuevas, ``XᵀX - X₀ᵀX₀ = NᵀX₀ + X₀ᵀN + NᵀN``; solo se
+    multiplican las columnas de N con algún valor, no el catálogo completo.
+    """
+    rows = np.array(
+        list(Enrollment.objects.filter(user_id__in=user_ids, id__lte=high)
+             .values_list('user_id', 'course_id', 'id')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    courses, course_index = np.unique(rows[:, 1], return_inverse=True)
+    _, user_index = np.unique(rows[:, 0], return_inverse=True)
+    n_users, n_courses = user_index.max() + 1, len(courses)
+
+    old = (rows[:, 2] <= watermark) & ~np.isin(rows[:, 2], list(pending))
+    previous = _indicator(user_index[old], course_index[old], n_users, n_courses)
+    current = _indicator(user_index, course_index, n_users, n_courses)
+    new_columns = np.flatnonzero((current - previous).any(axis=0))
+    new = current[:, new_columns] - previous[:, new_columns]
+
+    cross = new.T @ previous                   # NᵀX₀, k × n
+    own = new.T @ new                          # NᵀN, k × k
+    a, b = np.nonzero(cross)
+    c, d = np.nonzero(own)
+    course_ids = np.concatenate([courses[new_columns[a]], courses[b], courses[new_columns[c]]])
+    other_ids = np.concatenate([courses[b], courses[new_columns[a]], courses[new_columns[d]]])
+    counts = np.concatenate([cross[a, b], cross[a, b], own[c, d]]).astype(np.int64)
+    return course_ids, other_ids, counts
+
+
+def _merge_pairs(course_ids, other_ids, counts):
+    """Suma los conteos repetidos de un mismo par (curso, otro)"""
+    keys = np.stack([course_ids, other_ids], axis=1)
+    pairs, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return pairs[:, 0], pairs[:, 1], np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+
+
+def _apply_pair_deltas(course_ids, other_ids, deltas):
+    """Suma los incrementos a ``CourseCoEnrollment`` con un upsert por lotes"""
+    current = {
+        (course_id, other_id): count
+        for course_id, other_id, count in CourseCoEnrollment.objects.filter(
+            course_id__in=set(course_ids.tolist())
+        ).values_list('course_id', 'other_id', 'count')
+    }
+    pairs = []
+    for course_id, other_id, delta in zip(course_ids.tolist(), other_ids.tolist(), deltas.tolist()):
+        count = max(current.get((course_id, other_id), 0) + delta, 0)
+        pairs.append(CourseCoEnrollment(course_id=course_id, other_id=other_id, count=count))
+    CourseCoEnrollment.objects.bulk_create(
+        pairs, batch_size=WRITE_BATCH_SIZE, update_conflicts=True,
+        unique_fields=['course', 'other'], update_fields=['count'],
+    )
+
+
+def _rank_also_took(course_ids, top_k):
+    """Recalcula los vecinos (similitud coseno) de los cursos indicados"""
+    rows = np.array(
+        list(CourseCoEnrollment.objects.filter(course_id__in=course_ids, count__gt=0)
+             .values_list('course_id', 'other_id', 'count')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    diagonal = dict(
+        CourseCoEnrollment.objects.filter(
+            course_id__in=set(rows[:, 1].tolist()), other=F('course')
+        ).values_list('course_id', 'count')
+    )
+    off_diagonal = rows[rows[:, 0] != rows[:, 1]]
+    source, neighbor, together = off_diagonal.T
+    size = np.vectorize(diagonal.get, otypes=[np.float64])
+    if len(source):
+        scores = together / np.sqrt(size(source) * size(neighbor))
+    else:
+        scores = np.zeros(0)
+    _store_recommendations(
+        CourseRecommendation.ALSO_TOOK, course_ids,
+        _top_k_rows(source, neighbor, scores, top_k),
+    )
+
+
+def build_also_took(full=False, top_k=DEFAULT_TOP_K, chunk_size=USER_CHUNK_SIZE):
+    """
+    Actualiza el índice "students also took" con las inscripciones creadas
+    desde la última ejecución. Con ``full=True`` recalcula desde cero (por
+    ejemplo, tras borrar inscripciones, que el modo incremental no detecta).
+
+    Los huecos de los últimos ``RESCAN_IDS`` ids por debajo de la marca se
+    guardan en ``pending_ids`` y se vuelven a mirar en la siguiente
+    ejecución: son inscripciones aún sin confirmar (o revertidas).
+
+    Devuelve ``(nuevas_inscripciones, cursos_actualizados)``.
+    """
+    with transaction.atomic():
+        state, _ = RecommendationIndexState.objects.select_for_update().get_or_create(
+            name=CourseRecommendation.ALSO_TOOK
+        )
+        watermark = 0 if full else state.last_enrollment_id
+        pending = [] if full else state.pending_ids
+        high = Enrollment.objects.aggregate(high=Max('id'))['high'] or 0
+        new_enrollments = Enrollment.objects.filter(
+            Q(id__gt=watermark, id__lte=high) | Q(id__in=pending)
+        )
+        total_new = new_enrollments.count()
+
+        if full:
+            CourseCoEnrollment.objects.all().delete()
+            CourseRecommendation.objects.filter(kind=CourseRecommendation.ALSO_TOOK).delete()
+
+        user_ids = sorted(set(new_enrollments.values_list('user_id', flat=True)))
+        parts = [
+            _co_enrollment_delta(user_ids[start:start + chunk_size], watermark, high, pending)
+            for start in range(0, len(user_ids), chunk_size)
+        ]
+        changed = set()
+        if parts:
+            course_ids, other_ids, deltas = _merge_pairs(
+                *(np.concatenate(column) for column in zip(*parts))
+            )
+            _apply_pair_deltas(course_ids, other_ids, deltas)
+
+            changed = set(course_ids.tolist())
+            # El tamaño de un curso cambió: hay que repuntuar las listas donde aparece
+            grown = course_ids[course_ids == other_ids].tolist()
+            changed.update(
+                CourseRecommendation.objects.filter(
+                    kind=CourseRecommendation.ALSO_TOOK, neighbor_id__in=grown
+                ).values_list('course_id', flat=True)
+            )
+            _rank_also_took(sorted(changed), top_k)
+
+        low = max(high - RESCAN_IDS, 0)
+        seen = set(Enrollment.objects.filter(id__gt=low, id__lte=high).values_list('id', flat=True))
+        state.pending_ids = [pk for pk in range(low + 1, high + 1) if pk not in seen]
+        state.last_enrollment_id = high
+        state.built_at = timezone.now()
+        state.save()
+
+    return total_new, len(changed)
+
+
+# ==================== SIMILAR (CONTENIDO) ====================
+
+TOKEN_RE = re.compile(r'[^\W\d_]{3,}')
+
+
+def _tokenize(course):
+    text = ' '.join(course[field] or '' for field in TEXT_FIELDS)
+    return TOKEN_RE.findall(text.lower())
+
+
+def _tfidf_matrix(documents, max_features):
+    """
+    Matriz TF-IDF (filas normalizadas L2) de los documentos tokenizados.
+
+    Se descartan los términos presentes en más de la mitad del catálogo y el
+    vocabulario se limita a los ``max_features`` más frecuentes.
+    """
+    counts = [Counter(tokens) for tokens in documents]
+    document_frequency = Counter(term for doc in counts for term in doc)
+    limit = max(MAX_DOCUMENT_FREQUENCY * len(documents), 1)
+    candidates = [term for term, df in document_frequency.items() if df <= limit]
+    candidates.sort(key=lambda term: (-document_frequency[term], term))
+    vocabulary = {term: index for index, term in enumerate(candidates[:max_features])}
+
+    doc_index, term_index, term_counts = [], [], []
+    for row, doc in enumerate(counts):
+        for term, count in doc.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                doc_index.append(row)
+                term_index.append(column)
+                term_counts.append(count)
+
+    matrix = np.zeros((len(documents), max(len(vocabulary), 1)), dtype=np.float32)
+    matrix[doc_index, term_index] = 1 + np.log(np.asarray(term_counts, dtype=np.float32))
+    df = np.count_nonzero(matrix, axis=0)
+    matrix *= (np.log((1 + len(documents)) / (1 + df)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _similarity_blocks(vectors, rows, block_size):
+    """
+    Similitud coseno de ``rows`` con todo el catálogo, de ``block_size`` en
+    ``block_size`` filas para no crear nunca una matriz n × n. La similitud
+    de cada curso consigo mismo es 0.
+    """
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        similarity = vectors[block] @ vectors.T
+        similarity[np.arange(len(block)), block] = 0
+        yield block, similarity
+
+
+def _rank_similar(block, similarity, ids, categories, published, top_k):
+    """
+    Vecinos de las filas de ``block``: los ``top_k`` mejores cursos
+    publicados de cada categoría. Solo los ``top_k`` mejores del total
+    reciben ``rank``; los demás quedan para el filtro por categoría.
+    """
+    source, neighbor = np.nonzero((similarity > 0) & published)
+    scores = similarity[source, neighbor].astype(np.float64)
+    source, neighbor_ids = ids[block][source], ids[neighbor]
+
+    n_categories = categories.max() + 1
+    order, category_ranks = _group_ranks(source * n_categories + categories[neighbor], neighbor_ids, scores)
+    keep = order[category_ranks < top_k]
+    category_ranks = category_ranks[category_ranks < top_k]
+    source, neighbor_ids, scores = source[keep], neighbor_ids[keep], scores[keep]
+
+    order, ranks = _group_ranks(source, neighbor_ids, scores)
+    ranks = np.where(ranks < top_k, ranks, -1)
+    return (source[order], neighbor_ids[order], scores[order], ranks), category_ranks[order]
+
+
+def build_similar_courses(full=False, top_k=DEFAULT_TOP_K, max_features=DEFAULT_MAX_FEATURES,
+                          block_size=SIMILARITY_BLOCK_SIZE):
+    """
+    Recalcula los cursos similares por contenido de los cursos modificados
+    desde la última construcción, y de los cursos cuya lista de vecinos
+    cambia por ellos. Con ``full=True`` se recalculan todos (necesario tras
+    borrar cursos, que el modo incremental no detecta).
+
+    Por cada curso se guardan los ``top_k`` cursos publicados más parecidos
+    de cada categoría, así las listas filtradas por categoría (y la general,
+    que son los ``top_k`` mejores de todas) siempre están completas.
+
+    Devuelve ``(cursos_modificados, cursos_actualizados)``.
+    """
+    started_at = timezone.now()
+    with transaction.atomic():
+        state, _ = RecommendationIndexState.objects.select_for_update().get_or_create(
+            name=CourseRecommendation.SIMILAR
+        )
+        courses = list(
+            Course.objects.order_by('id').values('id', 'updated_at', 'category_id', 'published_at', *TEXT_FIELDS)
+        )
+        if not courses:
+            return 0, 0
+        ids = np.array([course['id'] for course in courses])
+        _, categories = np.unique([course['category_id'] for course in courses], return_inverse=True)
+        published = np.array([course['published_at'] is not None for course in courses])
+        if full or state.built_at is None:
+            changed = np.ones(len(courses), dtype=bool)
+        else:
+            changed = np.array([course['updated_at'] > state.built_at for course in courses])
+        if not changed.any():
+            state.built_at = started_at
+            state.save()
+            return 0, 0
+
+        vectors = _tfidf_matrix([_tokenize(course) for course in courses], max_features)
+        refresh = changed.copy()
+        if not refresh.all():
+            # Listas guardadas: la peor puntuación de cada curso en cada categoría
+            stored = np.array(
+                list(CourseRecommendation.objects.filter(kind=CourseRecommendation.SIMILAR)
+                     .values_list('course_id', 'neighbor_id', 'score')),
+                dtype=np.float64,
+            ).reshape(-1, 3)
+            position = {course_id: index for index, course_id in enumerate(ids.tolist())}
+            shape = (len(courses), categories.max() + 1)
+            lengths = np.zeros(shape, dtype=np.int64)
+            floor = np.full(shape, np.inf)
+            if len(stored):
+                rows = np.array([position[int(course_id)] for course_id in stored[:, 0]])
+                columns = categories[[position[int(neighbor_id)] for neighbor_id in stored[:, 1]]]
+                np.add.at(lengths, (rows, columns), 1)
+                np.minimum.at(floor, (rows, columns), stored[:, 2])
+            floor[lengths < top_k] = 0
+
+            # Un curso modificado (y publicado) entra en la lista de X si alcanza
+            # al peor vecino de su categoría (los empates se deciden por id, con
+            # margen para el redondeo de float32) o si ya estaba en ella
+            candidates = np.flatnonzero(changed & published)
+            for block, similarity in _similarity_blocks(vectors, candidates, block_size):
+                threshold = floor[:, categories[block]].T
+                refresh |= ((similarity > 0) & (similarity >= threshold - SCORE_TOLERANCE)).any(axis=0)
+            if len(stored):
+                holders = stored[np.isin(stored[:, 1], ids[changed]), 0].astype(np.int64)
+                refresh[[position[course_id] for course_id in holders.tolist()]] = True
+
+        refresh_rows = np.flatnonzero(refresh)
+        parts, category_ranks = [], []
+        for block, similarity in _similarity_blocks(vectors, refresh_rows, block_size):
+            rows, ranks = _rank_similar(block, similarity, ids, categories, published, top_k)
+            parts.append(rows)
+            category_ranks.append(ranks)
+        _store_recommendations(
+            CourseRecommendation.SIMILAR, ids[refresh_rows].tolist(),
+            [np.concatenate(column) for column in zip(*parts)], np.concatenate(category_ranks),
+        )
+
+        state.built_at = started_at
+        state.save()
+
+    return int(changed.sum()), len(refresh_rows)
@@ -0,0 +1,77 @@
+"""
+Renderer y parser JSON rápidos para DRF.
+
+Con ``orjson`` instalado se codifica y decodifica en Rust; sin él se usa
+el camino de DRF (``json`` de la biblioteca estándar). La salida es byte a
+byte la del ``JSONRenderer`` de DRF con su configuración por defecto
+(compacta, UTF-8 sin escapar): los tipos que orjson formatearía distinto
+(``Decimal``, ``datetime``, ``time``, ``timedelta``...) se delegan al
+``JSONEncoder`` de DRF. Solo cambia la notación exponencial de floats muy
+grandes o muy pequeños (``1e16`` en lugar de ``1e+16``, el mismo valor) y
+NaN/Infinity, que DRF rechaza y orjson escribe como ``null``.
+"""
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el camino de DRF
+    orjson = None
+
+_drf_default = JSONEncoder().default
+
+if orjson is not None:
+    ORJSON_OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def orjson_enabled():
+    return orjson is not None and getattr(settings, 'FAST_JSON_ENABLED', True)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """``JSONRenderer`` que usa orjson salvo con sangrado u opciones no compactas"""
+
+    def _can_use_orjson(self, accepted_media_type, renderer_context):
+        # orjson solo sabe sangrar con dos espacios y no tiene modos ASCII ni laxo
+        return (
+            orjson_enabled()
+            and not self.get_indent(accepted_media_type, renderer_context or {})
+            and api_settings.COMPACT_JSON
+            and api_settings.UNICODE_JSON
+            and self.encoder_class is JSONEncoder
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self._can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # p. ej. enteros de más de 64 bits: el encoder de DRF sí los admite
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que DRF: U+2028 y U+2029 escapados para poder incrustarlo en <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """``JSONParser`` que decodifica con orjson (también rechaza NaN e Infinity)"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not orjson_enabled():
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read() if stream is not None else b''
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding).encode('utf-8')
+            return orjson.loads(content)
+        except (ValueError, UnicodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
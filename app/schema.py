@@ -0,0 +1,186 @@
+"""
+Esquema OpenAPI pregenerado.
+
+drf_yasg introspecciona todos los viewsets y serializers en cada petición
+al esquema. Aquí se genera una sola vez por versión del código (con
+``manage.py build_openapi_schema`` o en la primera petición), se guarda
+comprimido en ``OPENAPI_SCHEMA_DIR`` y se sirve desde memoria con un ETag.
+Las páginas de Swagger UI y ReDoc solo renderizan su plantilla y cargan
+ese mismo archivo.
+
+drf_yasg solo se importa dentro de las funciones que lo necesitan: servir
+un esquema ya generado no lo carga, y arrancar un worker tampoco.
+"""
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from functools import lru_cache
+from importlib import metadata
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from .docs import apply_api_docs
+
+API_TITLE = "LMS API Documentation"
+
+# extensión -> (content type, codec de drf_yasg.codecs)
+FORMATS = {
+    '.json': ('application/json', 'OpenAPICodecJson'),
+    '.yaml': ('application/yaml', 'OpenAPICodecYaml'),
+}
+
+# Librerías cuya versión cambia el esquema generado
+SCHEMA_PACKAGES = ('django', 'djangorestframework', 'drf-yasg', 'django-filter')
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+_lock = threading.Lock()
+_artifacts = {}
+
+
+# ==================== GENERACIÓN ====================
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title=API_TITLE,
+        default_version='v1',
+        description="A comprehensive Learning Management System API built with Django REST Framework. "
+        "Supports multi-role users (instructors and students) with full CRUD operations "
+        "for courses, lessons, enrollments, and more.",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="admin@lms.com"),
+        license=openapi.License(name="MIT License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Versión del código para la que vale el esquema: ``CODE_VERSION`` si está
+    definido (p. ej. el commit desplegado) o un hash de los fuentes y de las
+    versiones de las librerías que intervienen.
+    """
+    if getattr(settings, 'CODE_VERSION', ''):
+        return settings.CODE_VERSION
+
+    digest = hashlib.sha256()
+    for package in SCHEMA_PACKAGES:
+        try:
+            digest.update(f'{package}=={metadata.version(package)}\n'.encode())
+        except metadata.PackageNotFoundError:
+            pass
+    base_dir = str(settings.BASE_DIR)
+    for root in ('app', 'lms_project'):
+        for dirpath, dirnames, filenames in os.walk(os.path.join(base_dir, root)):
+            dirnames[:] = sorted(d for d in dirnames if d not in ('__pycache__', 'migrations'))
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    digest.update(os.path.relpath(path, base_dir).encode())
+                    with open(path, 'rb') as source:
+                        digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(version, extension):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'openapi-{version}{extension}.gz')
+
+
+def build_artifacts(version=None):
+    """
+    Genera el esquema y guarda un archivo gzip por formato. Borra los de
+    otras versiones. Devuelve las rutas escritas.
+    """
+    from drf_yasg import codecs
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    version = version or code_version()
+    apply_api_docs()
+    schema = OpenAPISchemaGenerator(api_info()).get_schema(request=None, public=True)
+
+    directory = settings.OPENAPI_SCHEMA_DIR
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for extension, (_, codec) in FORMATS.items():
+        content = getattr(codecs, codec)(validators=[]).encode(schema)
+        path = artifact_path(version, extension)
+        # Escritura atómica: otro proceso puede estar leyendo o generando
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as artifact:
+            artifact.write(gzip.compress(content, compresslevel=9, mtime=0))
+        os.replace(tmp_path, path)
+        written.append(path)
+
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if filename.startswith('openapi-') and path not in written:
+            os.remove(path)
+    return written
+
+
+def load_artifact(extension):
+    """
+    Devuelve ``(gzip, contenido, etag)`` del esquema para la versión actual,
+    generándolo si todavía no existe. Se cachea en memoria por proceso.
+    """
+    key = (code_version(), extension)
+    if key not in _artifacts:
+        with _lock:
+            if key not in _artifacts:
+                path = artifact_path(*key)
+                if not os.path.exists(path):
+                    build_artifacts(key[0])
+                with open(path, 'rb') as artifact:
+                    compressed = artifact.read()
+                content = gzip.decompress(compressed)
+                _artifacts[key] = (compressed, content, hashlib.sha256(content).hexdigest()[:32])
+    return _artifacts[key]
+
+
+# ==================== VISTAS ====================
+
+@require_GET
+def schema_file(request, format):
+    """Sirve el esquema pregenerado (``/swagger.json`` y ``/swagger.yaml``)"""
+    compressed, content, digest = load_artifact(format)
+    use_gzip = bool(_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+    # Cada codificación es una representación distinta: ETag distinto
+    etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(compressed if use_gzip else content, content_type=FORMATS[format][0])
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def _render_ui(request, renderer_name):
+    from drf_yasg import renderers
+
+    renderer = getattr(renderers, renderer_name)()
+    context = {'request': request}
+    renderer.set_context(context)
+    context['title'] = API_TITLE
+    return HttpResponse(render_to_string(renderer.template, context, request))
+
+
+@require_GET
+def swagger_ui(request):
+    return _render_ui(request, 'SwaggerUIRenderer')
+
+
+@require_GET
+def redoc_ui(request):
+    return _render_ui(request, 'ReDocRenderer')
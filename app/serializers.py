@@ -1,20 +1,75 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import (
     Profile, Course_Category, DifficultyLevel, CourseStatus,
     Course, LessonType, Lesson, EnrollmentStatus, Enrollment,
-    LessonProgress, Comment
+    LessonProgress, Comment, CourseRatingSummary, CourseRecommendation
 )
+from .images import current_variants
+from .profiling import FieldTimingMixin
+
+
+# ==================== FIELDS ====================
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    URL de una variante precalculada de una imagen (ver ``app.images``).
+    Si la variante aún no existe se devuelve la URL del original.
+    """
+    
+    def __init__(self, image_field, variant, **kwargs):
+        self.image_field = image_field
+        self.variant = variant
+        kwargs.setdefault('source', '*')
+        super().__init__(**kwargs)
+    
+    def to_representation(self, obj):
+        image = getattr(obj, self.image_field)
+        if not image:
+            return None
+        variants = current_variants(image, getattr(obj, f'{self.image_field}_variants'))
+        variant = variants.get(self.variant)
+        url = image.storage.url(variant['name']) if variant else image.url
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Todas las variantes de una imagen con su URL y dimensiones"""
+    
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.setdefault('source', '*')
+        super().__init__(**kwargs)
+    
+    def to_representation(self, obj):
+        image = getattr(obj, self.image_field)
+        variants = current_variants(image, getattr(obj, f'{self.image_field}_variants'))
+        request = self.context.get('request', None)
+        result = {}
+        for name, variant in variants.items():
+            url = image.storage.url(variant['name'])
+            result[name] = {
+                'url': request.build_absolute_uri(url) if request is not None else url,
+                'width': variant['width'],
+                'height': variant['height'],
+            }
+        return result
 
 
 # ==================== USER & PROFILE ====================
 
 class ProfileSerializer(serializers.ModelSerializer):
     """Serializer para el perfil de usuario"""
+    avatar_variants = ImageVariantsField('avatar')
     
     class Meta:
         model = Profile
-        fields = ['bio', 'birth_date', 'phone', 'avatar', 'is_instructor', 
+        fields = ['bio', 'birth_date', 'phone', 'avatar', 'avatar_variants', 'is_instructor', 
                   'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
@@ -31,11 +86,14 @@ class UserSerializer(serializers.ModelSerializer):
                   'date_joined', 'profile', 'total_courses', 'total_enrollments']
         read_only_fields = ['date_joined']
     
+    # Contadores del perfil (ver app.counters); sin perfil se cuentan
     def get_total_courses(self, obj):
-        return obj.courses.count()
+        profile = getattr(obj, 'profile', None)
+        return profile.courses_taught_count if profile else obj.courses.count()
     
     def get_total_enrollments(self, obj):
-        return obj.enrollments.count()
+        profile = getattr(obj, 'profile', None)
+        return profile.enrollment_count if profile else obj.enrollments.count()
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -70,16 +128,13 @@ class UserListSerializer(serializers.ModelSerializer):
 
 class CourseCategorySerializer(serializers.ModelSerializer):
     """Serializer para categorías de cursos"""
-    total_courses = serializers.SerializerMethodField()
+    total_courses = serializers.IntegerField(source='course_count', read_only=True)
     
     class Meta:
         model = Course_Category
         fields = ['id', 'name', 'slug', 'description', 'icon', 'is_active', 
                   'created_at', 'total_courses']
         read_only_fields = ['slug', 'created_at']
-    
-    def get_total_courses(self, obj):
-        return obj.course_set.count()
 
 
 class DifficultyLevelSerializer(serializers.ModelSerializer):
@@ -120,14 +175,18 @@ class LessonSerializer(serializers.ModelSerializer):
     """Serializer completo para lecciones"""
     lesson_type_name = serializers.CharField(source='lesson_type.type_name', read_only=True)
     course_title = serializers.CharField(source='course.title', read_only=True)
+    content = serializers.CharField(allow_blank=True)
+    content_hash = serializers.CharField(read_only=True)
     
     class Meta:
         model = Lesson
         fields = ['id', 'course', 'course_title', 'title', 'description', 
-                  'lesson_type', 'lesson_type_name', 'content', 'video_url', 
+                  'lesson_type', 'lesson_type_name', 'content', 'content_hash', 'video_url', 
                   'duration_minutes', 'order_index', 'is_published', 'is_free', 
                   'attachments', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+        # Si no se indica, la lección se añade al final del curso
+        extra_kwargs = {'order_index': {'required': False}}
 
 
 class LessonListSerializer(serializers.ModelSerializer):
@@ -140,6 +199,134 @@ class LessonListSerializer(serializers.ModelSerializer):
                   'order_index', 'is_published', 'is_free']
 
 
+class LessonReorderSerializer(serializers.Serializer):
+    """
+    Serializer para reordenar las lecciones de un curso.
+    
+    Acepta el orden completo (``lessons``) o el movimiento de una sola
+    lección (``lesson`` + ``after``, ``null`` para moverla al principio).
+    Requiere en el contexto ``lessons``: las lecciones del curso en orden.
+    """
+    lessons = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    lesson = serializers.IntegerField(required=False)
+    after = serializers.IntegerField(required=False, allow_null=True)
+    
+    def validate(self, data):
+        course_lessons = {lesson.id: lesson for lesson in self.context['lessons']}
+        
+        if 'lessons' in data:
+            if 'lesson' in data or 'after' in data:
+                raise serializers.ValidationError(
+                    "Indica el orden completo o un movimiento, no ambos."
+                )
+            if len(set(data['lessons'])) != len(data['lessons']):
+                raise serializers.ValidationError({'lessons': "Hay lecciones repetidas."})
+            if set(data['lessons']) != set(course_lessons):
+                raise serializers.ValidationError({
+                    'lessons': "Debe incluir exactamente todas las lecciones del curso."
+                })
+        elif 'lesson' in data:
+            if 'after' not in data:
+                raise serializers.ValidationError({'after': "Este campo es requerido."})
+            if data['lesson'] not in course_lessons:
+                raise serializers.ValidationError({'lesson': "La lección no pertenece al curso."})
+            if data['after'] is not None and (
+                data['after'] not in course_lessons or data['after'] == data['lesson']
+            ):
+                raise serializers.ValidationError({'after': "Lección de referencia no válida."})
+        else:
+            raise serializers.ValidationError("Se requiere 'lessons' o 'lesson' y 'after'.")
+        
+        return data
+    
+    def create(self, validated_data):
+        lessons = list(self.context['lessons'])
+        gap = Lesson.ORDER_GAP
+        
+        if 'lessons' in validated_data:
+            by_id = {lesson.id: lesson for lesson in lessons}
+            ordered = [by_id[lesson_id] for lesson_id in validated_data['lessons']]
+            return self._renumber(ordered, gap)
+        
+        moving = next(l for l in lessons if l.id == validated_data['lesson'])
+        ordered = [l for l in lessons if l.id != moving.id]
+        after = validated_data['after']
+        position = 0 if after is None else next(
+            index for index, l in enumerate(ordered) if l.id == after
+        ) + 1
+        ordered.insert(position, moving)
+        
+        previous = ordered[position - 1].order_index if position > 0 else 0
+        following = (
+            ordered[position + 1].order_index if position + 1 < len(ordered)
+            else previous + 2 * gap
+        )
+        if following - previous >= 2:
+            # Hay hueco: solo se reescribe la lección movida
+            moving.order_index = (previous + following) // 2
+            self._save([moving])
+            return ordered
+        return self._renumber(ordered, gap)
+    
+    def _renumber(self, ordered, gap):
+        """Reparte las posiciones con separación ``gap`` y guarda las cambiadas"""
+        changed = []
+        for index, lesson in enumerate(ordered, start=1):
+            if lesson.order_index != index * gap:
+                lesson.order_index = index * gap
+                changed.append(lesson)
+        self._save(changed)
+        return ordered
+    
+    def _save(self, lessons):
+        now = timezone.now()
+        for lesson in lessons:
+            lesson.updated_at = now
+        Lesson.objects.bulk_update(lessons, ['order_index', 'updated_at'])
+
+
+class LessonBulkItemSerializer(serializers.Serializer):
+    """Cambios de una lección dentro de una actualización masiva"""
+    id = serializers.IntegerField()
+    is_published = serializers.BooleanField(required=False)
+    is_free = serializers.BooleanField(required=False)
+
+
+class LessonBulkUpdateSerializer(serializers.Serializer):
+    """
+    Serializer para actualizar ``is_published``/``is_free`` de varias
+    lecciones de un curso a la vez. Requiere ``lessons`` en el contexto.
+    """
+    lessons = LessonBulkItemSerializer(many=True, allow_empty=False)
+    
+    def validate_lessons(self, items):
+        course_lessons = {lesson.id for lesson in self.context['lessons']}
+        ids = [item['id'] for item in items]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Hay lecciones repetidas.")
+        unknown = sorted(set(ids) - course_lessons)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Lecciones que no pertenecen al curso: {unknown}"
+            )
+        return items
+    
+    def create(self, validated_data):
+        by_id = {lesson.id: lesson for lesson in self.context['lessons']}
+        now = timezone.now()
+        changed = []
+        for item in validated_data['lessons']:
+            lesson = by_id[item.pop('id')]
+            for field, value in item.items():
+                setattr(lesson, field, value)
+            lesson.updated_at = now
+            changed.append(lesson)
+        Lesson.objects.bulk_update(changed, ['is_published', 'is_free', 'updated_at'])
+        return changed
+
+
 class LessonProgressSerializer(serializers.ModelSerializer):
     """Serializer para progreso de lecciones"""
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
@@ -155,7 +342,7 @@ class LessonProgressSerializer(serializers.ModelSerializer):
 
 # ==================== COURSES ====================
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(FieldTimingMixin, serializers.ModelSerializer):
     """Serializer completo para cursos"""
     instructor_name = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -165,15 +352,17 @@ class CourseSerializer(serializers.ModelSerializer):
     total_lessons = serializers.SerializerMethodField()
     total_enrollments = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
+    thumbnail_variants = ImageVariantsField('thumbnail')
     
     class Meta:
         model = Course
         fields = ['id', 'title', 'slug', 'description', 'instructor', 'instructor_name',
                   'category', 'category_name', 'difficulty_level', 'difficulty_name',
-                  'status', 'status_name', 'thumbnail', 'price', 'duration_hours',
+                  'status', 'status_name', 'thumbnail', 'thumbnail_variants', 'price', 'duration_hours',
                   'language', 'requirements', 'learning_objectives', 'published_at',
                   'lessons', 'total_lessons', 'total_enrollments', 'average_rating',
-                  'created_at', 'updated_at']
+                  'rating_histogram', 'created_at', 'updated_at']
         read_only_fields = ['slug', 'created_at', 'updated_at']
     
     def get_instructor_name(self, obj):
@@ -186,41 +375,84 @@ class CourseSerializer(serializers.ModelSerializer):
         return obj.enrollments.count()
     
     def get_average_rating(self, obj):
-        comments = obj.comments.filter(is_review=True, rating__isnull=False)
-        if comments.exists():
-            return round(sum(c.rating for c in comments) / comments.count(), 2)
-        return None
+        summary = getattr(obj, 'rating_summary', None)
+        return summary.average_rating if summary else None
+    
+    def get_rating_histogram(self, obj):
+        summary = getattr(obj, 'rating_summary', None)
+        return summary.histogram if summary else {str(star): 0 for star in range(1, 6)}
 
 
-class CourseListSerializer(serializers.ModelSerializer):
+class CourseListSerializer(FieldTimingMixin, serializers.ModelSerializer):
     """Serializer simplificado para listar cursos"""
     instructor_name = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     difficulty_name = serializers.CharField(source='difficulty_level.level_name', read_only=True)
+    thumbnail = ImageVariantField('thumbnail', 'card')
     total_lessons = serializers.SerializerMethodField()
     total_enrollments = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
         fields = ['id', 'title', 'slug', 'instructor_name', 'category_name',
                   'difficulty_name', 'thumbnail', 'price', 'duration_hours',
-                  'total_lessons', 'total_enrollments', 'average_rating']
+                  'total_lessons', 'total_enrollments', 'average_rating',
+                  'rating_histogram']
+        # Rutas que usan los campos calculados en el modo compilado (app.compiled)
+        compiled_sources = {
+            'instructor_name': ['instructor.first_name', 'instructor.last_name', 'instructor.username'],
+            'thumbnail': ['thumbnail', 'thumbnail_variants'],
+            'total_lessons': ['lesson_total'],
+            'total_enrollments': ['enrollment_total'],
+            'average_rating': ['rating_summary.rating_sum', 'rating_summary.total_reviews'],
+            'rating_histogram': [f'rating_summary.rating_{stars}' for stars in range(1, 6)],
+        }
     
     def get_instructor_name(self, obj):
         return f"{obj.instructor.first_name} {obj.instructor.last_name}".strip() or obj.instructor.username
     
     def get_total_lessons(self, obj):
+        # Los listados anotan el conteo (ver CourseViewSet.list_annotations)
+        if hasattr(obj, 'lesson_total'):
+            return obj.lesson_total
         return obj.lessons.count()
     
     def get_total_enrollments(self, obj):
+        if hasattr(obj, 'enrollment_total'):
+            return obj.enrollment_total
         return obj.enrollments.count()
     
     def get_average_rating(self, obj):
-        comments = obj.comments.filter(is_review=True, rating__isnull=False)
-        if comments.exists():
-            return round(sum(c.rating for c in comments) / comments.count(), 2)
-        return None
+        summary = getattr(obj, 'rating_summary', None)
+        return summary.average_rating if summary else None
+    
+    def get_rating_histogram(self, obj):
+        summary = getattr(obj, 'rating_summary', None)
+        return summary.histogram if summary else {str(star): 0 for star in range(1, 6)}
+
+
+class CourseRatingSummarySerializer(serializers.ModelSerializer):
+    """Serializer para el resumen de calificaciones de un curso"""
+    course = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    
+    class Meta:
+        model = CourseRatingSummary
+        fields = ['course', 'average_rating', 'total_reviews', 'histogram', 'updated_at']
+
+
+class CourseRecommendationSerializer(serializers.ModelSerializer):
+    """Serializer para cursos recomendados a partir de un curso"""
+    id = serializers.IntegerField(source='neighbor.id', read_only=True)
+    slug = serializers.CharField(source='neighbor.slug', read_only=True)
+    title = serializers.CharField(source='neighbor.title', read_only=True)
+    
+    class Meta:
+        model = CourseRecommendation
+        fields = ['id', 'slug', 'title', 'score', 'rank']
 
 
 class CourseCreateUpdateSerializer(serializers.ModelSerializer):
@@ -237,7 +469,7 @@ class CourseCreateUpdateSerializer(serializers.ModelSerializer):
 
 # ==================== ENROLLMENTS ====================
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(FieldTimingMixin, serializers.ModelSerializer):
     """Serializer completo para inscripciones"""
     user_username = serializers.CharField(source='user.username', read_only=True)
     user_full_name = serializers.SerializerMethodField()
@@ -265,42 +497,34 @@ class EnrollmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['user', 'course']
-    
-    def validate(self, data):
-        """Validar que un usuario no se inscriba dos veces al mismo curso"""
-        user = data.get('user')
-        course = data.get('course')
-        
-        if self.instance is None:  # Solo en creación
-            if Enrollment.objects.filter(user=user, course=course).exists():
-                raise serializers.ValidationError(
-                    "El usuario ya está inscrito en este curso."
-                )
-        
-        return data
+        # La unicidad (usuario, curso) la garantiza la base de datos en create()
+        validators = []
     
     def create(self, validated_data):
-        # Asignar estado inicial automáticamente
-        active_status = EnrollmentStatus.objects.filter(
-            status_name__iexact='active'
-        ).first()
-        
-        if active_status:
-            validated_data['status'] = active_status
-        
-        return super().create(validated_data)
-
-
-class EnrollmentListSerializer(serializers.ModelSerializer):
+        # Una sola sentencia: estado inicial 'active' y sin duplicados
+        enrollment, created = Enrollment.objects.enroll(
+            validated_data['user'], validated_data['course']
+        )
+        if not created:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ["El usuario ya está inscrito en este curso."]
+            })
+        return enrollment
+
+
+class EnrollmentListSerializer(FieldTimingMixin, serializers.ModelSerializer):
     """Serializer simplificado para listar inscripciones"""
     course_title = serializers.CharField(source='course.title', read_only=True)
-    course_thumbnail = serializers.ImageField(source='course.thumbnail', read_only=True)
+    course_thumbnail = ImageVariantField('thumbnail', 'thumb', source='course')
     status_name = serializers.CharField(source='status.status_name', read_only=True)
     
     class Meta:
         model = Enrollment
         fields = ['id', 'course_title', 'course_thumbnail', 'status_name',
                   'progress_percentage', 'enrolled_at', 'last_accessed_at']
+        compiled_sources = {
+            'course_thumbnail': ['course.thumbnail', 'course.thumbnail_variants'],
+        }
 
 
 # ==================== COMMENTS ====================
@@ -0,0 +1,308 @@
+from django.db.models import F
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from django.contrib.auth.models import User
+
+from .catalog import schedule_rebuild
+from .counters import adjust, recount
+from .course_page import bump
+from .events import enrollment_event, publish
+from .images import variants_are_stale
+from .jobs import enqueue
+from .models import (
+    Comment, Course, Course_Category, CourseRatingSummary, DifficultyLevel, Enrollment, Job, Lesson,
+    LessonProgress, Profile, TableVersion
+)
+from .versions import touch
+
+
+# ==================== RATING SUMMARY ====================
+
+def _apply_rating(course_id, rating, delta):
+    """Suma (o resta) una calificación al histograma del curso con F()"""
+    updates = {
+        f'rating_{rating}': F(f'rating_{rating}') + delta,
+        'total_reviews': F('total_reviews') + delta,
+        'rating_sum': F('rating_sum') + delta * rating,
+        'updated_at': timezone.now(),
+    }
+    if delta > 0:
+        CourseRatingSummary.objects.get_or_create(course_id=course_id)
+    # Al restar no se crea la fila: el curso puede estar borrándose en cascada
+    CourseRatingSummary.objects.filter(course_id=course_id).update(**updates)
+    touch(CourseRatingSummary)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """Guarda el estado anterior del comentario para poder revertirlo"""
+    instance._previous_rating = None
+    if raw or instance.pk is None:
+        return
+    previous = Comment.objects.filter(pk=instance.pk).values(
+        'course_id', 'rating', 'is_review'
+    ).first()
+    if previous and previous['is_review'] and previous['rating'] is not None:
+        instance._previous_rating = (previous['course_id'], previous['rating'])
+
+
+@receiver(post_save, sender=Comment)
+def update_rating_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    current = (instance.course_id, instance.rating) if instance.counts_as_rating else None
+    if previous == current:
+        return
+    if previous is not None:
+        _apply_rating(*previous, delta=-1)
+    if current is not None:
+        _apply_rating(*current, delta=1)
+
+
+@receiver(post_delete, sender=Comment)
+def discount_deleted_rating(sender, instance, **kwargs):
+    if instance.counts_as_rating:
+        _apply_rating(instance.course_id, instance.rating, delta=-1)
+
+
+# ==================== COUNTERS ====================
+
+def _count_course(category_id, instructor_id, delta):
+    adjust(Course_Category, 'course_count', {category_id: delta})
+    adjust(Profile, 'courses_taught_count', {instructor_id: delta}, key='user_id')
+
+
+def _previous(sender, instance, fields, update_fields):
+    """Valores guardados de ``fields`` si el save puede cambiarlos"""
+    if instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)):
+        return None
+    return sender.objects.filter(pk=instance.pk).values(*(f'{name}_id' for name in fields)).first()
+
+
+@receiver(pre_save, sender=Course)
+def remember_previous_course_owners(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_owners = None if raw else _previous(
+        sender, instance, ('category', 'instructor'), update_fields
+    )
+
+
+@receiver(post_save, sender=Course)
+def count_saved_course(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_owners', None)
+    if created:
+        _count_course(instance.category_id, instance.instructor_id, 1)
+    elif previous:
+        if previous['category_id'] != instance.category_id:
+            adjust(Course_Category, 'course_count', {previous['category_id']: -1, instance.category_id: 1})
+        if previous['instructor_id'] != instance.instructor_id:
+            adjust(Profile, 'courses_taught_count',
+                   {previous['instructor_id']: -1, instance.instructor_id: 1}, key='user_id')
+
+
+@receiver(post_delete, sender=Course)
+def discount_deleted_course(sender, instance, **kwargs):
+    _count_course(instance.category_id, instance.instructor_id, -1)
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_previous_student(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_student = None if raw else _previous(sender, instance, ('user',), update_fields)
+
+
+@receiver(post_save, sender=Enrollment)
+def count_saved_enrollment(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_student', None)
+    if created:
+        adjust(Profile, 'enrollment_count', {instance.user_id: 1}, key='user_id')
+    elif previous and previous['user_id'] != instance.user_id:
+        adjust(Profile, 'enrollment_count', {previous['user_id']: -1, instance.user_id: 1}, key='user_id')
+
+
+@receiver(post_delete, sender=Enrollment)
+def discount_deleted_enrollment(sender, instance, **kwargs):
+    adjust(Profile, 'enrollment_count', {instance.user_id: -1}, key='user_id')
+
+
+@receiver(post_save, sender=Profile)
+def count_new_profile(sender, instance, created=False, raw=False, **kwargs):
+    # El usuario puede tener cursos e inscripciones antes que perfil
+    if created and not raw:
+        recount(Profile.objects.filter(pk=instance.pk))
+
+
+# ==================== IMAGE VARIANTS ====================
+
+def _schedule_variants(model, pk):
+    enqueue('build_image_variants', {'model': model, 'pk': pk}, dedupe_key=f'image-variants:{model}:{pk}')
+
+
+@receiver(post_save, sender=Course)
+def refresh_thumbnail_variants(sender, instance, raw=False, **kwargs):
+    if not raw and variants_are_stale(instance.thumbnail, instance.thumbnail_variants):
+        _schedule_variants('course', instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def refresh_avatar_variants(sender, instance, raw=False, **kwargs):
+    if not raw and variants_are_stale(instance.avatar, instance.avatar_variants):
+        _schedule_variants('profile', instance.pk)
+
+
+# ==================== CATALOG SNAPSHOT ====================
+
+# Columnas de Course que aparecen en el catálogo (CourseListSerializer)
+CATALOG_COURSE_FIELDS = {
+    'title', 'slug', 'instructor', 'category', 'difficulty_level', 'thumbnail',
+    'thumbnail_variants', 'price', 'duration_hours', 'published_at',
+}
+CATALOG_INSTRUCTOR_FIELDS = ('first_name', 'last_name', 'username')
+
+
+@receiver(post_save, sender=Course)
+def catalog_course_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not CATALOG_COURSE_FIELDS & set(update_fields)):
+        return
+    schedule_rebuild()
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Course_Category)
+@receiver(post_delete, sender=Course_Category)
+@receiver(post_save, sender=DifficultyLevel)
+@receiver(post_delete, sender=DifficultyLevel)
+def catalog_entry_changed(sender, raw=False, **kwargs):
+    if not raw:
+        schedule_rebuild()
+
+
+def _course_in_catalog(instance):
+    """Si el curso de ``instance`` (lección o inscripción) está publicado"""
+    if type(instance).course.is_cached(instance):
+        return instance.course.published_at is not None
+    return Course.objects.filter(pk=instance.course_id, published_at__isnull=False).exists()
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Enrollment)
+def catalog_count_changed(sender, instance, created=False, raw=False, **kwargs):
+    # El catálogo solo muestra cuántas hay de los cursos publicados: editar una
+    # existente no lo cambia
+    if created and not raw and _course_in_catalog(instance):
+        schedule_rebuild()
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Enrollment)
+def catalog_count_decreased(sender, instance, **kwargs):
+    if _course_in_catalog(instance):
+        schedule_rebuild()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def catalog_rating_changed(sender, instance, raw=False, **kwargs):
+    if not raw and (instance.counts_as_rating or getattr(instance, '_previous_rating', None)):
+        schedule_rebuild()
+
+
+def _instructor_name(user):
+    # Sin acceder a campos diferidos, que harían una consulta
+    return tuple(user.__dict__.get(name) for name in CATALOG_INSTRUCTOR_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_instructor_name(sender, instance, **kwargs):
+    instance._catalog_name = _instructor_name(instance)
+
+
+@receiver(post_save, sender=User)
+def catalog_instructor_changed(sender, instance, created=False, raw=False, **kwargs):
+    # El catálogo solo muestra el nombre: login, contraseña, etc. no lo cambian
+    name = _instructor_name(instance)
+    if raw or created or name == instance._catalog_name:
+        return
+    instance._catalog_name = name
+    if Course.objects.filter(instructor=instance, published_at__isnull=False).exists():
+        schedule_rebuild()
+
+
+# ==================== CONDITIONAL GET ====================
+
+@receiver(post_save)
+@receiver(post_delete)
+def table_changed(sender, update_fields=None, **kwargs):
+    """Cambia la versión de la tabla (ETag de ``ConditionalGetMixin``)"""
+    # La cola y las propias versiones no se sirven con ETag
+    if sender._meta.app_label not in ('app', 'auth') or sender in (Job, TableVersion):
+        return
+    # Iniciar sesión solo actualiza last_login, que la API no muestra
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    touch(sender)
+
+
+# ==================== COURSE PAGE ====================
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_page_course_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(instance.pk, 'course')
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def course_page_lessons_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(instance.course_id, 'lessons')
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def course_page_enrollments_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(instance.course_id, 'enrollments')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def course_page_comments_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(instance.course_id, 'comments')
+
+
+# ==================== LIVE EVENTS ====================
+
+@receiver(post_save, sender=Enrollment)
+def live_enrollment_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        publish(instance.course_id, 'enrollment', instance.pk,
+                enrollment_event(instance, 'created' if created else 'updated'))
+
+
+@receiver(post_delete, sender=Enrollment)
+def live_enrollment_deleted(sender, instance, **kwargs):
+    publish(instance.course_id, 'enrollment', instance.pk, enrollment_event(instance, 'deleted'))
+
+
+@receiver(post_save, sender=LessonProgress)
+def live_lesson_completed(sender, instance, raw=False, **kwargs):
+    if raw or not instance.is_completed or instance._was_completed:
+        return
+    instance._was_completed = True
+    if LessonProgress.lesson.is_cached(instance):
+        course_id = instance.lesson.course_id
+    else:
+        course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+    publish(course_id, 'lesson_completed', instance.pk, {
+        'enrollment': instance.enrollment_id,
+        'lesson': instance.lesson_id,
+        'completed_at': instance.completed_at,
+    })
@@ -0,0 +1,120 @@
+"""Tareas de la cola de trabajos (ver ``app.jobs``)"""
+import io
+import logging
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from . import catalog, importer
+from .course_page import bump
+from .events import percentage, publish
+from .images import AVATAR_VARIANTS, THUMBNAIL_VARIANTS, build_variants, delete_variants, variants_are_stale
+from .jobs import task
+from .models import Course, Enrollment, Lesson, LessonProgress, Profile, progress_period
+from .versions import touch
+
+logger = logging.getLogger(__name__)
+
+# Imágenes con variantes: nombre en la tarea -> (modelo, campo, variantes)
+IMAGE_FIELDS = {
+    'course': (Course, 'thumbnail', THUMBNAIL_VARIANTS),
+    'profile': (Profile, 'avatar', AVATAR_VARIANTS),
+}
+
+
+@task('create_lesson_progress')
+def create_lesson_progress(enrollment_id):
+    """Crea los registros de progreso de todas las lecciones de la inscripción"""
+    enrollment = Enrollment.objects.filter(pk=enrollment_id).only('id', 'course_id', 'enrolled_at').first()
+    if enrollment is None:
+        return
+    period = progress_period(enrollment.enrolled_at)
+    lesson_ids = Lesson.objects.filter(course_id=enrollment.course_id).values_list('id', flat=True)
+    LessonProgress.objects.bulk_create(
+        [LessonProgress(enrollment_id=enrollment.id, lesson_id=lesson_id, period=period)
+         for lesson_id in lesson_ids],
+        ignore_conflicts=True,
+    )
+
+
+@task('recompute_enrollment_progress')
+def recompute_enrollment_progress(enrollment_id):
+    """Recalcula el porcentaje de avance a partir de las lecciones completadas"""
+    # Con el progreso archivado la tabla ya no tiene filas de la inscripción:
+    # recalcular daría 0 %; el porcentaje guardado al archivar es el definitivo
+    enrollment = Enrollment.objects.filter(pk=enrollment_id, progress_archived=False).only(
+        'id', 'course_id', 'user_id'
+    ).first()
+    if enrollment is None:
+        return
+    total_lessons = Lesson.objects.filter(course_id=enrollment.course_id).count()
+    completed_lessons = LessonProgress.objects.filter(
+        enrollment_id=enrollment_id, is_completed=True
+    ).count()
+    if total_lessons > 0:
+        progress = round(completed_lessons / total_lessons * 100, 2)
+        Enrollment.objects.filter(pk=enrollment_id).update(
+            progress_percentage=progress,
+            last_accessed_at=timezone.now(),
+        )
+        bump(enrollment.course_id, 'enrollments')
+        touch(Enrollment)
+        # update() no envía señales
+        publish(enrollment.course_id, 'enrollment', enrollment.pk, {
+            'action': 'updated', 'user': enrollment.user_id, 'progress_percentage': percentage(progress),
+        })
+
+
+def variants_updated(model_class, pks):
+    """
+    Avisa de variantes guardadas con ``update()``, que no envía señales:
+    versiones de la tabla y, para cursos, su página y el catálogo.
+    """
+    touch(model_class)
+    if model_class is Course:
+        for pk in pks:
+            bump(pk, 'course')
+        catalog.schedule_rebuild()
+
+
+@task('build_image_variants')
+def build_image_variants(model, pk):
+    """Genera las variantes de la imagen de un curso o perfil si no están al día"""
+    model_class, field, variants = IMAGE_FIELDS[model]
+    variants_field = f'{field}_variants'
+    obj = model_class.objects.filter(pk=pk).only('pk', field, variants_field).first()
+    if obj is None or not variants_are_stale(getattr(obj, field), getattr(obj, variants_field)):
+        return
+    image = getattr(obj, field)
+    built = build_variants(image, variants, previous=getattr(obj, variants_field))
+    # Solo si la imagen no cambió mientras tanto: el cambio ya encoló otra tarea
+    if image.name:
+        unchanged = Q(**{field: image.name})
+    else:
+        unchanged = Q(**{field: ''}) | Q(**{f'{field}__isnull': True})
+    updated = model_class.objects.filter(unchanged, pk=pk).update(**{
+        variants_field: built, 'updated_at': timezone.now(),
+    })
+    if updated:
+        variants_updated(model_class, [pk])
+    else:
+        delete_variants(image.storage, built)
+
+
+@task('import_catalog')
+def import_catalog(path, file_format):
+    """Importa un paquete subido desde el admin; la importación es idempotente"""
+    with default_storage.open(path, 'rb') as upload:
+        stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        result = importer.import_catalog(stream, file_format)
+    logger.info('Importación de %s: %s', path, result.summary())
+    for error in result.errors:
+        logger.warning('Importación de %s: %s', path, error)
+    default_storage.delete(path)
+
+
+@task('build_catalog_snapshot')
+def build_catalog_snapshot():
+    """Regenera el snapshot del catálogo público (ver ``app.catalog``)"""
+    catalog.build_snapshot()
@@ -1,3 +1,1883 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Profile, Course_Category, DifficultyLevel, CourseStatus, Course, LessonType,
+    Lesson, EnrollmentStatus, Enrollment, LessonProgress, Comment, CourseRatingSummary,
+    CourseCoEnrollment, CourseRecommendation, Job, LessonContent, LessonProgressArchive
+)
+from . import catalog, course_page, events, jobs, metrics, profiling, schema
+from .pagination import EstimatedCountPaginator, approximate_count, estimate_count
+from .importer import CatalogImporter, ImportFormatError, iter_csv, iter_json
+from .progress import archivable_enrollments, archived_progress, ensure_partitions, partitions
+from .recommendations import build_also_took, build_similar_courses
+from .tasks import build_image_variants, recompute_enrollment_progress
+from .versions import touch
+
+
+def setUpModule():
+    # Lo que generan las peticiones y tareas (métricas, snapshots, perfiles,
+    # esquema) va a un directorio temporal, no a build/
+    directory = tempfile.mkdtemp()
+    override = override_settings(**{
+        setting: os.path.join(directory, name) for setting, name in (
+            ('METRICS_DIR', 'metrics'), ('CATALOG_SNAPSHOT_DIR', 'catalog'),
+            ('PROFILER_DIR', 'profiles'), ('OPENAPI_SCHEMA_DIR', 'openapi'),
+        )
+    })
+    override.enable()
+    unittest.addModuleCleanup(shutil.rmtree, directory, ignore_errors=True)
+    unittest.addModuleCleanup(override.disable)
+    # Sin volcado al salir: para entonces la configuración ya no apunta al temporal
+    patcher = mock.patch.object(metrics.registry, 'exit_flush', True)
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+
+class AdminQueryCountTests(TestCase):
+    """
+    Las páginas del admin no deben lanzar consultas por fila: el número de
+    consultas tiene que quedar por debajo de un tope fijo aunque haya muchas
+    filas relacionadas.
+    """
+    ROWS = 12
+    QUERY_CAP = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        category = Course_Category.objects.create(name='Programación', slug='programacion')
+        level = DifficultyLevel.objects.create(level_name='Básico', level_order=1)
+        course_status = CourseStatus.objects.create(status_name='published')
+        lesson_type = LessonType.objects.create(type_name='video')
+        enrollment_status = EnrollmentStatus.objects.create(status_name='active', description='')
+
+        cls.course = None
+        cls.enrollment = None
+        for i in range(cls.ROWS):
+            user = User.objects.create_user(f'student{i}')
+            Profile.objects.create(user=user)
+            course = Course.objects.create(
+                title=f'Curso {i}', description='', instructor=cls.admin_user,
+                category=category, difficulty_level=level, status=course_status,
+                duration_hours=1, requirements='', learning_objectives='',
+            )
+            Comment.objects.create(user=user, course=course, content='Muy bueno', rating=5, is_review=True)
+            cls.course = cls.course or course
+            lesson = Lesson.objects.create(
+                course=cls.course, title=f'Lección {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=5,
+            )
+            enrollment = Enrollment.objects.create(user=user, course=course, status=enrollment_status)
+            cls.enrollment = cls.enrollment or enrollment
+            LessonProgress.objects.create(enrollment=cls.enrollment, lesson=lesson)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def assertRendersUnderCap(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(queries), self.QUERY_CAP,
+            f"{url} lanzó {len(queries)} consultas:\n" + '\n'.join(q['sql'] for q in queries)
+        )
+
+    def test_changelists(self):
+        for model in admin.site._registry:
+            if model._meta.app_label != 'app':
+                continue
+            with self.subTest(model=model.__name__):
+                self.assertRendersUnderCap(
+                    reverse(f'admin:app_{model._meta.model_name}_changelist')
+                )
+
+    def test_inlines(self):
+        self.assertRendersUnderCap(reverse('admin:app_course_change', args=[self.course.pk]))
+        self.assertRendersUnderCap(reverse('admin:app_enrollment_change', args=[self.enrollment.pk]))
+
+    def test_labels_do_not_query(self):
+        progress = LessonProgress.objects.get(enrollment=self.enrollment, lesson__title='Lección 0')
+        with self.assertNumQueries(0):
+            self.assertEqual(str(progress), f'enrollment #{self.enrollment.pk} - lesson #{progress.lesson_id}')
+
+        progress = LessonProgress.objects.select_related('enrollment__user', 'lesson').get(pk=progress.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(progress), 'student0 - Lección 0')
+
+
+class StartupTests(TestCase):
+    def test_cold_start_does_not_load_docs_machinery(self):
+        """Un worker nuevo atiende su primera petición sin importar drf_yasg, numpy ni PIL"""
+        call_command('profile_startup', runs=1, top=0, stdout=StringIO())
+
+
+class CompiledSerializerTests(TestCase):
+    """Los listados compilados devuelven exactamente los mismos bytes que DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('profe', first_name='Ana', last_name='Ruiz')
+        student = User.objects.create_user('alumno')
+        category = Course_Category.objects.create(name='Datos', slug='datos')
+        level = DifficultyLevel.objects.create(level_name='Medio', level_order=2)
+        lesson_type = LessonType.objects.create(type_name='texto')
+        enrollment_status = EnrollmentStatus.objects.create(status_name='active', description='')
+        for i, difficulty in enumerate([level, None, level]):
+            course = Course.objects.create(
+                title=f'Curso {i}', description='', instructor=instructor if i else student,
+                category=category, difficulty_level=difficulty, duration_hours=2, price='19.90',
+                requirements='', learning_objectives='',
+                thumbnail='course_thumbnails/a.png' if i == 2 else None,
+                thumbnail_variants={
+                    'source': 'course_thumbnails/a.png',
+                    'card': {'name': 'course_thumbnails/a-card.webp', 'width': 1, 'height': 1},
+                },
+            )
+            Lesson.objects.create(
+                course=course, title=f'Lección {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=5,
+            )
+            Enrollment.objects.create(user=student, course=course, status=enrollment_status)
+            if i:
+                # El curso 0 queda sin reseñas (sin resumen de calificación)
+                Comment.objects.create(user=student, course=course, content='Bien', rating=i + 2, is_review=True)
+        Comment.objects.create(user=student, course=course, content='Pregunta', rating=None)
+
+    def test_lists_match_drf(self):
+        for url in ['/api/lms/courses/', '/api/lms/courses/?ordering=-price', '/api/lms/lessons/',
+                    '/api/lms/enrollments/', '/api/lms/comments/']:
+            with self.subTest(url=url):
+                with self.settings(COMPILED_SERIALIZERS=False):
+                    expected = self.client.get(url)
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/lms/courses/')
+        # Las versiones del ETag, el conteo de la paginación y la página
+        self.assertEqual(len(queries), 3)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('editor')
+        category = Course_Category.objects.create(name='Cine', slug='cine')
+        cls.course = Course.objects.create(
+            title='Montaje', description='', instructor=cls.user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        cls.lesson = Lesson.objects.create(
+            course=cls.course, title='Corte', description='',
+            lesson_type=LessonType.objects.create(type_name='video'), content='...', duration_minutes=5,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_matching_etag_returns_304_reading_only_versions(self):
+        for url in ['/api/lms/courses/', f'/api/lms/courses/{self.course.slug}/', '/api/lms/lessons/']:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query_string(self):
+        self.assertNotEqual(
+            self.client.get('/api/lms/courses/')['ETag'],
+            self.client.get('/api/lms/courses/?ordering=title')['ETag'],
+        )
+
+    def test_etag_depends_on_user(self):
+        anonymous = self.client.get('/api/lms/enrollments/')['ETag']
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get('/api/lms/enrollments/')['ETag'], anonymous)
+
+    def test_versions_written_by_other_processes_change_etag(self):
+        etag, response = self._revalidate('/api/lms/lessons/')
+        self.assertEqual(response.status_code, 304)
+        # Lo que escribe el worker (otro proceso, otra caché) llega por la base de datos
+        cache.clear()
+        self.assertEqual(self.client.get('/api/lms/lessons/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            touch(Lesson)
+        self.assertEqual(self.client.get('/api/lms/lessons/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_writes_change_etag(self):
+        url = f'/api/lms/courses/{self.course.slug}/'
+        etag = self.client.get(url)['ETag']
+        # Una lección nueva cambia el detalle del curso (total_lessons, lessons)
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Lesson.objects.create(
+                course=self.course, title='Sonido', description='',
+                lesson_type=self.lesson.lesson_type, content='...', duration_minutes=5,
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Las escrituras sin señales (bulk_update) también
+        etag, response = self._revalidate('/api/lms/lessons/')
+        self.assertEqual(response.status_code, 304)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'{url}lessons/reorder/', {'lesson': self.lesson.pk, 'after': second.pk}, content_type='application/json'
+            )
+        self.assertEqual(self.client.get('/api/lms/lessons/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class EnrollmentCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('alumna')
+        category = Course_Category.objects.create(name='Arte', slug='arte')
+        cls.course = Course.objects.create(
+            title='Dibujo', description='', instructor=cls.student, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        cls.active = EnrollmentStatus.objects.create(status_name='Active', description='')
+
+    def test_duplicate_enrollment_is_rejected_by_the_constraint(self):
+        payload = {'user': self.student.pk, 'course': self.course.pk}
+        response = self.client.post('/api/lms/enrollments/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        enrollment = Enrollment.objects.get(user=self.student, course=self.course)
+        self.assertEqual(enrollment.status, self.active)
+
+        response = self.client.post('/api/lms/enrollments/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'non_field_errors': ['El usuario ya está inscrito en este curso.']})
+
+        again, created = Enrollment.objects.enroll(self.student, self.course)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, enrollment.pk)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+
+class CounterTests(TestCase):
+    def test_counters_follow_changes(self):
+        teacher = User.objects.create_user('docente')
+        Profile.objects.create(user=teacher)
+        first = Course_Category.objects.create(name='Uno', slug='uno')
+        second = Course_Category.objects.create(name='Dos', slug='dos')
+        course = Course.objects.create(
+            title='Curso', description='', instructor=teacher, category=first,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        student = User.objects.create_user('estudiante')
+        Enrollment.objects.enroll(student, course)
+        # El perfil se crea después de la inscripción
+        Profile.objects.create(user=student)
+
+        course.category = second
+        course.save()
+        stale = Course_Category.objects.get(pk=first.pk)
+        Course.objects.create(
+            title='Otro', description='', instructor=teacher, category=first,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        stale.save()  # no debe pisar el contador con el valor leído antes
+
+        counts = lambda: (
+            list(Course_Category.objects.order_by('pk').values_list('course_count', flat=True)),
+            list(Profile.objects.order_by('pk').values_list('courses_taught_count', 'enrollment_count')),
+        )
+        self.assertEqual(counts(), ([1, 1], [(2, 0), (0, 1)]))
+
+        course.delete()
+        self.assertEqual(counts(), ([1, 0], [(1, 0), (0, 0)]))
+
+        Course_Category.objects.update(course_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Course_Category.course_count: 2 filas desviadas', out.getvalue())
+        self.assertEqual(counts()[0], [1, 0])
+
+
+class MultiGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('profesor')
+        category = Course_Category.objects.create(name='Ciencia', slug='ciencia')
+        cls.courses = [
+            Course.objects.create(
+                title=f'Curso {i}', description='', instructor=teacher, category=category,
+                duration_hours=1, requirements='', learning_objectives='',
+            )
+            for i in range(3)
+        ]
+
+    def test_keeps_requested_order_and_reports_missing(self):
+        first, second, third = self.courses
+        with self.assertNumQueries(2):  # cursos y lecciones prefetched
+            response = self.client.get(f'/api/lms/courses/?ids={third.pk},999,{first.pk},{third.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['id'] for c in response.json()['results']], [third.pk, first.pk])
+        self.assertEqual(response.json()['missing'], [999])
+
+        response = self.client.get(f'/api/lms/courses/?slugs={second.slug},no-existe')
+        self.assertEqual([c['slug'] for c in response.json()['results']], [second.slug])
+        self.assertEqual(response.json()['missing'], ['no-existe'])
+
+    def test_rejects_invalid_or_too_many_ids(self):
+        self.assertEqual(self.client.get('/api/lms/courses/?ids=uno').status_code, 400)
+        with self.settings(MULTI_GET_MAX_IDS=2):
+            self.assertEqual(self.client.get('/api/lms/courses/?ids=1,2,3').status_code, 400)
+
+
+class CoursePageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('lectora')
+        category = Course_Category.objects.create(name='Historia', slug='historia')
+        lesson_type = LessonType.objects.create(type_name='video')
+        EnrollmentStatus.objects.create(status_name='active', description='')
+        cls.course = Course.objects.create(
+            title='Roma', description='', instructor=cls.student, category=category,
+            duration_hours=3, requirements='', learning_objectives='',
+        )
+        for i in range(2):
+            Lesson.objects.create(
+                course=cls.course, title=f'Lección {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=5,
+            )
+        Enrollment.objects.enroll(cls.student, cls.course)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def test_page_matches_separate_endpoints(self):
+        base = f'/api/lms/courses/{self.course.slug}/'
+        page = self.client.get(base + 'page/').json()
+        self.assertEqual(page['course'], self.client.get(base).json())
+        self.assertEqual(page['lessons'], self.client.get(base + 'lessons/').json())
+        self.assertEqual(page['stats'], self.client.get(base + 'stats/').json())
+        self.assertEqual(page['comments'], {'count': 0, 'results': []})
+        self.assertEqual(page['enrollment']['status_name'], 'active')
+
+    def test_sections_are_cached_until_their_data_changes(self):
+        url = f'/api/lms/courses/{self.course.slug}/page/'
+        self.client.get(url)
+        # Sesión, usuario, el id del curso y sus versiones: las secciones salen de la caché
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.student, course=self.course, content='Genial', rating=5, is_review=True)
+        # Se recalculan curso (3), estadísticas (3) y comentarios (2); lecciones e inscripción siguen en caché
+        with self.assertNumQueries(4 + 8):
+            page = self.client.get(url).json()
+        self.assertEqual(page['comments']['count'], 1)
+        self.assertEqual(page['stats']['total_reviews'], 1)
+
+    def test_worker_changes_invalidate_sections(self):
+        url = f'/api/lms/courses/{self.course.slug}/page/'
+        self.client.get(url)
+        # El worker escribe sin señales y en otro proceso: la caché local no se entera
+        Enrollment.objects.filter(course=self.course).update(progress_percentage=50)
+        with self.captureOnCommitCallbacks(execute=True):
+            course_page.bump(self.course.pk, 'enrollments')
+        self.assertEqual(float(self.client.get(url).json()['enrollment']['progress_percentage']), 50)
+
+
+@override_settings(COURSE_PAGE_WORKERS=3)
+class CoursePageConcurrencyTests(TransactionTestCase):
+    """Sin la transacción de TestCase las secciones se calculan en el pool de hilos"""
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('lector')
+        category = Course_Category.objects.create(name='Ciencia', slug='ciencia')
+        lesson_type = LessonType.objects.create(type_name='video')
+        EnrollmentStatus.objects.create(status_name='active', description='')
+        self.course = Course.objects.create(
+            title='Óptica', description='', instructor=self.student, category=category,
+            duration_hours=2, requirements='', learning_objectives='',
+        )
+        Lesson.objects.create(
+            course=self.course, title='Luz', description='',
+            lesson_type=lesson_type, content='...', duration_minutes=5,
+        )
+        Enrollment.objects.enroll(self.student, self.course)
+        self.client.force_login(self.student)
+
+        # Anota en qué hilo y con qué conexión corre cada sección, y cuándo se cierran
+        self.events = []
+        sections = {
+            name: (self._recording(name, loader), depends_on, private)
+            for name, (loader, depends_on, private) in course_page.SECTIONS.items()
+        }
+        close = course_page.close_old_connections
+        for patcher in (
+            mock.patch.dict(course_page.SECTIONS, sections),
+            mock.patch('app.course_page.close_old_connections', side_effect=lambda: (
+                self.events.append(('close', threading.current_thread().name, None)), close()
+            )),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _recording(self, name, loader):
+        def load(request, course_id):
+            self.events.append((name, threading.current_thread().name, connections['default']))
+            return loader(request, course_id)
+        return load
+
+    def _thread_events(self, thread):
+        return [event[0] for event in self.events if event[1] == thread]
+
+    def test_missing_sections_load_in_workers_and_close_their_connections(self):
+        base = f'/api/lms/courses/{self.course.slug}/'
+        page = self.client.get(base + 'page/').json()
+        self.assertEqual(page['course'], self.client.get(base).json())
+        self.assertEqual(page['lessons'], self.client.get(base + 'lessons/').json())
+        self.assertEqual(page['enrollment']['status_name'], 'active')
+
+        loaded = [event for event in self.events if event[0] in course_page.SECTIONS]
+        self.assertEqual(sorted(name for name, _, _ in loaded), sorted(course_page.SECTIONS))
+        for name, thread, wrapper in loaded:
+            self.assertTrue(thread.startswith('course-page'))
+            self.assertIsNot(wrapper, connection)
+            # SQLite en memoria ignora close(): cerrarla borraría la base de datos
+            if connection.vendor != 'sqlite':
+                self.assertIsNone(wrapper.connection)
+        # Cada sección se envuelve en un cierre antes y otro después, en su hilo
+        for thread in {thread for _, thread, _ in loaded}:
+            events = self._thread_events(thread)
+            self.assertEqual(events[::3], ['close'] * (len(events) // 3))
+            self.assertEqual(events[2::3], ['close'] * (len(events) // 3))
+
+        self.events.clear()
+        self.client.get(base + 'page/')
+        self.assertEqual(self.events, [])
+
+    def test_worker_errors_propagate_after_closing(self):
+        def broken(request, course_id):
+            raise RuntimeError('sección rota')
+        course_page.SECTIONS['stats'] = (self._recording('stats', broken), ('course',), False)
+        with self.assertRaisesMessage(RuntimeError, 'sección rota'):
+            self.client.get(f'/api/lms/courses/{self.course.slug}/page/')
+        [thread] = [thread for name, thread, _ in self.events if name == 'stats']
+        events = self._thread_events(thread)
+        self.assertEqual(events[events.index('stats') + 1], 'close')
+
+
+@override_settings(EVENTS_COALESCE_WINDOW=0.05)
+class CourseEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('profesora')
+        cls.student = User.objects.create_user('alumno')
+        category = Course_Category.objects.create(name='Arte', slug='arte')
+        EnrollmentStatus.objects.create(status_name='active', description='')
+        cls.course = Course.objects.create(
+            title='Pintura', description='', instructor=cls.instructor, category=category,
+            duration_hours=2, requirements='', learning_objectives='',
+        )
+        cls.lesson = Lesson.objects.create(
+            course=cls.course, title='Color', description='',
+            lesson_type=LessonType.objects.create(type_name='video'), content='...', duration_minutes=5,
+        )
+        cls.url = f'/api/lms/courses/{cls.course.slug}/events/'
+
+    def _enroll_and_complete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment, _ = Enrollment.objects.enroll(self.student, self.course)
+            enrollment.progress_percentage = 100
+            enrollment.save()
+            progress = LessonProgress.objects.create(enrollment=enrollment, lesson=self.lesson, is_completed=True)
+        return enrollment, progress
+
+    async def test_stream_sends_coalesced_course_events(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+
+        enrollment, progress = await sync_to_async(self._enroll_and_complete)()
+        event, data = (await anext(stream)).decode().strip().split('\n')
+        await stream.aclose()
+
+        self.assertEqual(event, 'event: progress')
+        events = json.loads(data.removeprefix('data: '))['events']
+        # El alta y el cambio de progreso llegan como un solo evento
+        self.assertEqual([(e['type'], e['id']) for e in events],
+                         [('enrollment', enrollment.pk), ('lesson_completed', progress.pk)])
+        self.assertEqual(events[0]['data']['action'], 'created')
+        self.assertEqual(events[0]['data']['progress_percentage'], '100.00')
+        self.assertEqual(events[1]['data']['lesson'], self.lesson.pk)
+
+    async def test_unknown_course(self):
+        response = await self.async_client.get('/api/lms/courses/no-existe/events/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_asgi(self):
+        self.assertEqual(self.client.get(self.url).status_code, 501)
+
+    def test_completion_is_published_once(self):
+        enrollment, _ = Enrollment.objects.enroll(self.student, self.course)
+        with mock.patch('app.signals.publish') as publish:
+            progress = LessonProgress.objects.create(enrollment=enrollment, lesson=self.lesson)
+            publish.assert_not_called()
+
+            progress = LessonProgress.objects.get(pk=progress.pk)
+            progress.is_completed = True
+            progress.save()
+            progress.save()
+            LessonProgress.objects.get(pk=progress.pk).save()
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args.args[:3], (self.course.pk, 'lesson_completed', progress.pk))
+
+    def test_default_backend_follows_database(self):
+        self.assertEqual(events.default_backend(), 'app.events.LocalBackend')
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual(events.default_backend(), 'app.events.PostgresBackend')
+
+    def test_listener_logs_and_closes_failed_connections(self):
+        class Stop(Exception):
+            pass
+
+        raw = mock.MagicMock()
+        raw.cursor.return_value.__enter__.return_value.execute.side_effect = RuntimeError('caída')
+        backend = events.PostgresBackend()
+        backend.start(dispatch=None)
+        with mock.patch.object(connection, 'get_new_connection', return_value=raw), \
+                mock.patch('app.events.time.sleep', side_effect=Stop), \
+                self.assertLogs('app.events', 'ERROR'):
+            with self.assertRaises(Stop):
+                backend._listen_forever()
+        raw.close.assert_called_once()
+
+
+class RatingSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('critica')
+        category = Course_Category.objects.create(name='Música', slug='musica')
+        cls.course = Course.objects.create(
+            title='Armonía', description='', instructor=cls.user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+
+    def _review(self, rating, **kwargs):
+        return Comment.objects.create(
+            user=self.user, course=self.course, content='...', rating=rating, **{'is_review': True, **kwargs}
+        )
+
+    def assertSummary(self, histogram, average):
+        summary = CourseRatingSummary.objects.get(course=self.course)
+        self.assertEqual(summary.histogram, {**dict.fromkeys('12345', 0), **histogram})
+        self.assertEqual(summary.total_reviews, sum(histogram.values()))
+        self.assertEqual(summary.average_rating, average)
+
+    def test_signals_keep_histogram_in_sync(self):
+        first, second = self._review(5), self._review(3)
+        self._review(4, is_review=False)
+        self._review(None)
+        self.assertSummary({'5': 1, '3': 1}, 4.0)
+
+        second.rating = 1
+        second.save()
+        self.assertSummary({'5': 1, '1': 1}, 3.0)
+
+        first.is_review = False
+        first.save()
+        self.assertSummary({'1': 1}, 1.0)
+
+        second.delete()
+        self.assertSummary({}, None)
+
+    def test_rebuild_command_fixes_drift(self):
+        self._review(5)
+        self._review(2)
+        CourseRatingSummary.objects.filter(course=self.course).update(rating_5=9, total_reviews=9, rating_sum=45)
+        out = StringIO()
+        call_command('rebuild_rating_summaries', stdout=out)
+        self.assertIn('1 resúmenes corregidos', out.getvalue())
+        self.assertSummary({'5': 1, '2': 1}, 3.5)
+
+        CourseRatingSummary.objects.all().delete()
+        call_command('rebuild_rating_summaries', course=[self.course.slug], stdout=StringIO())
+        self.assertSummary({'5': 1, '2': 1}, 3.5)
+
+
+class EstimatedPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('lector')
+        category = Course_Category.objects.create(name='Poesía', slug='poesia')
+        course = Course.objects.create(
+            title='Sonetos', description='', instructor=user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        Comment.objects.bulk_create(
+            Comment(user=user, course=course, content=f'Comentario {i}') for i in range(25)
+        )
+
+    def _paginator(self, per_page=10):
+        return EstimatedCountPaginator(Comment.objects.order_by('pk'), per_page)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_large_estimate_is_used(self):
+        with mock.patch('app.pagination.estimate_count', return_value=5000):
+            paginator = self._paginator()
+            self.assertEqual(paginator.count, 5000)
+            self.assertTrue(paginator.count_is_approximate)
+            # La página siguiente se detecta con una fila de más, no con el total
+            self.assertTrue(paginator.page(2).has_next())
+            self.assertFalse(paginator.page(3).has_next())
+            self.assertEqual(len(paginator.page(3)), 5)
+            # Por encima de la última página real: vacía en lugar de 404
+            self.assertEqual(len(paginator.page(400)), 0)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_small_or_missing_estimate_counts_exactly(self):
+        for estimate in (50, None):
+            with self.subTest(estimate=estimate), mock.patch('app.pagination.estimate_count', return_value=estimate):
+                paginator = self._paginator()
+                self.assertEqual(paginator.count, 25)
+                self.assertFalse(paginator.count_is_approximate)
+
+    def test_api_reports_whether_count_is_approximate(self):
+        with self.settings(ESTIMATED_COUNT_THRESHOLD=10), \
+                mock.patch('app.pagination.estimate_count', return_value=900):
+            data = self.client.get('/api/lms/comments/').json()
+        self.assertEqual((data['count'], data['count_is_approximate']), (900, True))
+        self.assertIsNotNone(data['next'])
+        data = self.client.get('/api/lms/comments/').json()
+        self.assertEqual((data['count'], data['count_is_approximate']), (25, False))
+
+    def _estimate(self, queryset, row):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchone.return_value = row
+        fake = mock.Mock(vendor='postgresql')
+        fake.cursor.return_value = cursor
+        with mock.patch('app.pagination.connections', {queryset.db: fake}):
+            return estimate_count(queryset), cursor.execute.call_args.args
+
+    def test_unfiltered_estimate_sums_partitions(self):
+        estimate, (sql, params) = self._estimate(LessonProgress.objects.all(), (1200,))
+        self.assertEqual(estimate, 1200)
+        self.assertIn('pg_partition_tree', sql)
+        self.assertEqual(params, ['app_lessonprogress'])
+        # Sin ninguna partición analizada no hay estimación
+        self.assertIsNone(self._estimate(LessonProgress.objects.all(), (None,))[0])
+
+    def test_filtered_estimate_uses_explain(self):
+        plan = json.dumps([{'Plan': {'Plan Rows': 340}}])
+        estimate, (sql, _) = self._estimate(Comment.objects.filter(content__startswith='C'), (plan,))
+        self.assertEqual(estimate, 340)
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) '))
+
+    def test_fallback_counts_exactly(self):
+        # SQLite no ofrece estimaciones: conteo exacto
+        self.assertIsNone(estimate_count(Comment.objects.all()))
+        self.assertEqual(approximate_count(Comment.objects.all()), (25, False))
+        self.assertEqual(approximate_count([1, 2, 3]), (3, False))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Solo PostgreSQL')
+    def test_postgres_estimate_after_analyze(self):
+        course = Course.objects.get()
+        lesson_type = LessonType.objects.create(type_name='texto')
+        lessons = [
+            Lesson.objects.create(
+                course=course, title=f'Verso {i}', description='', lesson_type=lesson_type,
+                content='...', duration_minutes=1,
+            )
+            for i in range(4)
+        ]
+        enrollment = Enrollment.objects.create(user=User.objects.get(), course=course)
+        for lesson in lessons:
+            LessonProgress.objects.get_or_create(enrollment=enrollment, lesson=lesson)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE app_comment, app_lessonprogress')
+        self.assertEqual(estimate_count(Comment.objects.all()), 25)
+        self.assertEqual(estimate_count(LessonProgress.objects.all()), 4)
+
+
+class PaginatedInlineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('jefa', 'jefa@example.com', 'jefa')
+        category = Course_Category.objects.create(name='Física', slug='fisica')
+        course = Course.objects.create(
+            title='Óptica', description='', instructor=cls.admin_user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        lesson_type = LessonType.objects.create(type_name='texto')
+        status = EnrollmentStatus.objects.create(status_name='active', description='')
+        cls.enrollment = Enrollment.objects.create(user=cls.admin_user, course=course, status=status)
+        for i in range(30):
+            lesson = Lesson.objects.create(
+                course=course, title=f'Tema {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=1,
+            )
+            LessonProgress.objects.create(enrollment=cls.enrollment, lesson=lesson)
+
+    def test_inline_pages_keep_other_parameters(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('admin:app_enrollment_change', args=[self.enrollment.pk])
+        response = self.client.get(url, {'_changelist_filters': 'status__id__exact=1'})
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 25)
+        self.assertContains(response, 'href="?_changelist_filters=status__id__exact%3D1&amp;progress_page=2"')
+
+        response = self.client.get(url, {'_changelist_filters': 'status__id__exact=1', 'progress_page': 2})
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 5)
+        self.assertContains(response, 'progress_page=1"')
+
+
+class SchemaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = self.settings(OPENAPI_SCHEMA_DIR=self.directory, CODE_VERSION='v1')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for cleanup in (schema.code_version.cache_clear, schema._artifacts.clear):
+            cleanup()
+            self.addCleanup(cleanup)
+
+    def test_schema_is_built_once_and_stale_versions_removed(self):
+        stale = os.path.join(self.directory, 'openapi-v0.json.gz')
+        open(stale, 'wb').close()
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/courses/{slug}/page/', json.loads(response.content)['paths'])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['openapi-v1.json.gz', 'openapi-v1.yaml.gz'])
+
+        with mock.patch('app.schema.build_artifacts') as build:
+            self.client.get('/swagger.yaml')
+            self.client.get('/swagger.json')
+        build.assert_not_called()
+
+    def test_encoding_negotiation_and_304(self):
+        plain = self.client.get('/swagger.json')
+        compressed = self.client.get('/swagger.json', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+
+        response = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], plain['ETag'])
+        response = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=plain['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+
+
+class AlsoTookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Course_Category.objects.create(name='Idiomas', slug='idiomas')
+        cls.users = [User.objects.create_user(f'estudiante{i}') for i in range(6)]
+        cls.courses = [
+            Course.objects.create(
+                title=f'Idioma {i}', description='', instructor=cls.users[0], category=category,
+                duration_hours=1, requirements='', learning_objectives='', published_at='2026-01-01T00:00Z',
+            )
+            for i in range(5)
+        ]
+
+    def _enroll(self, pairs):
+        for user, course in pairs:
+            Enrollment.objects.create(user=self.users[user], course=self.courses[course])
+
+    def _index(self):
+        return sorted(
+            (r.course_id, r.neighbor_id, r.rank, round(r.score, 6))
+            for r in CourseRecommendation.objects.filter(kind=CourseRecommendation.ALSO_TOOK)
+        )
+
+    def test_incremental_build_matches_full_rebuild(self):
+        self._enroll([(0, 0), (0, 1), (1, 0), (1, 1), (1, 2), (2, 2), (2, 3)])
+        self.assertEqual(build_also_took(top_k=2), (7, 4))
+        # Inscripciones nuevas de usuarios con y sin inscripciones previas
+        self._enroll([(2, 0), (3, 3), (3, 4), (0, 4), (4, 1)])
+        new, _ = build_also_took(top_k=2)
+        self.assertEqual(new, 5)
+        incremental = self._index()
+        self.assertEqual(build_also_took(top_k=2), (0, 0))
+
+        build_also_took(full=True, top_k=2)
+        self.assertEqual(self._index(), incremental)
+        self.assertTrue(incremental)
+
+    def test_late_commit_below_watermark_is_counted(self):
+        self._enroll([(0, 0), (0, 1), (1, 0)])
+        high = Enrollment.objects.order_by('-id').first().id
+        # El id high + 1 se confirma después que high + 2
+        Enrollment.objects.create(id=high + 2, user=self.users[1], course=self.courses[1])
+        self.assertEqual(build_also_took(top_k=2)[0], 4)
+        Enrollment.objects.create(id=high + 1, user=self.users[2], course=self.courses[0])
+        self.assertEqual(build_also_took(top_k=2)[0], 1)
+        self.assertEqual(build_also_took(top_k=2), (0, 0))
+        incremental = self._index()
+        counts = set(CourseCoEnrollment.objects.values_list('course_id', 'other_id', 'count'))
+
+        build_also_took(full=True, top_k=2)
+        self.assertEqual(self._index(), incremental)
+        self.assertEqual(set(CourseCoEnrollment.objects.values_list('course_id', 'other_id', 'count')), counts)
+        self.assertIn((self.courses[0].id, self.courses[0].id, 3), counts)
+
+    def test_endpoint(self):
+        self._enroll([(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 2)])
+        build_also_took()
+        slugs = [item['slug'] for item in self.client.get(f'/api/lms/courses/{self.courses[0].slug}/also_took/').json()]
+        self.assertEqual(slugs, [self.courses[1].slug, self.courses[2].slug])
+        self.assertEqual(self.client.get('/api/lms/courses/no-existe/also_took/').status_code, 404)
+
+
+class SimilarCoursesTests(TestCase):
+    TEXTS = [
+        'guitarra acordes ritmo', 'guitarra acordes escalas', 'guitarra escalas solos',
+        'piano acordes ritmo', 'piano escalas solos', 'piano acordes escalas',
+        'guitarra piano ritmo', 'bateria ritmo solos',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('docente')
+        cls.categories = [
+            Course_Category.objects.create(name='Cuerda', slug='cuerda'),
+            Course_Category.objects.create(name='Teclado', slug='teclado'),
+        ]
+        cls.courses = [
+            Course.objects.create(
+                title=text, description='', instructor=user, category=cls.categories[i % 2],
+                duration_hours=1, requirements='', learning_objectives='',
+                # El último curso no está publicado: nunca debe aparecer como vecino
+                published_at=None if i == len(cls.TEXTS) - 1 else '2026-01-01T00:00Z',
+            )
+            for i, text in enumerate(cls.TEXTS)
+        ]
+
+    def _index(self):
+        return sorted(
+            (r.course_id, r.neighbor_id, r.rank, r.category_rank, round(r.score, 5))
+            for r in CourseRecommendation.objects.filter(kind=CourseRecommendation.SIMILAR)
+        )
+
+    def test_blocks_and_incremental_builds_match_full_rebuild(self):
+        build_similar_courses(full=True, top_k=2)
+        full = self._index()
+        self.assertNotIn(self.courses[-1].pk, [row[1] for row in full])
+        build_similar_courses(full=True, top_k=2, block_size=3)
+        self.assertEqual(self._index(), full)
+
+        course = self.courses[0]
+        course.title = 'piano ritmo solos'
+        course.save()
+        self.courses[-1].published_at = '2026-02-01T00:00Z'
+        self.courses[-1].save()
+        changed, _ = build_similar_courses(top_k=2, block_size=3)
+        self.assertEqual(changed, 2)
+        incremental = self._index()
+        build_similar_courses(full=True, top_k=2)
+        self.assertEqual(self._index(), incremental)
+
+    def test_category_filter_lists_are_complete(self):
+        build_similar_courses(full=True, top_k=2)
+        url = f'/api/lms/courses/{self.courses[1].slug}/similar/'
+        overall = self.client.get(url).json()
+        self.assertEqual([item['rank'] for item in overall], [0, 1])
+        for category in self.categories:
+            with self.subTest(category=category.slug):
+                items = self.client.get(url, {'category': category.slug}).json()
+                self.assertEqual([item['rank'] for item in items], [0, 1])
+                slugs = {course.slug for course in self.courses if course.category_id == category.pk}
+                self.assertTrue({item['slug'] for item in items} <= slugs)
+
+
+class LessonOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('autora')
+        category = Course_Category.objects.create(name='Cocina', slug='cocina')
+        cls.course = Course.objects.create(
+            title='Panadería', description='', instructor=cls.user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        lesson_type = LessonType.objects.create(type_name='video')
+        cls.lessons = [
+            Lesson.objects.create(
+                course=cls.course, title=f'Paso {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=5,
+            )
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = f'/api/lms/courses/{self.course.slug}/lessons/'
+
+    def _order(self):
+        return list(Lesson.objects.filter(course=self.course).order_by('order_index').values_list('pk', flat=True))
+
+    def _positions(self):
+        return dict(Lesson.objects.filter(course=self.course).values_list('pk', 'order_index'))
+
+    def _post(self, data):
+        return self.client.post(self.url + 'reorder/', data, content_type='application/json')
+
+    def test_new_lessons_leave_a_gap(self):
+        gap = Lesson.ORDER_GAP
+        self.assertEqual(sorted(self._positions().values()), [gap, 2 * gap, 3 * gap, 4 * gap])
+
+    def test_move_only_rewrites_the_moved_lesson(self):
+        first, second, third, fourth = [lesson.pk for lesson in self.lessons]
+        before = self._positions()
+        response = self._post({'lesson': fourth, 'after': first})
+        self.assertEqual([item['id'] for item in response.json()], [first, fourth, second, third])
+        self.assertEqual(self._order(), [first, fourth, second, third])
+        after = self._positions()
+        self.assertEqual({pk for pk in after if after[pk] != before[pk]}, {fourth})
+
+        self._post({'lesson': third, 'after': None})
+        self.assertEqual(self._order(), [third, first, fourth, second])
+
+    def test_exhausted_gap_renumbers_the_course(self):
+        first, second, third, fourth = [lesson.pk for lesson in self.lessons]
+        for index, pk in enumerate([first, second, third, fourth], start=1):
+            Lesson.objects.filter(pk=pk).update(order_index=index)
+        self._post({'lesson': fourth, 'after': first})
+        self.assertEqual(self._order(), [first, fourth, second, third])
+        gap = Lesson.ORDER_GAP
+        self.assertEqual(sorted(self._positions().values()), [gap, 2 * gap, 3 * gap, 4 * gap])
+
+    def test_full_order_and_validation(self):
+        ids = [lesson.pk for lesson in self.lessons][::-1]
+        self.assertEqual(self._post({'lessons': ids}).status_code, 200)
+        self.assertEqual(self._order(), ids)
+        self.assertEqual(self._post({'lessons': ids[:-1]}).status_code, 400)
+        self.assertEqual(self._post({'lessons': ids, 'lesson': ids[0], 'after': None}).status_code, 400)
+        self.assertEqual(self._post({'lesson': ids[0], 'after': ids[0]}).status_code, 400)
+
+    def test_bulk_update(self):
+        first, second = self.lessons[:2]
+        response = self.client.patch(self.url + 'bulk_update/', {'lessons': [
+            {'id': first.pk, 'is_published': True},
+            {'id': second.pk, 'is_free': True},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Lesson.objects.filter(pk__in=[first.pk, second.pk]).order_by('order_index')
+                 .values_list('is_published', 'is_free')),
+            [(True, False), (False, True)],
+        )
+        response = self.client.patch(self.url + 'bulk_update/', {'lessons': [{'id': 0, 'is_free': True}]},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@jobs.task('test_record')
+def _record_task(value, fail=False):
+    _record_task.calls.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+_record_task.calls = []
+
+
+@override_settings(JOB_QUEUE_EAGER=False, JOB_QUEUE_MAX_ATTEMPTS=3, JOB_QUEUE_BACKOFF_SECONDS=10)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        _record_task.calls = []
+
+    def test_dedupe_key_discards_pending_duplicates(self):
+        jobs.enqueue('test_record', {'value': 1}, dedupe_key='clave')
+        jobs.enqueue('test_record', {'value': 2}, dedupe_key='clave')
+        self.assertEqual(list(Job.objects.values_list('payload', flat=True)), [{'value': 1}])
+
+        job = jobs.claim('w1')
+        self.assertTrue(jobs.execute(job))
+        jobs.enqueue('test_record', {'value': 3}, dedupe_key='clave')
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).get().payload, {'value': 3})
+
+    def test_unknown_task(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue('no-existe')
+
+    def test_claim_takes_ready_jobs_once(self):
+        jobs.enqueue('test_record', {'value': 'luego'}, delay=60)
+        jobs.enqueue('test_record', {'value': 'ya'})
+        job = jobs.claim('w1')
+        self.assertEqual(job.payload, {'value': 'ya'})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, 'w1', 1))
+        self.assertIsNone(jobs.claim('w2'))
+
+    def test_claim_recovers_stale_jobs(self):
+        jobs.enqueue('test_record', {'value': 1})
+        job = jobs.claim('w1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        recovered = jobs.claim('w2')
+        self.assertEqual((recovered.pk, recovered.locked_by, recovered.attempts), (job.pk, 'w2', 2))
+
+    def test_retry_with_backoff_until_failed(self):
+        jobs.enqueue('test_record', {'value': 'x', 'fail': True})
+        for attempt in (1, 2):
+            before = timezone.now()
+            job = jobs.claim('w1')
+            self.assertFalse(jobs.execute(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, attempt))
+            self.assertIn('ValueError', job.last_error)
+            delay = (job.run_at - before).total_seconds()
+            base = 10 * 2 ** (attempt - 1)
+            self.assertTrue(0.8 * base <= delay <= 1.2 * base + 1, delay)
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        job = jobs.claim('w1')
+        self.assertFalse(jobs.execute(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.FAILED, 3, ''))
+        self.assertEqual(_record_task.calls, ['x', 'x', 'x'])
+
+    def test_work_drains_queue_and_purge(self):
+        for value in range(3):
+            jobs.enqueue('test_record', {'value': value})
+        with mock.patch('app.jobs.connections.close_all'):
+            self.assertEqual(jobs.work('w1', once=True), 3)
+        self.assertEqual(sorted(_record_task.calls), [0, 1, 2])
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+        self.assertEqual(jobs.purge_finished(days=1), 0)
+        Job.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(jobs.purge_finished(days=1), 3)
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue('test_record', {'value': 'ahora'})
+            self.assertEqual(_record_task.calls, [])
+        self.assertEqual(_record_task.calls, ['ahora'])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOB_QUEUE_EAGER=False, JOB_QUEUE_LOCK_TIMEOUT=0.3)
+class JobHeartbeatTests(TransactionTestCase):
+    def test_long_running_job_is_not_reclaimed(self):
+        reclaimed = []
+
+        @jobs.task('test_slow')
+        def slow():
+            threading.Event().wait(0.6)
+            reclaimed.append(jobs.claim('otro'))
+        self.addCleanup(jobs._registry.pop, 'test_slow')
+
+        jobs.enqueue('test_slow')
+        job = jobs.claim('uno')
+        self.assertTrue(jobs.execute(job))
+        self.assertEqual(reclaimed, [None])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class JobClaimLockingTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_skips_locked_rows(self):
+        jobs.enqueue('test_record', {'value': 1})
+        jobs.enqueue('test_record', {'value': 2})
+        first = Job.objects.order_by('run_at').first()
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                Job.objects.select_for_update().get(pk=first.pk)
+                locked.set()
+                release.wait(10)
+            connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            locked.wait(10)
+            job = jobs.claim('w1')
+            self.assertNotEqual(job.pk, first.pk)
+        finally:
+            release.set()
+            holder.join()
+
+
+class ProgressArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alumna')
+        category = Course_Category.objects.create(name='Historia', slug='historia')
+        cls.course = Course.objects.create(
+            title='Roma', description='', instructor=cls.user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        lesson_type = LessonType.objects.create(type_name='video')
+        cls.lessons = [
+            Lesson.objects.create(
+                course=cls.course, title=f'Tema {i}', description='',
+                lesson_type=lesson_type, content='...', duration_minutes=5,
+            )
+            for i in range(3)
+        ]
+        completed = EnrollmentStatus.objects.create(status_name='completed', description='')
+        cls.enrollment = Enrollment.objects.create(user=cls.user, course=cls.course, status=completed)
+        for index, lesson in enumerate(cls.lessons):
+            LessonProgress.objects.create(
+                enrollment=cls.enrollment, lesson=lesson, is_completed=index < 2,
+                time_spent_minutes=index * 10,
+                completed_at=timezone.now() if index < 2 else None,
+            )
+        Enrollment.objects.filter(pk=cls.enrollment.pk).update(
+            progress_percentage=66.67, last_accessed_at=timezone.now() - timedelta(days=400),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _archive(self):
+        out = StringIO()
+        call_command('archive_lesson_progress', days=365, stdout=out)
+        self.enrollment.refresh_from_db()
+        return out.getvalue()
+
+    def test_only_stale_finished_enrollments_are_archivable(self):
+        self.assertEqual(list(archivable_enrollments(365)), [self.enrollment])
+        self.assertEqual(list(archivable_enrollments(500)), [])
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status=None)
+        self.assertEqual(list(archivable_enrollments(365)), [])
+
+    def test_archive_command_moves_rows(self):
+        expected = {
+            row['lesson_id']: row for row in LessonProgress.objects.filter(enrollment=self.enrollment)
+            .values('id', 'lesson_id', 'is_completed', 'time_spent_minutes', 'completed_at')
+        }
+        call_command('archive_lesson_progress', days=365, dry_run=True, stdout=StringIO())
+        self.assertFalse(LessonProgressArchive.objects.exists())
+
+        self.assertIn('1 inscripciones archivadas (3 filas', self._archive())
+        self.assertTrue(self.enrollment.progress_archived)
+        self.assertFalse(LessonProgress.objects.filter(enrollment=self.enrollment).exists())
+        self.assertEqual(LessonProgressArchive.objects.get().lesson_count, 3)
+
+        progress = archived_progress(self.enrollment)
+        self.assertEqual(
+            {item.lesson_id: {
+                'id': item.id, 'lesson_id': item.lesson_id, 'is_completed': item.is_completed,
+                'time_spent_minutes': item.time_spent_minutes, 'completed_at': item.completed_at,
+            } for item in progress},
+            expected,
+        )
+        self.assertEqual({item.lesson.title for item in progress}, {'Tema 0', 'Tema 1', 'Tema 2'})
+
+        # Una segunda pasada no vuelve a archivar
+        self.assertIn('0 inscripciones archivadas', self._archive())
+
+    def test_archived_progress_skips_deleted_lessons(self):
+        self._archive()
+        self.lessons[0].delete()
+        self.assertEqual(
+            sorted(item.lesson_id for item in archived_progress(self.enrollment)),
+            [lesson.pk for lesson in self.lessons[1:]],
+        )
+
+    def test_api_reads_from_table_or_archive(self):
+        url = '/api/lms/lesson-progress/'
+        detail = f'/api/lms/enrollments/{self.enrollment.pk}/lesson_progress/'
+        before = self.client.get(url, {'enrollment': self.enrollment.pk}).json()['results']
+        before_detail = self.client.get(detail).json()
+        self.assertEqual(len(before), 3)
+
+        self._archive()
+        after = self.client.get(url, {'enrollment': self.enrollment.pk}).json()['results']
+        key = lambda item: item['lesson']
+        strip = lambda items: sorted(
+            ({k: v for k, v in item.items() if k != 'last_accessed_at'} for item in items), key=key
+        )
+        self.assertEqual(strip(after), strip(before))
+        self.assertEqual(strip(self.client.get(detail).json()), strip(before_detail))
+
+        completed = self.client.get(url, {'enrollment': self.enrollment.pk, 'is_completed': 'false'}).json()
+        self.assertEqual([item['lesson'] for item in completed['results']], [self.lessons[2].pk])
+        one = self.client.get(url, {'enrollment': self.enrollment.pk, 'lesson': self.lessons[1].pk}).json()
+        self.assertEqual([item['lesson'] for item in one['results']], [self.lessons[1].pk])
+
+    def test_recompute_keeps_archived_percentage(self):
+        self._archive()
+        recompute_enrollment_progress(self.enrollment.pk)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(float(self.enrollment.progress_percentage), 66.67)
+
+    def test_retrieve_reads_archived_rows(self):
+        pk = LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lessons[1]).pk
+        url = f'/api/lms/lesson-progress/{pk}/'
+        before = self.client.get(url).json()
+        self._archive()
+        self.assertEqual(LessonProgressArchive.objects.get().first_progress_id, pk - 1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        strip = lambda item: {k: v for k, v in item.items() if k != 'last_accessed_at'}
+        self.assertEqual(strip(response.json()), strip(before))
+        self.assertEqual(self.client.get(f'/api/lms/lesson-progress/{pk + 100}/').status_code, 404)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'particiones solo en PostgreSQL')
+    def test_new_partition_takes_rows_from_default(self):
+        year = max(year for _, year in partitions() if year is not None) + 1
+        row = LessonProgress.objects.create(
+            enrollment=self.enrollment, lesson=self.lessons[0], period=date(year, 3, 1),
+        )
+        self.assertEqual(ensure_partitions(year), [year])
+        self.assertEqual(ensure_partitions(year), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM app_lessonprogress_y{year}')
+            self.assertEqual(cursor.fetchall(), [(row.pk,)])
+            cursor.execute('SELECT COUNT(*) FROM app_lessonprogress_default WHERE id = %s', [row.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertIn((f'app_lessonprogress_y{year}', year), partitions())
+        self.assertIn(('app_lessonprogress_default', None), partitions())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'particiones solo en PostgreSQL')
+class ProgressPartitionMigrationTests(TransactionTestCase):
+    """La migración 0009 particiona app_lessonprogress y la revierte, conservando filas e ids"""
+    before = [('app', '0008_admin_date_indexes')]
+    after = [('app', '0009_lesson_progress_partitions')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _relkind(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'app_lessonprogress'::regclass")
+            return cursor.fetchone()[0]
+
+    def _progress(self, apps, enrollment_id, lesson_id, **extra):
+        return apps.get_model('app', 'LessonProgress').objects.create(
+            enrollment_id=enrollment_id, lesson_id=lesson_id, **extra
+        )
+
+    def test_partition_and_revert(self):
+        apps = self._migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='migra')
+        category = apps.get_model('app', 'Course_Category').objects.create(name='Cine', slug='cine')
+        course = apps.get_model('app', 'Course').objects.create(
+            title='Montaje', slug='montaje', description='', instructor_id=user.pk, category_id=category.pk,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        body = apps.get_model('app', 'LessonContent').objects.create(
+            sha256=LessonContent.hash_text('...'), **LessonContent.pack('...')
+        )
+        lessons = [
+            apps.get_model('app', 'Lesson').objects.create(
+                course_id=course.pk, title=f'Clase {index}', description='', body_id=body.sha256,
+                duration_minutes=1, order_index=index,
+            )
+            for index in range(3)
+        ]
+        enrollment = apps.get_model('app', 'Enrollment').objects.create(user_id=user.pk, course_id=course.pk)
+        first = self._progress(apps, enrollment.pk, lessons[0].pk)
+
+        apps = self._migrate(self.after)
+        self.assertEqual(self._relkind(), 'p')
+        period = apps.get_model('app', 'LessonProgress').objects.get(pk=first.pk).period
+        second = self._progress(apps, enrollment.pk, lessons[1].pk, period=period)
+        self.assertGreater(second.pk, first.pk)
+
+        apps = self._migrate(self.before)
+        self.assertEqual(self._relkind(), 'r')
+        third = self._progress(apps, enrollment.pk, lessons[2].pk)
+        self.assertGreater(third.pk, second.pk)
+        self.assertEqual(
+            sorted(apps.get_model('app', 'LessonProgress').objects.values_list('pk', flat=True)),
+            [first.pk, second.pk, third.pk],
+        )
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(METRICS_DIR=self.directory, METRICS_TOKEN='secreto')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _write(self, pid, requests):
+        key = metrics._key('lms_http_requests_total', {'view': 'Otra', 'action': 'list'})
+        path = os.path.join(self.directory, f'metrics-{pid}.json')
+        with open(path, 'w') as output:
+            json.dump({'pid': pid, 'counters': {key: requests}, 'histograms': {}, 'gauges': {}}, output)
+        return key, path
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'lms_http_requests_total{', response.content)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_dead_processes_are_archived_not_dropped(self):
+        key, live_path = self._write(101, 3)
+        _, dead_path = self._write(102, 5)
+        with mock.patch('app.metrics._pid_alive', side_effect=lambda pid: pid == 101):
+            self.assertEqual(metrics.collect()[0][key], 8)
+            self.assertTrue(os.path.exists(live_path))
+            self.assertFalse(os.path.exists(dead_path))
+            # El total no baja ni se cuenta dos veces al morir otro worker
+            self.assertEqual(metrics.collect()[0][key], 8)
+            self._write(103, 2)
+            self.assertEqual(metrics.collect()[0][key], 10)
+
+    def test_new_process_archives_file_of_reused_pid(self):
+        key, path = self._write(os.getpid(), 7)
+        registry = metrics._Registry()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(registry.snapshot()['counters'], {})
+        self.assertEqual(metrics.collect()[0][key], 7)
+
+    def test_exit_flush_registered_only_after_a_request(self):
+        registry = metrics._Registry()
+        with mock.patch('app.metrics.atexit.register') as register:
+            registry.inc('lms_cache_requests_total', {'cache': 'x', 'result': 'hit'})
+            register.assert_not_called()
+            registry.flush()
+            registry.flush()
+        register.assert_called_once_with(registry.flush, force=True)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f'metrics-{os.getpid()}.json')))
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('perfil', is_staff=True)
+        cls.student = User.objects.create_user('estudiante')
+        category = Course_Category.objects.create(name='Física', slug='fisica')
+        cls.course = Course.objects.create(
+            title='Óptica', description='', instructor=cls.staff, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(PROFILER_DIR=self.directory, PROFILER_MAX_REPORTS=2)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = f'/api/lms/courses/{self.course.slug}/'
+
+    def _profile(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url, HTTP_X_PROFILE='1')
+
+    def test_staff_request_writes_report_with_field_times(self):
+        response = self._profile(self.staff)
+        report = profiling.load_report(response['X-Profile-Id'])
+        self.assertEqual((report['path'], report['status'], report['user']), (self.url, 200, 'perfil'))
+        self.assertGreater(report['sql_count'], 0)
+        fields = {entry['field']: entry for entry in report['serializer_fields']}
+        self.assertEqual(fields['CourseSerializer.title']['calls'], 1)
+        # La salida es la misma que sin perfilar
+        self.assertEqual(response.json(), self.client.get(self.url).json())
+
+    def test_unprofiled_requests_are_untouched(self):
+        response = self._profile(self.student)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+        # Fuera de una petición perfilada el mixin no cambia la salida
+        self.assertEqual(self.client.get(self.url).json()['title'], 'Óptica')
+
+    def test_list_reads_only_the_index_and_rotates(self):
+        ids = [self._profile(self.staff)['X-Profile-Id'] for _ in range(3)]
+        with mock.patch('app.profiling.json.load', side_effect=AssertionError('lee un informe')):
+            reports = profiling.list_reports()
+        self.assertEqual([report['id'] for report in reports], sorted(ids[1:], reverse=True))
+        self.assertNotIn('sql', reports[0])
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+            [f'{report_id}.json' for report_id in sorted(ids[1:])],
+        )
+
+    def test_index_is_rebuilt_when_missing(self):
+        report_id = self._profile(self.staff)['X-Profile-Id']
+        os.remove(os.path.join(self.directory, profiling.INDEX))
+        self.assertEqual([report['id'] for report in profiling.list_reports()], [report_id])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, profiling.INDEX)))
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fotografa')
+        cls.category = Course_Category.objects.create(name='Arte', slug='arte')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.course = Course.objects.create(
+            title='Acuarela', description='', instructor=self.user, category=self.category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+
+    def _png(self):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), 'teal').save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue())
+
+    def _upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.thumbnail.save(name, content)
+        self.course.refresh_from_db()
+        return self.course.thumbnail_variants
+
+    def test_variants_are_built_after_commit(self):
+        variants = self._upload('portada.png', self._png())
+        self.assertEqual(variants['source'], self.course.thumbnail.name)
+        self.assertEqual(set(variants) - {'source'}, {'thumb', 'card', 'large'})
+        self.assertEqual((variants['card']['width'], variants['card']['height']), (480, 270))
+        self.assertTrue(self.course.thumbnail.storage.exists(variants['thumb']['name']))
+
+        data = self.client.get(f'/api/lms/courses/{self.course.slug}/').json()
+        self.assertIn(variants['card']['name'], data['thumbnail_variants']['card']['url'])
+
+    def test_failure_is_recorded_and_not_retried(self):
+        with self.assertLogs('app.images', 'ERROR'):
+            variants = self._upload('rota.png', ContentFile(b'no es una imagen'))
+        self.assertEqual(variants['source'], self.course.thumbnail.name)
+        self.assertIn('error', variants)
+
+        with mock.patch('app.tasks.build_variants') as build, self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Acuarela II'
+            self.course.save()
+        build.assert_not_called()
+        data = self.client.get(f'/api/lms/courses/{self.course.slug}/').json()
+        self.assertEqual(data['thumbnail_variants'], {})
+
+        # --force lo vuelve a intentar
+        with self.assertLogs('app.images', 'ERROR'):
+            call_command('generate_image_variants', force=True, stdout=StringIO())
+
+    def test_variants_of_previous_image_are_not_served(self):
+        old = self._upload('primera.png', self._png())
+        with mock.patch('app.tasks.build_variants') as build, self.captureOnCommitCallbacks(execute=True):
+            build.return_value = {}
+            self.course.thumbnail.save('segunda.png', self._png())
+        self.course.refresh_from_db()
+        build.assert_called_once()
+        data = self.client.get(f'/api/lms/courses/{self.course.slug}/').json()
+        self.assertEqual(data['thumbnail_variants'], {})
+        self.assertIn('segunda', data['thumbnail'])
+        self.assertNotIn(old['card']['name'], json.dumps(data))
+
+    def test_built_variants_refresh_course_page_and_catalog(self):
+        self.course.thumbnail.save('portada.png', self._png())  # sin ejecutar la tarea
+        self.client.force_login(self.user)
+        url = f'/api/lms/courses/{self.course.slug}/page/'
+        self.assertEqual(self.client.get(url).json()['course']['thumbnail_variants'], {})
+
+        with mock.patch('app.tasks.catalog.schedule_rebuild') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                build_image_variants('course', self.course.pk)
+            schedule.assert_called_once_with()
+            self.assertIn('card', self.client.get(url).json()['course']['thumbnail_variants'])
+
+            schedule.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('generate_image_variants', force=True, stdout=StringIO())
+            schedule.assert_called_once_with()
+
+    @override_settings(JOB_QUEUE_EAGER=False)
+    def test_saves_enqueue_one_build(self):
+        Job.objects.all().delete()
+        for name in ('uno.png', 'dos.png'):
+            self.course.thumbnail.save(name, self._png())
+        job = Job.objects.get(task='build_image_variants')
+        self.assertEqual(job.payload, {'model': 'course', 'pk': self.course.pk})
+
+
+class LessonContentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('editora')
+        category = Course_Category.objects.create(name='Música', slug='musica')
+        cls.course = Course.objects.create(
+            title='Armonía', description='', instructor=user, category=category,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        cls.lesson_type = LessonType.objects.create(type_name='texto')
+
+    def _lesson(self, content):
+        return Lesson.objects.create(
+            course=self.course, title='Acordes', description='', lesson_type=self.lesson_type,
+            content=content, duration_minutes=5,
+        )
+
+    def test_intern_dedupes(self):
+        first = LessonContent.objects.intern('Do mayor')
+        self.assertEqual(LessonContent.objects.intern('Do mayor').pk, first.pk)
+        self.assertEqual(first.text, 'Do mayor')
+
+        hashes = LessonContent.objects.intern_many(['Do mayor', 'La menor', 'La menor'])
+        self.assertEqual(hashes, [LessonContent.hash_text(text) for text in ['Do mayor', 'La menor', 'La menor']])
+        self.assertEqual(LessonContent.objects.count(), 2)
+
+        copies = [self._lesson('Sol mayor') for _ in range(2)]
+        self.assertEqual(copies[0].body_id, copies[1].body_id)
+        self.assertEqual(Lesson.objects.get(pk=copies[1].pk).content, 'Sol mayor')
+
+    def test_prune_removes_only_unused_bodies(self):
+        lesson = self._lesson('Escalas')
+        LessonContent.objects.intern_many(['Huérfano 1', 'Huérfano 2', 'Huérfano 3'])
+        out = StringIO()
+        call_command('prune_lesson_content', batch_size=2, stdout=out)
+        self.assertIn('3 cuerpos sin uso eliminados', out.getvalue())
+        self.assertEqual(list(LessonContent.objects.values_list('sha256', flat=True)), [lesson.body_id])
+
+
+class LessonContentPruneRaceTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_prune_skips_bodies_being_reused(self):
+        LessonContent.objects.intern('Contrapunto')
+        interned, release = threading.Event(), threading.Event()
+
+        def reuse():
+            with transaction.atomic():
+                LessonContent.objects.intern('Contrapunto')
+                interned.set()
+                release.wait(10)
+            connection.close()
+
+        worker = threading.Thread(target=reuse)
+        worker.start()
+        try:
+            interned.wait(10)
+            call_command('prune_lesson_content', stdout=StringIO())
+            self.assertTrue(LessonContent.objects.filter(sha256=LessonContent.hash_text('Contrapunto')).exists())
+        finally:
+            release.set()
+            worker.join()
+
+
+class LessonContentMigrationTests(TransactionTestCase):
+    """La migración 0007 mueve el texto de las lecciones a LessonContent y lo restaura al revertirla"""
+    before = [('app', '0006_background_jobs')]
+    after = [('app', '0007_lesson_content_store')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_content_moves_and_restores(self):
+        apps = self._migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='migra')
+        category = apps.get_model('app', 'Course_Category').objects.create(name='Cine', slug='cine')
+        course = apps.get_model('app', 'Course').objects.create(
+            title='Montaje', slug='montaje', description='', instructor_id=user.pk, category_id=category.pk,
+            duration_hours=1, requirements='', learning_objectives='',
+        )
+        HistoricalLesson = apps.get_model('app', 'Lesson')
+        texts = ['Plano', 'Plano', 'Contraplano']
+        for index, text in enumerate(texts):
+            HistoricalLesson.objects.create(
+                course_id=course.pk, title=f'Clase {index}', description='', content=text,
+                duration_minutes=1, order_index=index,
+            )
+
+        apps = self._migrate(self.after)
+        bodies = apps.get_model('app', 'LessonContent').objects.all()
+        self.assertEqual(sorted(zlib.decompress(bytes(body.data)).decode() for body in bodies), ['Contraplano', 'Plano'])
+        rows = apps.get_model('app', 'Lesson').objects.order_by('order_index').values_list('body_id', flat=True)
+        self.assertEqual(list(rows), [LessonContent.hash_text(text) for text in texts])
+
+        apps = self._migrate(self.before)
+        restored = apps.get_model('app', 'Lesson').objects.order_by('order_index').values_list('content', flat=True)
+        self.assertEqual(list(restored), texts)
+
+
+class CatalogImportTests(TestCase):
+    RECORDS = [
+        {'slug': 'jazz', 'title': 'Jazz [básico], {con "comillas"}', 'instructor': 'docente',
+         'category': 'Música', 'price': '10.00', 'duration_hours': 3,
+         'lessons': [
+             {'key': 'a', 'title': 'Swing', 'lesson_type': 'video', 'content': 'Texto con ] y }\n', 'duration_minutes': 5},
+             {'key': 'b', 'title': 'Blues', 'lesson_type': 'video', 'content': 'Otro', 'is_free': 'sí'},
+         ]},
+        {'slug': 'rock', 'title': 'Rock', 'instructor': 'docente', 'category': 'musica', 'duration_hours': 1,
+         'lessons': []},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('docente', password='x')
+        Course_Category.objects.create(name='Música', slug='musica')
+        LessonType.objects.create(type_name='video')
+
+    def _records(self, text, chunk_size):
+        return list(iter_json(StringIO(text), chunk_size=chunk_size))
+
+    def test_json_array_and_ndjson_across_chunks(self):
+        array = json.dumps(self.RECORDS, ensure_ascii=False, indent=1)
+        ndjson = '\n'.join(json.dumps(record, ensure_ascii=False) for record in self.RECORDS) + '\n'
+        for chunk_size in (1, 3, 7, 64, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self._records(array, chunk_size), self.RECORDS)
+                self.assertEqual(self._records(ndjson, chunk_size), self.RECORDS)
+        self.assertEqual(self._records('  [ ]  ', 2), [])
+        self.assertEqual(self._records('', 2), [])
+
+    def test_json_errors(self):
+        for text, message in [
+            ('[{"slug": "a"}, {"slug": "b"}', 'no está cerrado'),
+            ('[{"slug": "a"', 'JSON inválido'),
+            ('[1, 2]', 'objeto JSON'),
+        ]:
+            with self.subTest(text=text), self.assertRaisesMessage(ImportFormatError, message):
+                self._records(text, 4)
+
+    def test_csv_groups_consecutive_rows(self):
+        text = (
+            'slug,title,instructor,category,lesson_key,lesson_title,lesson_type,lesson_duration_minutes\n'
+            'jazz,Jazz,docente,Música,a,Swing,video,5\n'
+            'jazz,Jazz,docente,Música,b,Blues,video,\n'
+            ',Rock Duro,docente,Música,,,,\n'
+        )
+        records = list(iter_csv(StringIO(text)))
+        self.assertEqual([record['slug'] for record in records], ['jazz', 'rock-duro'])
+        self.assertEqual(records[0]['lessons'], [
+            {'key': 'a', 'title': 'Swing', 'lesson_type': 'video', 'duration_minutes': '5'},
+            {'key': 'b', 'title': 'Blues', 'lesson_type': 'video'},
+        ])
+        self.assertEqual(records[1]['lessons'], [])
+        self.assertNotIn('lesson_title', records[0])
+
+    def test_reimport_is_idempotent(self):
+        first = CatalogImporter(batch_size=1).run(self.RECORDS)
+        self.assertEqual((first.courses_created, first.courses_updated, first.lessons), (2, 0, 2))
+
+        changed = json.loads(json.dumps(self.RECORDS))
+        changed[0]['lessons'][1]['content'] = 'Blues en Fa'
+        second = CatalogImporter().run(changed)
+        self.assertEqual((second.courses_created, second.courses_updated, second.lessons), (0, 2, 2))
+
+        course = Course.objects.get(slug='jazz')
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertEqual(
+            [(lesson.source_key, lesson.content, lesson.is_free) for lesson in course.lessons.order_by('order_index')],
+            [('a', 'Texto con ] y }\n', False), ('b', 'Blues en Fa', True)],
+        )
+        self.assertEqual(Course_Category.objects.get().course_count, 2)
+
+    def test_skipped_records_are_reported(self):
+        records = [
+            self.RECORDS[1],
+            {'slug': 'sin-categoria', 'title': 'X', 'instructor': 'docente', 'category': 'Pintura', 'duration_hours': 1},
+            {'slug': 'sin-docente', 'title': 'Y', 'category': 'Música', 'duration_hours': 1},
+            {'title': '', 'instructor': 'docente', 'category': 'Música'},
+        ]
+        result = CatalogImporter(max_errors=2).run(records)
+        self.assertEqual((result.courses, result.skipped), (1, 3))
+        self.assertEqual(result.errors, [
+            '#2 sin-categoria: categoría desconocido: Pintura',
+            '#3 sin-docente: Falta instructor',
+        ])
+
+    def test_reimport_keeps_columns_missing_from_the_record(self):
+        level = DifficultyLevel.objects.create(level_name='Básico', level_order=1)
+        jazz = {name: value for name, value in self.RECORDS[0].items() if name != 'price'}
+        CatalogImporter().run([dict(self.RECORDS[1], description='Guitarras', difficulty_level='básico'), self.RECORDS[0]])
+        CatalogImporter().run([dict(self.RECORDS[1], title='Rock & roll'), dict(jazz, description='')])
+        rock = Course.objects.get(slug='rock')
+        self.assertEqual((rock.title, rock.description, rock.difficulty_level), ('Rock & roll', 'Guitarras', level))
+        self.assertEqual(str(Course.objects.get(slug='jazz').price), '10.00')
+
+    @override_settings(JOB_QUEUE_EAGER=False)
+    def test_admin_upload_is_queued_for_the_worker(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.client.force_login(self.admin)
+        upload = ContentFile(json.dumps(self.RECORDS).encode(), name='catalogo.json')
+        with self.settings(MEDIA_ROOT=media), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:app_course_import'), {'file': upload, 'file_format': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Course.objects.exists())
+        with self.settings(MEDIA_ROOT=media):
+            self.assertTrue(jobs.execute(jobs.claim('w1')))
+        self.assertEqual(set(Course.objects.values_list('slug', flat=True)), {'jazz', 'rock'})
+        self.assertEqual(os.listdir(os.path.join(media, 'imports')), [])
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_admin_upload_refused_without_worker(self):
+        self.client.force_login(self.admin)
+        upload = ContentFile(json.dumps(self.RECORDS).encode(), name='catalogo.json')
+        response = self.client.post(reverse('admin:app_course_import'), {'file': upload, 'file_format': ''}, follow=True)
+        self.assertRedirects(response, reverse('admin:app_course_changelist'))
+        self.assertIn('run_jobs', str(list(response.context['messages'])[0]))
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(Course.objects.exists())
+
+
+class CatalogSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('docente', first_name='Eva')
+        cls.student = User.objects.create_user('alumna')
+        category = Course_Category.objects.create(name='Arte', slug='arte')
+        cls.lesson_type = LessonType.objects.create(type_name='video')
+        EnrollmentStatus.objects.create(status_name='active', description='')
+        fields = dict(description='', instructor=cls.instructor, category=category, duration_hours=2,
+                      requirements='', learning_objectives='')
+        cls.course = Course.objects.create(title='Óleo', published_at=timezone.now(), **fields)
+        cls.draft = Course.objects.create(title='Acuarela', **fields)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = self.settings(CATALOG_SNAPSHOT_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for state in (catalog._loaded, catalog._scheduled):
+            patcher = mock.patch.dict(state)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        catalog._loaded.update(stamp=None, digest=None, encodings={})
+        catalog._scheduled.update(until=0.0)
+
+    def test_snapshot_is_built_once_and_served_without_queries(self):
+        response = self.client.get('/api/lms/catalog/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([course['slug'] for course in response.json()], [self.course.slug])
+        digest = catalog._loaded['digest']
+        expected = {'catalog.json', f'catalog-{digest}.json', f'catalog-{digest}.json.gz'}
+        if catalog.brotli is not None:
+            expected.add(f'catalog-{digest}.json.br')
+        self.assertEqual(set(os.listdir(self.directory)), expected)
+
+        with mock.patch('app.catalog.build_snapshot') as build, self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/lms/catalog/').content, response.content)
+        build.assert_not_called()
+
+    def test_encoding_negotiation_and_304(self):
+        plain = self.client.get('/api/lms/catalog/')
+        compressed = self.client.get('/api/lms/catalog/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(plain['ETag'], f'"{catalog._loaded["digest"]}"')
+        self.assertEqual(compressed['ETag'], f'"{catalog._loaded["digest"]}-gzip"')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertIn('public', plain['Cache-Control'])
+        if catalog.brotli is not None:
+            response = self.client.get('/api/lms/catalog/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(catalog.brotli.decompress(response.content), plain.content)
+
+        response = self.client.get('/api/lms/catalog/', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], plain['ETag'])
+        response = self.client.get('/api/lms/catalog/', HTTP_IF_NONE_MATCH=plain['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(JOB_QUEUE_EAGER=True, CATALOG_SNAPSHOT_DEBOUNCE=60)
+    def test_without_worker_changes_rebuild_on_a_later_read(self):
+        before = self.client.get('/api/lms/catalog/')
+        old_files = set(os.listdir(self.directory)) - {'catalog.json'}
+        with mock.patch('app.catalog.build_snapshot') as build, self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.enroll(self.student, self.course)
+            Comment.objects.create(user=self.student, course=self.course, content='Bien', rating=4, is_review=True)
+        build.assert_not_called()
+        # Dentro del retraso se sirve el snapshot anterior
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/lms/catalog/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.settings(CATALOG_SNAPSHOT_DEBOUNCE=0):
+            response = self.client.get('/api/lms/catalog/', HTTP_IF_NONE_MATCH=before['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()[0]['total_enrollments'], 1)
+            self.assertFalse(old_files & set(os.listdir(self.directory)))
+            self.assertNotIn(catalog.PENDING, os.listdir(self.directory))
+            with self.assertNumQueries(0):
+                self.client.get('/api/lms/catalog/')
+
+    def test_only_displayed_fields_schedule_a_rebuild(self):
+        with mock.patch('app.signals.schedule_rebuild') as schedule:
+            self.instructor.last_login = timezone.now()
+            self.instructor.save()
+            self.instructor.set_password('otra')
+            self.instructor.save()
+            User.objects.get(pk=self.instructor.pk).save()
+            self.course.description = 'Más detalles'
+            self.course.save(update_fields=['description'])
+            Enrollment.objects.enroll(self.student, self.draft)
+            Lesson.objects.create(course=self.draft, title='Pinceles', description='',
+                                  lesson_type=self.lesson_type, content='...', duration_minutes=5)
+            schedule.assert_not_called()
+
+            instructor = User.objects.get(pk=self.instructor.pk)
+            instructor.first_name = 'Ana'
+            instructor.save()
+            self.assertEqual(schedule.call_count, 1)
+            Enrollment.objects.enroll(self.student, self.course)
+            self.assertEqual(schedule.call_count, 2)
+            self.course.title = 'Óleo sobre lienzo'
+            self.course.save(update_fields=['title'])
+            self.assertEqual(schedule.call_count, 3)
+
+    @override_settings(JOB_QUEUE_EAGER=False)
+    def test_one_job_write_per_debounce_window(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.schedule_rebuild()
+        with self.assertNumQueries(0):
+            catalog.schedule_rebuild()
+        self.assertEqual(Job.objects.filter(task='build_catalog_snapshot').count(), 1)
@@ -1,5 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .catalog import catalog_snapshot
+from .events import course_events
 from .views import (
     UserViewSet, ProfileViewSet,
     CourseCategoryViewSet, DifficultyLevelViewSet, CourseStatusViewSet,
@@ -32,5 +34,9 @@ router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
 router.register(r'comments', CommentViewSet, basename='comment')
 
 urlpatterns = [
+    # Catálogo público pregenerado: se sirve sin consultas a la base de datos
+    path('catalog/', catalog_snapshot, name='catalog-snapshot'),
+    # Eventos en vivo del curso (SSE, requiere ASGI)
+    path('courses/<slug:slug>/events/', course_events, name='course-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
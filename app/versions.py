@@ -0,0 +1,55 @@
+"""
+Versiones de tabla para las peticiones condicionales.
+
+Cada modelo tiene en ``TableVersion`` un número de versión que cambia con
+cada escritura: las señales (``app.signals``) lo cambian en ``post_save`` y
+``post_delete``, y el código que escribe sin señales (``update()``,
+``bulk_create``, ``bulk_update``) llama a ``touch``. Leer las versiones de
+varias tablas es una sola consulta por clave primaria, sin ejecutar el
+queryset de la respuesta. Al estar en la base de datos, los cambios hechos
+por el worker (``run_jobs``) o por otro proceso web se ven en todos.
+
+Con ``touch_keys`` y ``versions`` se versionan también otros datos, p. ej.
+las secciones de la página de curso (``app.course_page``).
+
+La versión cambia al confirmarse la transacción: antes, otra petición podría
+asociar la versión nueva a los datos anteriores.
+"""
+import time
+
+from django.db import transaction
+
+from .models import TableVersion
+
+
+def _key(model):
+    return f'table-version:{model._meta.label_lower}'
+
+
+def touch_keys(*keys):
+    """Cambia la versión de ``keys`` al confirmar la transacción"""
+    def write():
+        version = time.time_ns()
+        TableVersion.objects.bulk_create(
+            [TableVersion(key=key, version=version) for key in dict.fromkeys(keys)],
+            update_conflicts=True, unique_fields=['key'], update_fields=['version'],
+        )
+    transaction.on_commit(write, robust=True)
+
+
+def versions(keys):
+    """Devuelve ``{clave: versión}``; las que nunca cambiaron tienen versión 0"""
+    found = dict(TableVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return {key: found.get(key, 0) for key in keys}
+
+
+def touch(*models):
+    """Marca como modificadas las tablas de ``models`` al confirmar la transacción"""
+    touch_keys(*(_key(model) for model in models))
+
+
+def table_versions(models):
+    """Devuelve la versión de cada tabla de ``models``, en el mismo orden"""
+    keys = [_key(model) for model in models]
+    found = versions(keys)
+    return [found[key] for key in keys]
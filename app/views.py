@@ -2,26 +2,35 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from django.shortcuts import render
+from django.http import Http404
+from django.shortcuts import get_object_or_404, render
 
 from .models import (
     Profile, Course_Category, DifficultyLevel, CourseStatus,
     Course, LessonType, Lesson, EnrollmentStatus, Enrollment,
-    LessonProgress, Comment
+    LessonProgress, Comment, CourseRatingSummary, CourseRecommendation, related_count
 )
 from .serializers import (
     ProfileSerializer, UserSerializer, UserCreateSerializer, UserListSerializer,
     CourseCategorySerializer, DifficultyLevelSerializer, CourseStatusSerializer,
     LessonTypeSerializer, EnrollmentStatusSerializer,
     CourseSerializer, CourseListSerializer, CourseCreateUpdateSerializer,
+    CourseRatingSummarySerializer, CourseRecommendationSerializer,
     LessonSerializer, LessonListSerializer, LessonProgressSerializer,
+    LessonReorderSerializer, LessonBulkUpdateSerializer,
     EnrollmentSerializer, EnrollmentCreateSerializer, EnrollmentListSerializer,
     CommentSerializer, CommentListSerializer
 )
+from .course_page import build_page, bump, course_stats
+from .jobs import enqueue
+from .docs import api_doc, openapi
+from .mixins import CompiledListMixin, ConditionalGetMixin, MultiGetMixin
+from .pagination import EstimatedCountPagination
+from .progress import archived_progress, archived_progress_row, progress_for_enrollment
+from .versions import touch
 
 # =================== HOME ===================
 def index(request):
@@ -29,7 +38,7 @@ def index(request):
 
 # ==================== USER & PROFILE ====================
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(MultiGetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar usuarios.
     
@@ -41,6 +50,7 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.select_related('profile').all()
     serializer_class = UserSerializer
+    pagination_class = EstimatedCountPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['username', 'email', 'first_name', 'last_name']
     ordering_fields = ['date_joined', 'username']
@@ -52,10 +62,10 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserListSerializer
         return UserSerializer
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener el perfil del usuario",
         responses={200: ProfileSerializer()}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def profile(self, request, pk=None):
         """Obtener el perfil del usuario"""
@@ -63,11 +73,11 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = ProfileSerializer(user.profile)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Actualizar el perfil del usuario",
         request_body=ProfileSerializer,
         responses={200: ProfileSerializer()}
-    )
+    ))
     @action(detail=True, methods=['patch'])
     def update_profile(self, request, pk=None):
         """Actualizar el perfil del usuario"""
@@ -78,22 +88,22 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener los cursos donde el usuario es instructor",
         responses={200: CourseListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def courses_taught(self, request, pk=None):
         """Obtener los cursos que enseña el usuario"""
         user = self.get_object()
-        courses = user.courses.all()
+        courses = user.courses.select_related('category', 'difficulty_level', 'rating_summary')
         serializer = CourseListSerializer(courses, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener las inscripciones del usuario",
         responses={200: EnrollmentListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def enrollments(self, request, pk=None):
         """Obtener las inscripciones del usuario"""
@@ -128,15 +138,17 @@ class CourseCategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     lookup_field = 'slug'
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener cursos de una categoría",
         responses={200: CourseListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def courses(self, request, slug=None):
         """Obtener cursos de una categoría específica"""
         category = self.get_object()
-        courses = category.course_set.all()
+        courses = category.course_set.select_related(
+            'instructor', 'difficulty_level', 'rating_summary'
+        )
         serializer = CourseListSerializer(courses, many=True)
         return Response(serializer.data)
 
@@ -175,7 +187,7 @@ class EnrollmentStatusViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== COURSES ====================
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(MultiGetMixin, ConditionalGetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar cursos.
     
@@ -186,7 +198,7 @@ class CourseViewSet(viewsets.ModelViewSet):
     destroy: Eliminar un curso
     """
     queryset = Course.objects.select_related(
-        'instructor', 'category', 'difficulty_level', 'status'
+        'instructor', 'category', 'difficulty_level', 'status', 'rating_summary'
     ).prefetch_related('lessons').all()
     serializer_class = CourseSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -194,6 +206,16 @@ class CourseViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description', 'requirements', 'learning_objectives']
     ordering_fields = ['created_at', 'price', 'title', 'published_at']
     lookup_field = 'slug'
+    multi_get_lookups = {'ids': 'pk', 'slugs': 'slug'}
+    conditional_models = (
+        User, Course_Category, DifficultyLevel, CourseStatus, CourseRatingSummary,
+        Lesson, LessonType, Enrollment, Comment,
+    )
+    # Conteos que CourseListSerializer usa en lugar de dos COUNT por curso
+    list_annotations = {
+        'lesson_total': related_count(Lesson),
+        'enrollment_total': related_count(Enrollment),
+    }
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -202,21 +224,21 @@ class CourseViewSet(viewsets.ModelViewSet):
             return CourseCreateUpdateSerializer
         return CourseSerializer
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Listar solo cursos publicados",
         responses={200: CourseListSerializer(many=True)}
-    )
+    ))
     @action(detail=False, methods=['get'])
     def published(self, request):
         """Obtener solo cursos publicados"""
-        courses = self.queryset.filter(published_at__isnull=False)
+        courses = self.queryset.filter(published_at__isnull=False).annotate(**self.list_annotations)
         serializer = CourseListSerializer(courses, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener las lecciones de un curso",
         responses={200: LessonListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def lessons(self, request, slug=None):
         """Obtener las lecciones de un curso"""
@@ -225,10 +247,54 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = LessonListSerializer(lessons, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
+        operation_description="Reordenar las lecciones de un curso en una sola operación",
+        request_body=LessonReorderSerializer,
+        responses={200: LessonListSerializer(many=True)}
+    ))
+    @action(detail=True, methods=['post'], url_path='lessons/reorder')
+    def reorder_lessons(self, request, slug=None):
+        """Aplicar un nuevo orden completo o mover una lección"""
+        course = self.get_object()
+        with transaction.atomic():
+            lessons = list(
+                course.lessons.select_related('lesson_type')
+                .select_for_update(of=('self',)).order_by('order_index', 'id')
+            )
+            serializer = LessonReorderSerializer(data=request.data, context={'lessons': lessons})
+            if serializer.is_valid():
+                ordered = serializer.save()
+                # bulk_update no envía señales
+                bump(course.pk, 'lessons')
+                touch(Lesson)
+                return Response(LessonListSerializer(ordered, many=True).data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @api_doc(lambda: dict(
+        operation_description="Publicar o marcar como gratuitas varias lecciones a la vez",
+        request_body=LessonBulkUpdateSerializer,
+        responses={200: LessonListSerializer(many=True)}
+    ))
+    @action(detail=True, methods=['patch'], url_path='lessons/bulk_update')
+    def bulk_update_lessons(self, request, slug=None):
+        """Actualizar is_published/is_free de varias lecciones del curso"""
+        course = self.get_object()
+        with transaction.atomic():
+            lessons = list(
+                course.lessons.select_related('lesson_type').select_for_update(of=('self',))
+            )
+            serializer = LessonBulkUpdateSerializer(data=request.data, context={'lessons': lessons})
+            if serializer.is_valid():
+                changed = serializer.save()
+                bump(course.pk, 'lessons')
+                touch(Lesson)
+                return Response(LessonListSerializer(changed, many=True).data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @api_doc(lambda: dict(
         operation_description="Obtener los comentarios/reseñas de un curso",
         responses={200: CommentListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def comments(self, request, slug=None):
         """Obtener los comentarios de un curso"""
@@ -237,10 +303,10 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = CommentListSerializer(comments, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener las inscripciones de un curso",
         responses={200: EnrollmentListSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def enrollments(self, request, slug=None):
         """Obtener las inscripciones de un curso"""
@@ -249,45 +315,89 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = EnrollmentListSerializer(enrollments, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener estadísticas del curso",
         responses={200: openapi.Response('Estadísticas del curso')}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def stats(self, request, slug=None):
         """Obtener estadísticas del curso"""
+        return Response(course_stats(self.get_object()))
+    
+    @api_doc(lambda: dict(
+        operation_description=(
+            "Página del curso en una sola llamada: detalle, lecciones, estadísticas, "
+            "primera página de comentarios e inscripción del usuario (null si no lo está)"
+        ),
+        responses={200: openapi.Response('Secciones de la página del curso')}
+    ))
+    @action(detail=True, methods=['get'])
+    def page(self, request, slug=None):
+        """Obtener todas las secciones de la página de un curso"""
+        course_id = get_object_or_404(Course.objects.values_list('pk', flat=True), slug=slug)
+        return Response(build_page(request, course_id))
+    
+    @api_doc(lambda: dict(
+        operation_description="Obtener el histograma de calificaciones del curso",
+        responses={200: CourseRatingSummarySerializer()}
+    ))
+    @action(detail=True, methods=['get'])
+    def rating_summary(self, request, slug=None):
+        """Obtener la distribución de estrellas y el promedio del curso"""
         course = self.get_object()
-        
-        # Calcular estadísticas
-        total_enrollments = course.enrollments.count()
-        active_enrollments = course.enrollments.filter(
-            status__status_name__iexact='active'
-        ).count()
-        completed_enrollments = course.enrollments.filter(
-            status__status_name__iexact='completed'
-        ).count()
-        
-        reviews = course.comments.filter(is_review=True, rating__isnull=False)
-        avg_rating = None
-        if reviews.exists():
-            avg_rating = round(sum(r.rating for r in reviews) / reviews.count(), 2)
-        
-        stats = {
-            'total_enrollments': total_enrollments,
-            'active_enrollments': active_enrollments,
-            'completed_enrollments': completed_enrollments,
-            'total_lessons': course.lessons.count(),
-            'total_reviews': reviews.count(),
-            'average_rating': avg_rating,
-            'total_duration_hours': course.duration_hours,
-        }
-        
-        return Response(stats)
+        summary = getattr(course, 'rating_summary', None) or CourseRatingSummary(course=course)
+        serializer = CourseRatingSummarySerializer(summary)
+        return Response(serializer.data)
+    
+    @api_doc(lambda: dict(
+        operation_description="Cursos que también tomaron los alumnos de este curso",
+        responses={200: CourseRecommendationSerializer(many=True)}
+    ))
+    @action(detail=True, methods=['get'])
+    def also_took(self, request, slug=None):
+        """Obtener los cursos más co-inscritos con este curso"""
+        return self._recommendations(CourseRecommendation.ALSO_TOOK)
+    
+    @api_doc(lambda: dict(
+        operation_description="Cursos publicados con contenido similar",
+        manual_parameters=[
+            openapi.Parameter(
+                'category', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                description='Slug de categoría para filtrar los cursos similares'
+            ),
+        ],
+        responses={200: CourseRecommendationSerializer(many=True)}
+    ))
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """Obtener cursos similares por título, descripción y objetivos"""
+        return self._recommendations(CourseRecommendation.SIMILAR)
+    
+    def _recommendations(self, kind):
+        """Lee los vecinos precalculados con una sola consulta indexada"""
+        course_id = get_object_or_404(
+            Course.objects.values_list('pk', flat=True), slug=self.kwargs[self.lookup_field]
+        )
+        recommendations = CourseRecommendation.objects.filter(
+            course_id=course_id, kind=kind, neighbor__published_at__isnull=False
+        ).select_related('neighbor')
+        category = self.request.query_params.get('category')
+        if category:
+            # Se guardan los mejores de cada categoría: la lista filtrada está completa
+            recommendations = list(
+                recommendations.filter(neighbor__category__slug=category).order_by('category_rank')
+            )
+            for recommendation in recommendations:
+                recommendation.rank = recommendation.category_rank
+        else:
+            recommendations = recommendations.filter(rank__isnull=False)
+        serializer = CourseRecommendationSerializer(recommendations, many=True)
+        return Response(serializer.data)
 
 
 # ==================== LESSONS ====================
 
-class LessonViewSet(viewsets.ModelViewSet):
+class LessonViewSet(MultiGetMixin, ConditionalGetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar lecciones.
     """
@@ -295,8 +405,16 @@ class LessonViewSet(viewsets.ModelViewSet):
     serializer_class = LessonSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['course', 'lesson_type', 'is_published', 'is_free']
-    search_fields = ['title', 'description', 'content']
+    search_fields = ['title', 'description']
     ordering_fields = ['order_index', 'created_at', 'duration_minutes']
+    conditional_models = (Course, LessonType)
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # El cuerpo solo se carga (y descomprime) en el detalle
+            queryset = queryset.select_related('body')
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -304,19 +422,58 @@ class LessonViewSet(viewsets.ModelViewSet):
         return LessonSerializer
 
 
+# Valores de ?is_completed= que acepta django-filter
+BOOLEAN_PARAMS = {'true': True, 'True': True, '1': True, 'false': False, 'False': False, '0': False}
+
+
 class LessonProgressViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gestionar el progreso de lecciones.
     """
     queryset = LessonProgress.objects.select_related('enrollment__user', 'lesson').all()
     serializer_class = LessonProgressSerializer
+    pagination_class = EstimatedCountPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['enrollment', 'lesson', 'is_completed']
     
-    @swagger_auto_schema(
+    def list(self, request, *args, **kwargs):
+        """Con ``?enrollment=`` de una inscripción archivada, lee del archivo"""
+        enrollment_id = request.query_params.get('enrollment', '')
+        enrollment = None
+        if enrollment_id.isdigit():
+            enrollment = Enrollment.objects.filter(
+                pk=enrollment_id, progress_archived=True
+            ).select_related('user').first()
+        if enrollment is None:
+            return super().list(request, *args, **kwargs)
+        
+        progress = archived_progress(enrollment)
+        lesson = request.query_params.get('lesson')
+        if lesson:
+            progress = [item for item in progress if str(item.lesson_id) == lesson]
+        is_completed = BOOLEAN_PARAMS.get(request.query_params.get('is_completed'))
+        if is_completed is not None:
+            progress = [item for item in progress if item.is_completed == is_completed]
+        
+        page = self.paginate_queryset(progress)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Las filas archivadas ya no están en la tabla: se buscan en el archivo"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''))
+            progress = archived_progress_row(int(pk)) if pk.isdigit() else None
+            if progress is None:
+                raise
+        return Response(self.get_serializer(progress).data)
+    
+    @api_doc(lambda: dict(
         operation_description="Marcar lección como completada",
         responses={200: LessonProgressSerializer()}
-    )
+    ))
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """Marcar una lección como completada"""
@@ -325,14 +482,12 @@ class LessonProgressViewSet(viewsets.ModelViewSet):
         progress.completed_at = timezone.now()
         progress.save()
         
-        # Actualizar progreso del enrollment
-        enrollment = progress.enrollment
-        total_lessons = enrollment.course.lessons.count()
-        completed_lessons = enrollment.lesson_progress.filter(is_completed=True).count()
-        
-        if total_lessons > 0:
-            enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
-            enrollment.save()
+        # El progreso del enrollment se recalcula en segundo plano
+        enqueue(
+            'recompute_enrollment_progress',
+            {'enrollment_id': progress.enrollment_id},
+            dedupe_key=f'enrollment-progress:{progress.enrollment_id}',
+        )
         
         serializer = LessonProgressSerializer(progress)
         return Response(serializer.data)
@@ -340,18 +495,23 @@ class LessonProgressViewSet(viewsets.ModelViewSet):
 
 # ==================== ENROLLMENTS ====================
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(MultiGetMixin, ConditionalGetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar inscripciones.
     """
     queryset = Enrollment.objects.select_related(
-        'user', 'course', 'status', 'current_lesson'
+        'user', 'course', 'course__rating_summary', 'status', 'current_lesson'
     ).all()
     serializer_class = EnrollmentSerializer
+    pagination_class = EstimatedCountPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['user', 'course', 'status']
     search_fields = ['user__username', 'course__title']
     ordering_fields = ['enrolled_at', 'progress_percentage', 'last_accessed_at']
+    # Incluye el curso completo (CourseListSerializer)
+    conditional_models = (
+        User, Course, EnrollmentStatus, Lesson, Course_Category, DifficultyLevel, CourseRatingSummary,
+    )
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -364,15 +524,14 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         """Al crear inscripción, crear progreso para cada lección"""
         enrollment = serializer.save()
         
-        # Crear registros de progreso para todas las lecciones
-        lessons = enrollment.course.lessons.all()
-        for lesson in lessons:
-            LessonProgress.objects.get_or_create(
-                enrollment=enrollment,
-                lesson=lesson
-            )
+        # Los registros de progreso se crean en segundo plano
+        enqueue(
+            'create_lesson_progress',
+            {'enrollment_id': enrollment.id},
+            dedupe_key=f'lesson-progress:{enrollment.id}',
+        )
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Actualizar el progreso de una inscripción",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -384,7 +543,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             }
         ),
         responses={200: EnrollmentSerializer()}
-    )
+    ))
     @action(detail=True, methods=['patch'])
     def update_progress(self, request, pk=None):
         """Actualizar el progreso de una inscripción manualmente"""
@@ -425,19 +584,19 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Obtener el progreso detallado de lecciones",
         responses={200: LessonProgressSerializer(many=True)}
-    )
+    ))
     @action(detail=True, methods=['get'])
     def lesson_progress(self, request, pk=None):
         """Obtener el progreso de todas las lecciones de la inscripción"""
         enrollment = self.get_object()
-        progress = enrollment.lesson_progress.select_related('lesson').all()
+        progress = progress_for_enrollment(enrollment)
         serializer = LessonProgressSerializer(progress, many=True)
         return Response(serializer.data)
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Actualizar lección actual",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -449,7 +608,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             }
         ),
         responses={200: EnrollmentSerializer()}
-    )
+    ))
     @action(detail=True, methods=['patch'])
     def update_current_lesson(self, request, pk=None):
         """Actualizar la lección actual del usuario"""
@@ -474,10 +633,10 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Cancelar inscripción",
         responses={200: EnrollmentSerializer()}
-    )
+    ))
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Cancelar una inscripción"""
@@ -500,7 +659,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
 
 # ==================== COMMENTS ====================
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalGetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar comentarios y reseñas.
     
@@ -512,20 +671,22 @@ class CommentViewSet(viewsets.ModelViewSet):
     """
     queryset = Comment.objects.select_related('user', 'course').all()
     serializer_class = CommentSerializer
+    pagination_class = EstimatedCountPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['user', 'course', 'rating', 'is_review']
     search_fields = ['content', 'user__username', 'course__title']
     ordering_fields = ['created_at', 'rating']
+    conditional_models = (User, Course)
     
     def get_serializer_class(self):
         if self.action == 'list':
             return CommentListSerializer
         return CommentSerializer
     
-    @swagger_auto_schema(
+    @api_doc(lambda: dict(
         operation_description="Listar solo reseñas con calificación",
         responses={200: CommentListSerializer(many=True)}
-    )
+    ))
     @action(detail=False, methods=['get'])
     def reviews(self, request):
         """Obtener solo reseñas (comentarios con rating)"""
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,7 +41,6 @@ INSTALLED_APPS = [
     
     # Third-party apps
     'rest_framework',
-    'drf_yasg',
     'django_filters',
     # 'corsheaders',
     
@@ -49,22 +49,29 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # 'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'lms_project.urls'
 
+# drf_yasg no se registra como app: importarlo carga pkg_resources y alarga
+# el arranque de cada worker. Solo se usan sus plantillas y estáticos (en
+# /swagger/ y /redoc/), que se añaden por ruta sin importar el paquete.
+DRF_YASG_DIR = os.path.dirname(find_spec('drf_yasg').origin)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [os.path.join(DRF_YASG_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -132,9 +139,60 @@ STATIC_URL = 'static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+STATICFILES_DIRS = [os.path.join(DRF_YASG_DIR, 'static')]
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Image pipeline: procesos que generan las variantes de miniaturas y avatares
+IMAGE_PIPELINE_WORKERS = 2
+IMAGE_PIPELINE_TIMEOUT = 30
+
+# Background jobs (app.jobs): cola local respaldada por la base de datos
+# Sin worker las tareas se ejecutan al confirmar la transacción; docker-compose
+# arranca run_jobs y lo desactiva con JOB_QUEUE_EAGER=0
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER', '1') == '1'
+JOB_QUEUE_WORKERS = 2
+JOB_QUEUE_MAX_ATTEMPTS = 5
+JOB_QUEUE_BACKOFF_SECONDS = 10
+# Sin renovar el bloqueo en este tiempo (se renueva cada tercio) un trabajo se da por abandonado
+JOB_QUEUE_LOCK_TIMEOUT = 300
+JOB_QUEUE_POLL_INTERVAL = 1
+
+# Listados grandes (app.pagination): por encima de este número de filas
+# estimadas se muestra la estimación en lugar de un COUNT(*) exacto
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Esquema OpenAPI pregenerado (app.schema). CODE_VERSION identifica el código
+# desplegado; si está vacío se calcula un hash de los fuentes.
+CODE_VERSION = os.environ.get('CODE_VERSION', '')
+OPENAPI_SCHEMA_DIR = os.path.join(BASE_DIR, 'build', 'openapi')
+
+# Profiling por petición (app.profiling): staff con X-Profile: 1 o ?_profile=1,
+# más una fracción de todas las peticiones a la API
+PROFILER_PATH_PREFIX = '/api/lms/'
+PROFILER_SAMPLE_RATE = 0.0  # p. ej. 0.001 para perfilar una de cada mil
+PROFILER_DIR = os.path.join(BASE_DIR, 'build', 'profiles')
+PROFILER_MAX_REPORTS = 200
+
+# Métricas de Prometheus (app.metrics). Cada worker vuelca las suyas en
+# METRICS_DIR; /metrics las suma y exige "Authorization: Bearer <METRICS_TOKEN>"
+# (sin token, /metrics responde 403).
+METRICS_DIR = os.path.join(BASE_DIR, 'build', 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Días sin actividad tras los que el progreso de una inscripción terminada o
+# cancelada pasa al archivo (manage.py archive_lesson_progress)
+PROGRESS_ARCHIVE_AFTER_DAYS = 365
+
+# Snapshot del catálogo público (app.catalog): se reconstruye como mucho una
+# vez cada CATALOG_SNAPSHOT_DEBOUNCE segundos tras un cambio (en el worker o,
+# con JOB_QUEUE_EAGER, en la primera lectura pasado ese tiempo)
+CATALOG_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'build', 'catalog')
+CATALOG_SNAPSHOT_DEBOUNCE = 30
+CATALOG_SNAPSHOT_MAX_AGE = 60
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -153,8 +211,41 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # JSON con orjson si está instalado (misma salida que el de DRF)
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'app.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# False vuelve al json de la biblioteca estándar sin cambiar la configuración de DRF
+FAST_JSON_ENABLED = True
+
+# Listados de la API con los serializers compilados (app.compiled); False usa DRF tal cual
+COMPILED_SERIALIZERS = True
+
+# Máximo de valores en ?ids= / ?slugs= de los listados (app.mixins.MultiGetMixin)
+MULTI_GET_MAX_IDS = 100
+
+# Página de curso compuesta (app.course_page): hilos para calcular secciones y caducidad de cada una
+COURSE_PAGE_WORKERS = 4
+COURSE_PAGE_CACHE_TIMEOUT = 300
+
+# Eventos en vivo (app.events): transporte entre procesos. None usa PostgresBackend con
+# PostgreSQL (llegan los eventos de todos los workers y de run_jobs) y LocalBackend si no
+EVENTS_BACKEND = None
+# Segundos que se agrupan los eventos de una conexión en un solo mensaje
+EVENTS_COALESCE_WINDOW = 1.0
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+EVENTS_HEARTBEAT = 15
+# Duración máxima de una conexión en segundos (el navegador reconecta solo)
+EVENTS_STREAM_TIMEOUT = 300
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -168,4 +259,10 @@ SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': True,
     'LOGIN_URL': '/admin/login/',
     'LOGOUT_URL': '/admin/logout/',
+    # Las páginas de documentación cargan el esquema pregenerado
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
 }
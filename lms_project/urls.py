@@ -16,39 +16,30 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+import app.metrics
+import app.profiling
+import app.schema
 import app.views
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="LMS API Documentation",
-        default_version='v1',
-        description="A comprehensive Learning Management System API built with Django REST Framework. "
-        "Supports multi-role users (instructors and students) with full CRUD operations "
-        "for courses, lessons, enrollments, and more.",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="admin@lms.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
 urlpatterns = [
     path('', app.views.index, name='index'),
     path('api/lms/', include('app.urls')),
+    path('metrics', app.metrics.metrics_view, name='metrics'),
+    # Informes de profiling (ver app/profiling.py)
+    path('admin/profiles/', admin.site.admin_view(app.profiling.report_list),
+         name='profile-reports'),
+    path('admin/profiles/<str:report_id>/', admin.site.admin_view(app.profiling.report_detail),
+         name='profile-report'),
+    path('admin/profiles/<str:report_id>/download/',
+         admin.site.admin_view(app.profiling.report_download), name='profile-report-download'),
     path('admin/', admin.site.urls),
     
      # DRF browsable API login
     path('api-auth/', include('rest_framework.urls')),
     
-    # Swagger documentation
+    # Swagger documentation (esquema pregenerado, ver app/schema.py)
     re_path(r'^swagger(?P<format>\.json|\.yaml)$',
-            schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger',
-         cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc',
-         cache_timeout=0), name='schema-redoc'),
+            app.schema.schema_file, name='schema-json'),
+    path('swagger/', app.schema.swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', app.schema.redoc_ui, name='schema-redoc'),
 ]